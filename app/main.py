@@ -1,22 +1,100 @@
+import asyncio
+import inspect
+import logging.config
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import logging.config
-import yaml
-from pathlib import Path
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-# Initialize logging
+from app.utils import metrics
+from app.utils.config import load_config
+
+# Initialize logging; the file handler writes to logs/app.log
+os.makedirs('logs', exist_ok=True)
 logging.config.fileConfig('config/logging.conf')
 logger = logging.getLogger('app')
 
 # Load configuration
-config_path = Path('config/config.yaml')
-with config_path.open() as f:
-    config = yaml.safe_load(f)
+config = load_config()
+
+# Router modules stay light to import: each creates its heavy services (FAISS
+# index, embedding model, tesseract) on first use, or in its warm_up(), which
+# runs in the background once the server is up. A router module that does not
+# exist is skipped with a warning.
+ROUTERS = [
+    ("qa", "/qa", "Question Answering"),
+    ("image", "/image", "Image Processing"),
+    ("jobs", "/jobs", "Background Jobs"),
+    ("speech", "/speech", "Speech Processing"),
+    ("management", "/manage", "Personal Management"),
+]
+
+
+def load_routers(app: FastAPI) -> Dict[str, object]:
+    modules = {}
+    for name, prefix, tag in ROUTERS:
+        module_name = f"app.routers.{name}"
+        try:
+            # __import__ rather than importlib, so that -X importtime reports it.
+            module = __import__(module_name, fromlist=["router"])
+        except ModuleNotFoundError as e:
+            if e.name != module_name:
+                raise
+            logger.warning(f"No {module_name} module, {prefix} is not served")
+            continue
+        app.include_router(module.router, prefix=prefix, tags=[tag])
+        modules[name] = module
+    return modules
+
+
+async def _warm_up(app: FastAPI, name: str, warm_up) -> None:
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, warm_up)
+    except Exception as e:
+        logger.exception(f"Warm-up of {name} failed")
+        app.state.readiness[name] = f"failed: {e}"
+    else:
+        app.state.readiness[name] = "ready"
+        logger.info(f"{name} is ready")
+
+
+async def warm_up(app: FastAPI) -> None:
+    """
+    Run the warm_up() of every router side by side, off the event loop
+    """
+    await asyncio.gather(*(_warm_up(app, name, getattr(module, "warm_up"))
+                           for name, module in app.state.routers.items() if hasattr(module, "warm_up")))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warming = None
+    if config.get('api', {}).get('warmup', True):
+        # /health answers at once; /ready waits for the warm-up.
+        app.state.readiness = {name: "pending" for name in app.state.readiness}
+        warming = asyncio.ensure_future(warm_up(app))
+    else:
+        # Every subsystem initialises on its first request instead.
+        app.state.readiness = {name: "ready" for name in app.state.readiness}
+    yield
+    if warming is not None:
+        warming.cancel()
+    for module in app.state.routers.values():
+        if hasattr(module, "shutdown"):
+            # May be a coroutine, e.g. to write out what a router still has queued.
+            result = module.shutdown()
+            if inspect.isawaitable(result):
+                await result
+
 
 app = FastAPI(
     title="Virtual Personal Assistant",
     description="Multi-Agent System for Personal Assistance",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -28,14 +106,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Import routers
-from app.routers import qa, image, speech, management
+# Requests in flight and request durations for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Include routers
-app.include_router(qa.router, prefix="/qa", tags=["Question Answering"])
-app.include_router(image.router, prefix="/image", tags=["Image Processing"])
-app.include_router(speech.router, prefix="/speech", tags=["Speech Processing"])
-app.include_router(management.router, prefix="/manage", tags=["Personal Management"])
+app.state.routers = load_routers(app)
+app.state.readiness = {name: "pending" for name, module in app.state.routers.items() if hasattr(module, "warm_up")}
 
 @app.get("/")
 async def root():
@@ -43,8 +119,47 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    """
+    Liveness: the process serves requests, whether or not the subsystems are warm
+    """
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once every subsystem has warmed up, 503 with their status until then
+    """
+    readiness = dict(app.state.readiness)
+    ready = all(status == "ready" for status in readiness.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "not ready", "subsystems": readiness},
+        status_code=200 if ready else 503
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Stage timers, request durations, cache hit rates, index size and queues, in the Prometheus text format
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def profile_endpoint(seconds: float = 10.0, interval_ms: Optional[float] = None):
+    """
+    Sample the stacks of every thread for seconds and return them folded, for flame graphs;
+    404 unless metrics.profiler.enabled
+    """
+    from app.utils.profiler import profile, profiler_settings
+    settings = profiler_settings()
+    if not settings["enabled"]:
+        return JSONResponse({"detail": "Profiler disabled (metrics.profiler.enabled)"}, status_code=404)
+    interval = (interval_ms or settings["interval_ms"]) / 1000
+    try:
+        stacks = await asyncio.get_running_loop().run_in_executor(None, profile, seconds, interval)
+    except RuntimeError as e:
+        return JSONResponse({"detail": str(e)}, status_code=409)
+    return PlainTextResponse(stacks)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=config['api']['host'], port=config['api']['port'])
\ No newline at end of file
+    uvicorn.run(app, host=config['api']['host'], port=config['api']['port'])
@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+
+from app.utils.config import load_config
+
+router = APIRouter()
+
+ocr_config = load_config().get("ocr") or {}
+
+
+def _new_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=ocr_config.get("api_threads", 2), thread_name_prefix="ocr")
+
+
+# OCR is CPU-bound and each thread keeps its own tesseract model, so use a small dedicated pool.
+# Its threads start on demand; OpenCV and tesseract are imported by the first OCR job.
+executor = _new_executor()
+MAX_UPLOAD_BYTES = int(ocr_config.get("max_upload_mb", 10)) << 20
+
+
+def _ocr_bytes(data: bytes) -> str:
+    from app.services.image_processor import get_text_from_bytes
+    return get_text_from_bytes(data)
+
+
+def _warm_up_thread() -> None:
+    from app.services import image_processor
+    image_processor.warm_up()
+
+
+def preload() -> None:
+    """
+    Import OpenCV and pick the OCR backend in the main thread, where tesserocr
+    must be imported (it installs signal handlers), before workers are forked
+    """
+    from app.services import image_processor
+    image_processor.ocr_settings()
+
+
+def warm_up() -> None:
+    """
+    Import OpenCV and load the tesseract model of an OCR thread before the first upload
+    """
+    executor.submit(_warm_up_thread).result()
+
+
+def shutdown() -> None:
+    global executor
+    # Swap in an idle pool so the router still serves if the app is started again (as tests do).
+    executor.shutdown(wait=False)
+    executor = _new_executor()
+
+
+@router.post("/ocr")
+async def ocr_image(file: UploadFile = File(...)) -> Dict:
+    """
+    Extract the text of an uploaded image
+    """
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {MAX_UPLOAD_BYTES >> 20} MB")
+    try:
+        text = await asyncio.get_running_loop().run_in_executor(executor, _ocr_bytes, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "filename": file.filename,
+        "text": text
+    }
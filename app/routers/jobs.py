@@ -0,0 +1,62 @@
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from fastapi import APIRouter, Body, HTTPException, Query
+
+from app.utils import metrics
+
+if TYPE_CHECKING:
+    from app.services.jobs import JobQueue
+
+router = APIRouter()
+# Created on first use: the API only queues and reads jobs, workers run them (python -m app.services.jobs worker).
+job_queue: Optional["JobQueue"] = None
+
+def get_job_queue() -> "JobQueue":
+    global job_queue
+    if job_queue is None:
+        from app.services.jobs import JobQueue
+        # Registers the job types of the pipeline.
+        import app.services.pipeline  # noqa: F401
+        job_queue = JobQueue.from_config()
+    return job_queue
+
+def shutdown() -> None:
+    if job_queue is not None:
+        job_queue.close()
+
+def collect_metrics() -> List[metrics.Family]:
+    """
+    Jobs per type and status, at scrape time
+    """
+    if job_queue is None:
+        return []
+    counts = job_queue.store.counts()
+    return [("vpa_jobs", "gauge", "Background jobs by type and status",
+             [({"type": job_type, "status": status}, count) for (job_type, status), count in sorted(counts.items())])]
+
+metrics.register_collector(collect_metrics)
+
+@router.post("/{job_type}")
+def submit_job(job_type: str, payload: Dict = Body(default={}), key: Optional[str] = None) -> Dict:
+    """
+    Queue a job; a job with the same key (by default, the same payload) is returned instead of queued again
+    """
+    try:
+        return get_job_queue().submit(job_type, payload, key)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{job_id}")
+def get_job(job_id: str) -> Dict:
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job
+
+@router.get("")
+def list_jobs(status: Optional[str] = None, job_type: Optional[str] = Query(None, alias="type"),
+              limit: int = Query(50, ge=1, le=1000)) -> List[Dict]:
+    """
+    The latest jobs, optionally of one status and type
+    """
+    return get_job_queue().store.list(status, job_type, limit)
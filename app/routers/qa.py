@@ -1,30 +1,200 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, Optional
-from app.services.rag import RAGService
-from app.utils.sentiment import analyze_sentiment
+import asyncio
+import json
+import time
+import uuid
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
+from app.utils import metrics, sentiment as sentiment_module
+from app.utils.config import load_config
+from app.utils.sentiment import analyze_sentiment, get_analyzer
+
+if TYPE_CHECKING:
+    from app.services.interaction_log import WriteBehindLog
+    from app.services.rag import RAGService
 
 router = APIRouter()
-rag_service = RAGService()
+# Score answers after the response is sent: it then carries a sentiment only for an answer scored before.
+sentiment_in_background = (load_config().get("sentiment") or {}).get("background", False)
+# Created on first use or by warm_up: importing the router must not pull in FAISS and langchain.
+rag_service: Optional["RAGService"] = None
+# Questions, answers and feedback, written to the database behind the requests.
+interaction_log: Optional["WriteBehindLog"] = None
+_interaction_log_loaded = False
+
+def get_rag_service() -> "RAGService":
+    global rag_service
+    if rag_service is None:
+        from app.services.rag import RAGService
+        rag_service = RAGService()
+    return rag_service
+
+def get_interaction_log() -> Optional["WriteBehindLog"]:
+    global interaction_log, _interaction_log_loaded
+    if not _interaction_log_loaded:
+        from app.services.interaction_log import WriteBehindLog
+        interaction_log = WriteBehindLog.from_config()
+        _interaction_log_loaded = True
+    return interaction_log
+
+async def log_record(table: str, row: Dict) -> None:
+    log = get_interaction_log()
+    if log is not None:
+        await log.record(table, row)
+
+def warm_up() -> None:
+    """
+    Load the index, the embedding model and the sentiment lexicon before the first question
+    """
+    get_rag_service().warm_up()
+    get_analyzer()
+
+def preload() -> None:
+    """
+    Load the index without the embedding model, in the server process before it forks its workers
+    """
+    get_rag_service().preload()
+
+async def shutdown() -> None:
+    if rag_service is not None:
+        rag_service.executor.shutdown(wait=False)
+    if interaction_log is not None:
+        await interaction_log.close()
+
+def collect_metrics() -> List[metrics.Family]:
+    """
+    Index size and the counters of the answer cache, the sentiment cache and the interaction log, at scrape time
+    """
+    families = []
+    if rag_service is not None and rag_service._vector_store is not None:
+        families.append(("vpa_index_vectors", "gauge", "Vectors in the loaded FAISS index",
+                         [({"version": str(rag_service.index_version)}, rag_service._vector_store.index.ntotal)]))
+    answer_cache = rag_service.answer_cache if rag_service is not None else None
+    if answer_cache is not None:
+        cache = answer_cache.metrics()
+        families += [
+            ("vpa_answer_cache_lookups_total", "counter", "Answer cache lookups by result",
+             [({"result": result}, cache[key]) for result, key in
+              (("exact_hit", "exact_hits"), ("semantic_hit", "semantic_hits"), ("miss", "misses"))]),
+            ("vpa_answer_cache_hit_ratio", "gauge", "Share of answer cache lookups that hit", [({}, cache["hit_rate"])]),
+            ("vpa_answer_cache_entries", "gauge", "Answers in the cache", [({}, cache["entries"])]),
+        ]
+    analyzer = sentiment_module._analyzer
+    if analyzer is not None:
+        families.append(("vpa_sentiment_cache_lookups_total", "counter", "Sentiment cache lookups by result",
+                         [({"result": "hit"}, analyzer.stats["hits"]), ({"result": "miss"}, analyzer.stats["misses"])]))
+    if interaction_log is not None:
+        stats = interaction_log.stats
+        families += [
+            ("vpa_interaction_log_records_total", "counter", "Interaction and feedback records by outcome",
+             [({"outcome": outcome}, stats[outcome]) for outcome in ("queued", "written", "dropped")]),
+            ("vpa_interaction_log_queue_depth", "gauge", "Records waiting to be written",
+             [({}, interaction_log.queue_depth)]),
+        ]
+    return families
+
+metrics.register_collector(collect_metrics)
+
+def retrieval_filters(
+    category: Optional[List[str]] = Query(None),
+    source: Optional[List[str]] = Query(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Filters on the documents searched: category, source file, and a dd/mm/yyyy or yyyy-mm-dd date range
+    """
+    from app.services.filters import normalize_filters
+    try:
+        return normalize_filters({"category": category, "source": source, "date_from": date_from, "date_to": date_to})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/ask")
 async def ask_question(
-    question: str,
-    context: Optional[str] = None
+    background_tasks: BackgroundTasks,
+    question: str = Query(..., min_length=1),
+    context: Optional[str] = None,
+    filters: Optional[Dict] = Depends(retrieval_filters)
 ) -> Dict:
     """
     Process a question using RAG and return an answer
     """
+    start = time.perf_counter()
+    question_id = uuid.uuid4().hex
     try:
-        answer = await rag_service.process_question(question, context)
-        sentiment = analyze_sentiment(answer)
-        
-        return {
-            "answer": answer,
-            "sentiment": sentiment,
-            "confidence": 0.95
-        }
+        answer = await get_rag_service().process_question(question, context, filters)
+        if sentiment_in_background:
+            sentiment = get_analyzer().cached(answer)
+            if sentiment is None:
+                background_tasks.add_task(analyze_sentiment, answer)
+        else:
+            with metrics.timed("sentiment"):
+                sentiment = analyze_sentiment(answer)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    await log_record("qa_interactions", {
+        "question_id": question_id, "endpoint": "ask", "question": question, "context": context,
+        "filters": filters, "answer": answer, "sentiment": sentiment,
+        "latency_ms": (time.perf_counter() - start) * 1000,
+    })
+    return {
+        "question_id": question_id,
+        "answer": answer,
+        "sentiment": sentiment,
+        "confidence": 0.95
+    }
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def answer_events(question: str, context: Optional[str], filters: Optional[Dict] = None) -> AsyncIterator[str]:
+    start = time.perf_counter()
+    question_id = uuid.uuid4().hex
+    parts = []
+    try:
+        async for event, data in get_rag_service().stream_question(question, context, filters):
+            if event == "token":
+                parts.append(data)
+            yield sse(event, data)
+    except Exception as e:
+        yield sse("error", {"detail": str(e)})
+        return
+    # Every token is out already; sentiment runs off the event loop and comes last.
+    answer = "".join(parts)
+    sentiment = await asyncio.get_running_loop().run_in_executor(None, analyze_sentiment, answer)
+    yield sse("done", {"question_id": question_id, "sentiment": sentiment, "confidence": 0.95})
+    await log_record("qa_interactions", {
+        "question_id": question_id, "endpoint": "stream", "question": question, "context": context,
+        "filters": filters, "answer": answer, "sentiment": sentiment,
+        "latency_ms": (time.perf_counter() - start) * 1000,
+    })
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    question: str = Query(..., min_length=1),
+    context: Optional[str] = None,
+    filters: Optional[Dict] = Depends(retrieval_filters)
+) -> StreamingResponse:
+    """
+    Stream the answer as server-sent events: sources, then token events, then done with the sentiment
+    """
+    return StreamingResponse(
+        answer_events(question, context, filters),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/cache")
+async def answer_cache_stats() -> Dict:
+    """
+    Hit / miss counters of the answer cache
+    """
+    answer_cache = get_rag_service().answer_cache
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.metrics()}
 
 @router.post("/feedback")
 async def provide_feedback(
@@ -33,8 +203,9 @@ async def provide_feedback(
     rating: int
 ) -> Dict:
     """
-    Submit feedback for a previous question-answer interaction
+    Submit feedback for a previous question-answer interaction (the question_id of its answer)
     """
+    await log_record("qa_feedback", {"question_id": question_id, "feedback": feedback, "rating": rating})
     return {
         "status": "success",
         "message": "Feedback recorded successfully"
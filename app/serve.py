@@ -0,0 +1,185 @@
+"""
+Production server: one master process, api.workers pre-forked uvicorn workers.
+
+    python -m app.serve [--workers 4] [--port 8000]
+
+The master imports the app, loads what the routers can share (their
+preload(): the FAISS index, the docstore, the BM25 and metadata indexes),
+binds the listening socket and then forks the workers. The workers inherit
+all of it: the memory-mapped index through the page cache, the rest copy-on-
+write; gc.freeze() keeps the garbage collector from touching, and so copying,
+the preloaded objects. The kernel spreads the connections over the workers,
+which share the one socket.
+
+What cannot cross a fork is left to each worker's warm-up (app.main): the
+embedding model, whose torch / ONNX Runtime thread pools would not exist in
+the child, tesseract, the LLM client and the thread pools of rag.search_threads
+and ocr.api_threads. Each worker runs api.worker_threads inference threads,
+by default cores / workers, so that the workers do not oversubscribe the CPU.
+
+The master restarts a worker that dies and, on SIGTERM or SIGINT, stops them
+all, killing those still busy after api.graceful_timeout_s seconds.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+# A worker that dies sooner than this after its start is restarted only after
+# a pause, so that a broken deployment does not fork in a tight loop.
+MIN_WORKER_LIFETIME_S = 1.0
+
+
+def serving_settings(workers: Optional[int] = None, worker_threads: Optional[int] = None) -> Dict:
+    """
+    Address, worker count, inference threads per worker and shutdown timeout
+    from the api section of config.yaml; workers and worker_threads override it
+    """
+    api_config = load_config().get("api") or {}
+    workers = workers or api_config.get("workers") or os.cpu_count() or 1
+    return {
+        "host": api_config.get("host", "0.0.0.0"),
+        "port": api_config.get("port", 8000),
+        "workers": workers,
+        "worker_threads": (worker_threads or api_config.get("worker_threads")
+                           or max(1, (os.cpu_count() or 1) // workers)),
+        "graceful_timeout_s": api_config.get("graceful_timeout_s", 30),
+        "backlog": api_config.get("backlog", 2048),
+    }
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(app) -> None:
+    """
+    Run the preload() of every router: load in the master what the workers will share
+    """
+    for name, module in app.state.routers.items():
+        if hasattr(module, "preload"):
+            start = time.perf_counter()
+            module.preload()
+            logger.info(f"Preloaded {name} in {time.perf_counter() - start:.1f} s")
+
+
+def _run_worker(app, sock: socket.socket, worker_threads: int) -> None:
+    # Imported here so that the master's imports stay those of the app.
+    import uvicorn
+    from app.services import embedders
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    embedders.default_threads = worker_threads
+    try:
+        import faiss
+        faiss.omp_set_num_threads(worker_threads)
+    except ImportError:
+        pass
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket, worker_threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            _run_worker(app, sock, worker_threads)
+            status = 0
+        except SystemExit as e:
+            # uvicorn exits with 3 when the app fails to start.
+            status = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception("Worker crashed")
+        finally:
+            # Never return into the master's loop, nor run its atexit handlers.
+            os._exit(status)
+    return pid
+
+
+def serve(settings: Optional[Dict] = None) -> None:
+    """
+    Preload, bind, fork settings["workers"] workers and supervise them until SIGTERM / SIGINT
+    """
+    settings = settings or serving_settings()
+    from app.main import app
+
+    preload(app)
+    sock = bind_socket(settings["host"], settings["port"], settings["backlog"])
+    # Everything allocated so far is shared with the workers: keep it out of the
+    # collector's generations, whose scans write to every object they visit.
+    gc.collect()
+    gc.freeze()
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    workers = {}
+    for _ in range(settings["workers"]):
+        workers[_spawn(app, sock, settings["worker_threads"])] = time.monotonic()
+    logger.info(f"Serving on {settings['host']}:{settings['port']} with {len(workers)} workers "
+                f"of {settings['worker_threads']} inference threads, pids {sorted(workers)}")
+
+    deadline = None
+    while workers:
+        if stopping and deadline is None:
+            logger.info(f"Stopping {len(workers)} workers")
+            deadline = time.monotonic() + settings["graceful_timeout_s"]
+            for pid in workers:
+                os.kill(pid, signal.SIGTERM)
+        if deadline is not None and time.monotonic() > deadline:
+            logger.warning(f"Killing {len(workers)} workers still busy after {settings['graceful_timeout_s']} s")
+            for pid in workers:
+                os.kill(pid, signal.SIGKILL)
+            deadline = float("inf")
+
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {status}, restarting it")
+        if time.monotonic() - started < MIN_WORKER_LIFETIME_S:
+            time.sleep(MIN_WORKER_LIFETIME_S)
+        workers[_spawn(app, sock, settings["worker_threads"])] = time.monotonic()
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", help="override api.host from config.yaml")
+    parser.add_argument("--port", type=int, help="override api.port from config.yaml")
+    parser.add_argument("--workers", type=int, help="override api.workers from config.yaml")
+    parser.add_argument("--worker-threads", type=int, help="override api.worker_threads from config.yaml")
+    args = parser.parse_args(argv)
+    settings = serving_settings(args.workers, args.worker_threads)
+    if args.host:
+        settings["host"] = args.host
+    if args.port is not None:
+        settings["port"] = args.port
+    serve(settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Two-tier cache of the answers given by /qa/ask.
+
+    exact     the normalised question and context hash to a key
+    semantic  the question embedding is compared (cosine) with the cached
+              questions asked with the same context; the best one above
+              similarity_threshold is taken
+
+Entries expire ttl seconds after they were stored, and the least recently
+used go once there are more than max_entries. Entries belong to an index
+version (the manifest version of the FAISS index): when the service loads
+another index, answers given from the old one are no longer returned.
+
+Backends (rag.answer_cache.backend in config.yaml):
+    memory  this process only
+    redis   shared by every API worker; each worker keeps a copy of the
+            question vectors, refreshed when another worker changes them
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+Embed = Callable[[str], Sequence[float]]
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    Case, Unicode form, whitespace and trailing punctuation do not change a question
+    """
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return re.sub(r"\s+", " ", text).strip(" ?!.,;:")
+
+
+def cache_key(question: str, context: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Key of the exact tier, and the scope (hashed context) the semantic tier searches in
+    """
+    scope = hashlib.sha256(normalize(context).encode("utf-8")).hexdigest()[:16]
+    key = hashlib.sha256(f"{scope}|{normalize(question)}".encode("utf-8")).hexdigest()[:32]
+    return key, scope
+
+
+def _unit(vector: Optional[Sequence[float]]) -> Optional[np.ndarray]:
+    # None for anything but a finite 1-d vector (no embedding, a failed one), so it is never compared or stored.
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    if vector.ndim != 1 or not vector.size or not np.isfinite(vector).all():
+        return None
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class MemoryBackend:
+    """
+    Entries of this process in LRU order
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Per scope: keys and their stacked vectors, rebuilt after a change.
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def reset(self, version) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: Dict, vector: Optional[np.ndarray]) -> int:
+        """
+        Store entry and return how many least recently used entries were evicted
+        """
+        with self._lock:
+            self._entries[key] = dict(entry, vector=vector)
+            self._entries.move_to_end(key)
+            self._matrices.pop(entry["scope"], None)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._matrices.pop(entry["scope"], None)
+
+    def vectors(self, scope: str) -> Tuple[List[str], np.ndarray]:
+        with self._lock:
+            if scope not in self._matrices:
+                keys = [key for key, entry in self._entries.items()
+                        if entry["scope"] == scope and entry["vector"] is not None]
+                matrix = np.vstack([self._entries[key]["vector"] for key in keys]) if keys else None
+                self._matrices[scope] = (keys, matrix)
+            return self._matrices[scope]
+
+
+class RedisBackend:
+    """
+    Entries shared through redis under <prefix>:<index version>:
+
+        e:<key>  the entry as JSON, expiring after ttl
+        lru      sorted set of keys by last use, trimmed to max_entries
+        vectors  hash of key -> scope + float32 question vector
+        gen      counter bumped whenever the vectors change
+    """
+
+    def __init__(self, client, max_entries: int = 1000, ttl: float = 3600, prefix: str = "qa-cache"):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self._namespace = f"{prefix}:none:"
+        self._generation = None
+        self._matrices = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBackend":
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def reset(self, version) -> None:
+        # Other versions are left alone: their entries expire on their own.
+        with self._lock:
+            self._namespace = f"{self.prefix}:{version}:"
+            self._generation, self._matrices = None, None
+
+    def _name(self, suffix: str) -> str:
+        return self._namespace + suffix
+
+    def __len__(self) -> int:
+        return self.client.zcard(self._name("lru"))
+
+    def get(self, key: str) -> Optional[Dict]:
+        data = self.client.get(self._name(f"e:{key}"))
+        if data is None:
+            return None
+        self.client.zadd(self._name("lru"), {key: time.time()})
+        return json.loads(data)
+
+    def put(self, key: str, entry: Dict, vector: Optional[np.ndarray]) -> int:
+        lru = self._name("lru")
+        self.client.set(self._name(f"e:{key}"), json.dumps(entry, ensure_ascii=False), ex=max(1, int(self.ttl)))
+        self.client.zadd(lru, {key: time.time()})
+        if vector is not None:
+            self.client.hset(self._name("vectors"), key, entry["scope"].encode() + vector.astype(np.float32).tobytes())
+            self.client.incr(self._name("gen"))
+        # Keys unused for ttl have expired in redis already; past that, drop the least recently used.
+        for member in self.client.zrangebyscore(lru, 0, time.time() - self.ttl):
+            self.delete(_text(member))
+        overflow = self.client.zcard(lru) - self.max_entries
+        if overflow <= 0:
+            return 0
+        for member, _ in self.client.zpopmin(lru, overflow):
+            self.delete(_text(member))
+        return overflow
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._name(f"e:{key}"))
+        self.client.zrem(self._name("lru"), key)
+        if self.client.hdel(self._name("vectors"), key):
+            self.client.incr(self._name("gen"))
+
+    def vectors(self, scope: str) -> Tuple[List[str], np.ndarray]:
+        # One GET per lookup; the vectors are only fetched again after some worker changed them.
+        generation = self.client.get(self._name("gen"))
+        with self._lock:
+            if self._matrices is None or generation != self._generation:
+                grouped = {}
+                for key, value in self.client.hgetall(self._name("vectors")).items():
+                    keys, vectors = grouped.setdefault(value[:16].decode(), ([], []))
+                    keys.append(_text(key))
+                    vectors.append(np.frombuffer(value[16:], dtype=np.float32))
+                self._generation = generation
+                self._matrices = {name: (keys, np.vstack(vectors)) for name, (keys, vectors) in grouped.items()}
+            return self._matrices.get(scope, ([], None))
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class AnswerCache:
+    def __init__(self, backend=None, embed: Optional[Embed] = None, similarity_threshold: float = 0.9,
+                 ttl: float = 3600):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.version = None
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stored": 0, "evicted": 0, "expired": 0}
+        # Lookups and stores run on the executor threads of the RAG service.
+        self._stats_lock = threading.Lock()
+        self.backend.reset(None)
+
+    @classmethod
+    def from_config(cls, embed: Optional[Embed] = None) -> Optional["AnswerCache"]:
+        """
+        The cache configured under rag.answer_cache, or None when it is disabled
+        """
+        settings = (load_config().get("rag") or {}).get("answer_cache") or {}
+        if not settings.get("enabled", True):
+            return None
+        max_entries = settings.get("max_entries", 1000)
+        ttl = settings.get("ttl_s", 3600)
+        if settings.get("backend", "memory") == "redis":
+            redis_config = (load_config().get("database") or {}).get("redis") or {}
+            url = os.path.expandvars(settings.get("redis_url") or redis_config.get("url") or "redis://localhost:6379/0")
+            backend = RedisBackend.from_url(url, max_entries=max_entries, ttl=ttl)
+        else:
+            backend = MemoryBackend(max_entries)
+        threshold = settings.get("similarity_threshold", 0.9)
+        return cls(backend, embed if settings.get("semantic", True) else None, threshold, ttl)
+
+    def set_version(self, version) -> None:
+        """
+        Forget the answers of any other index version
+        """
+        if version != self.version:
+            self.version = version
+            self.backend.reset(version)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    @property
+    def hit_rate(self) -> float:
+        with self._stats_lock:
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def metrics(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "hit_rate": self.hit_rate, "entries": len(self.backend), "version": self.version}
+
+    def _fresh(self, key: str) -> Optional[Dict]:
+        entry = self.backend.get(key)
+        if entry is not None and time.time() - entry["created"] > self.ttl:
+            self.backend.delete(key)
+            self._count("expired")
+            return None
+        return entry
+
+    @property
+    def semantic(self) -> bool:
+        return self.embed is not None
+
+    def lookup_exact(self, question: str, context: Optional[str] = None) -> Optional[str]:
+        """
+        The answer cached for this very question, without embedding it; a miss
+        is only counted by the lookup_similar that follows it
+        """
+        entry = self._fresh(cache_key(question, context)[0])
+        if entry is None:
+            return None
+        self._count("exact_hits")
+        return entry["answer"]
+
+    def lookup_similar(self, question: str, context: Optional[str],
+                       vector: Optional[Sequence[float]]) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        The answer to the most similar cached question given its embedding
+        (e.g. the one computed for retrieval), and the vector to store a new
+        answer with; without a usable vector, only a miss
+        """
+        vector = _unit(vector) if self.semantic else None
+        if vector is not None:
+            keys, matrix = self.backend.vectors(cache_key(question, context)[1])
+            if keys and matrix.shape[1] == vector.shape[0]:
+                scores = matrix @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < self.similarity_threshold:
+                        break
+                    entry = self._fresh(keys[i])
+                    if entry is not None:
+                        self._count("semantic_hits")
+                        return entry["answer"], vector
+        self._count("misses")
+        return None, vector
+
+    def lookup(self, question: str, context: Optional[str] = None,
+               vector: Optional[Sequence[float]] = None) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        The cached answer to question, if any, and the question vector to store a new answer with;
+        the question is embedded with embed when no vector is given
+        """
+        answer = self.lookup_exact(question, context)
+        if answer is not None:
+            return answer, None
+        if vector is None and self.semantic:
+            vector = self.embed(normalize(question))
+        return self.lookup_similar(question, context, vector)
+
+    def store(self, question: str, context: Optional[str], answer: str,
+              vector: Optional[np.ndarray] = None) -> None:
+        key, scope = cache_key(question, context)
+        entry = {"question": normalize(question), "scope": scope, "answer": answer, "created": time.time()}
+        self._count("evicted", self.backend.put(key, entry, _unit(vector)))
+        self._count("stored")
@@ -0,0 +1,156 @@
+"""
+Chunking stage between the JSON loader and the embedder.
+
+all-MiniLM-L6-v2 only reads the first 256 tokens of its input, so long
+documents (industry program descriptions run to tens of KB) are split on
+paragraphs, then sentences, into overlapping chunks that each fit the model.
+Chunks keep the parent's metadata plus parent_id and a chunk key, so
+retrieval can fold hits back into one result per parent document.
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.indexing import document_id
+
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 100
+
+SENTENCE_END = re.compile(r"(?<=[.!?…;])\s+")
+
+
+def _split_long(sentence: str, chunk_size: int) -> List[str]:
+    pieces, current = [], ""
+    for word in sentence.split():
+        if current and len(current) + len(word) + 1 > chunk_size:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    # A single "word" longer than chunk_size (e.g. a url) is cut as is.
+    return [piece[i:i + chunk_size] for piece in pieces for i in range(0, len(piece), chunk_size)]
+
+
+def _pieces(text: str, chunk_size: int) -> Iterator[Tuple[str, str]]:
+    # Yields (separator, piece); a new paragraph is joined with a newline, a sentence with a space.
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_size:
+            yield "\n", paragraph
+            continue
+        separator = "\n"
+        for sentence in SENTENCE_END.split(paragraph):
+            for piece in ([sentence] if len(sentence) <= chunk_size else _split_long(sentence, chunk_size)):
+                yield separator, piece
+                separator = " "
+
+
+def _join(pieces: List[Tuple[str, str]]) -> str:
+    return "".join(separator + piece for separator, piece in pieces).strip()
+
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split text into chunks of at most chunk_size characters on paragraph and
+    sentence boundaries; consecutive chunks share up to chunk_overlap characters
+    """
+    chunks, current, length = [], [], 0
+    for separator, piece in _pieces(text, chunk_size):
+        if current and length + len(piece) + 1 > chunk_size:
+            chunks.append(_join(current))
+            # Carry the trailing pieces that fit in the overlap into the next chunk.
+            overlap, overlap_length = [], 0
+            for previous in reversed(current):
+                if overlap_length + len(previous[1]) + 1 > chunk_overlap:
+                    break
+                overlap.insert(0, previous)
+                overlap_length += len(previous[1]) + 1
+            current, length = overlap, overlap_length
+            while current and length + len(piece) + 1 > chunk_size:
+                length -= len(current.pop(0)[1]) + 1
+        current.append((separator, piece))
+        length += len(piece) + 1
+    if current:
+        chunks.append(_join(current))
+    return chunks
+
+
+def _structure_chunks(program_name: str, program_structure: Dict, chunk_size: int) -> Iterator[Tuple[str, str]]:
+    # One chunk per major and semester: "Chương trình X - Chuyên ngành Y - ky 1: Đại số (3 tín chỉ); ..."
+    # A semester whose course list does not fit is continued in numbered chunks.
+    for major, semesters in program_structure.items():
+        for semester, subjects in semesters.items():
+            header = f"{program_name} - Chuyên ngành {major} - {semester}: "
+            courses = [f"{s.get('subject', '')} ({s.get('tin_chi', '')})" for s in subjects]
+            part, text = 0, ""
+            for course in courses:
+                if text and len(header) + len(text) + len(course) + 2 > chunk_size:
+                    yield f"{major}/{semester}/{part}", header + text
+                    part, text = part + 1, ""
+                text = f"{text}; {course}" if text else course
+            if text:
+                yield f"{major}/{semester}/{part}", header + text
+
+
+def chunk_document(doc: Document, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[Document]:
+    """
+    Split one parent document into chunk Documents
+    """
+    metadata = dict(doc.metadata)
+    program_structure = metadata.pop("program_structure", None)
+    parent_id = document_id(Document(page_content=doc.page_content, metadata=metadata))
+    title = metadata.get("title", "")
+
+    texts = split_text(doc.page_content, chunk_size, chunk_overlap)
+    if not texts and title:
+        # Notices that are only scanned images still get found by their title.
+        texts = [title]
+    chunks = [(str(i), text) for i, text in enumerate(texts)]
+    if program_structure:
+        chunks.extend(_structure_chunks(title, program_structure, chunk_size))
+
+    for key, text in chunks:
+        yield Document(page_content=text, metadata={**metadata, "parent_id": parent_id, "chunk": key})
+
+
+def chunk_documents(documents: Iterable[Document], chunk_size: int = CHUNK_SIZE,
+                    chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[Document]:
+    """
+    Lazily chunk a stream of parent documents
+    """
+    for doc in documents:
+        yield from chunk_document(doc, chunk_size, chunk_overlap)
+
+
+def merge_chunks(hits: List[Tuple[Document, float]], k: int) -> List[Tuple[Document, float]]:
+    """
+    Fold chunk hits (best first) into at most k parent documents. A parent
+    scores as its best chunk; its text is its matched chunks in document order.
+    """
+    parents = {}
+    for doc, score in hits:
+        key = doc.metadata.get("parent_id", id(doc))
+        if key in parents:
+            parents[key][2].append(doc)
+        elif len(parents) < k:
+            parents[key] = (doc, score, [doc])
+
+    results = []
+    for best, score, docs in parents.values():
+        if "parent_id" not in best.metadata:
+            results.append((best, score))
+            continue
+        docs.sort(key=lambda d: _chunk_order(d.metadata["chunk"]))
+        metadata = {key: value for key, value in best.metadata.items() if key not in ("parent_id", "chunk")}
+        metadata["id"] = best.metadata["parent_id"]
+        results.append((Document(page_content="\n...\n".join(d.page_content for d in docs), metadata=metadata), score))
+    return results
+
+
+def _chunk_order(key: str):
+    # Text chunks ("0", "1", ...) first and in order, then the structure chunks.
+    return (0, int(key), "") if key.isdigit() else (1, 0, key)
@@ -0,0 +1,123 @@
+"""
+Docstore whose documents live in a memory-mapped file instead of the Python heap.
+
+The InMemoryDocstore pickled next to index.faiss holds every Document as
+Python objects, so each API worker pays for the whole corpus text. With
+rag.index.docstore set to "blob", save_index writes the documents to
+docs.<token>.bin as length-prefixed records (a little-endian uint32 byte
+count, then [page_content, metadata] as UTF-8 JSON), and pickles only a
+BlobDocstore holding each id's offset. Workers map the file read-only and
+decode a document when search() asks for it, i.e. only for the hits of a
+query; the pages stay in the page cache shared by all workers.
+
+Documents added after loading (an incremental build) are kept in memory
+until the next save rewrites the file.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+DOCS_PREFIX = "docs."
+RECORD_LENGTH = struct.Struct("<I")
+
+
+def encode_document(doc: Document) -> bytes:
+    payload = json.dumps([doc.page_content, doc.metadata], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return RECORD_LENGTH.pack(len(payload)) + payload
+
+
+def write_documents(path: str, documents: Iterable[Tuple[str, Document]]) -> Dict[str, int]:
+    """
+    Write (document id, Document) pairs to path as length-prefixed records, returning each id's offset
+    """
+    offsets = {}
+    position = 0
+    with open(path, "wb") as f:
+        for doc_id, doc in documents:
+            record = encode_document(doc)
+            f.write(record)
+            offsets[doc_id] = position
+            position += len(record)
+    return offsets
+
+
+class BlobDocstore(Docstore, AddableMixin):
+    """
+    Documents read on demand from a memory-mapped docs.<token>.bin
+    """
+
+    def __init__(self, filename: str, offsets: Dict[str, int], directory: Optional[str] = None):
+        self.filename = filename
+        self.offsets = offsets
+        self._added: Dict[str, Document] = {}
+        self._map = None
+        if directory is not None:
+            self.open(directory)
+
+    def __getstate__(self):
+        # Only the offsets are pickled: the map is reopened by load_index.
+        return {"filename": self.filename, "offsets": self.offsets}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"], state["offsets"])
+
+    def open(self, directory: str) -> None:
+        with open(os.path.join(directory, self.filename), "rb") as f:
+            # The map keeps its own reference to the file, which may be closed.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) + len(self._added)
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self._added.get(search)
+        if doc is not None:
+            return doc
+        offset = self.offsets.get(search)
+        if offset is None:
+            return f"ID {search} not found."
+        if self._map is None:
+            raise RuntimeError(f"{self.filename} is not open, load the index with app.services.indexing.load_index")
+        (length,) = RECORD_LENGTH.unpack_from(self._map, offset)
+        start = offset + RECORD_LENGTH.size
+        page_content, metadata = json.loads(self._map[start:start + length].decode("utf-8"))
+        return Document(page_content=page_content, metadata=metadata)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [doc_id for doc_id in texts if doc_id in self.offsets or doc_id in self._added]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            self.offsets.pop(doc_id, None)
+            self._added.pop(doc_id, None)
+
+
+def save_blob_docstore(directory: str, documents: Iterable[Tuple[str, Document]]) -> BlobDocstore:
+    """
+    Write documents to a new docs.<token>.bin in directory and return a BlobDocstore over it.
+    Every save gets a new file name, so a worker that mapped the previous one keeps reading it.
+    """
+    filename = f"{DOCS_PREFIX}{uuid.uuid4().hex[:12]}.bin"
+    tmp_path = os.path.join(directory, f"{filename}.tmp")
+    offsets = write_documents(tmp_path, documents)
+    os.replace(tmp_path, os.path.join(directory, filename))
+    return BlobDocstore(filename, offsets, directory)
+
+
+def remove_stale_blobs(directory: str, keep: Optional[str] = None) -> None:
+    """
+    Delete the docs.*.bin files of directory other than keep; open maps of them stay readable
+    """
+    for path in glob.glob(os.path.join(directory, f"{DOCS_PREFIX}*.bin")):
+        if os.path.basename(path) != keep:
+            os.remove(path)
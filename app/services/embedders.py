@@ -0,0 +1,287 @@
+"""
+Embedding backends and the on-disk embedding cache (rag.embedder in config.yaml).
+
+Backends:
+    huggingface  sentence-transformers on PyTorch; rag.embedding_model may be a local directory
+    onnx         ONNX Runtime over a model exported once with
+
+                     python -m app.services.embedders export --out models/all-MiniLM-L6-v2-onnx
+
+                 It loads from that directory only, without torch or network access,
+                 optionally with the weights dynamically quantised to int8.
+
+Both take a thread count and a batch size. The ONNX backend sorts a batch by
+token length before padding it, and mean-pools and normalises the token
+embeddings as the sentence-transformers pipeline of all-MiniLM-L6-v2 does.
+
+CachedEmbeddings keeps the vector of every embedded text in SQLite, keyed on
+a hash of the model name and the text, so the indexer never embeds the same
+text twice: a --full rebuild, an index type change or a metadata-only edit
+reuse the stored vectors.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+BACKENDS = ("huggingface", "onnx")
+CACHE_DIR = os.path.join("data", "cache", "embeddings")
+# Written next to the ONNX models by export_onnx.
+SETTINGS_FILE = "embedder.json"
+MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_int8.onnx"
+# Inference threads when rag.embedder.threads is 0. app.serve sets it in each
+# worker so that the workers together run one thread per core.
+default_threads: Optional[int] = None
+
+
+def embedder_settings() -> Dict:
+    rag_config = load_config().get("rag") or {}
+    return rag_config.get("embedder") or {}
+
+
+def create_embeddings(model_name: str, settings: Optional[Dict] = None) -> Embeddings:
+    """
+    The embedding model of settings["backend"] (rag.embedder from config.yaml by default)
+    """
+    settings = embedder_settings() if settings is None else settings
+    backend = settings.get("backend", "huggingface")
+    threads = settings.get("threads") or default_threads
+    batch_size = settings.get("batch_size", 32)
+    if backend == "onnx":
+        return OnnxEmbeddings(settings["model_dir"], int8=settings.get("int8", False), threads=threads,
+                              batch_size=batch_size)
+    if backend != "huggingface":
+        raise ValueError(f"Unknown embedder backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+    # Imported here so that loading a prebuilt index does not pull in torch.
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if threads:
+        torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Mean-pooled, L2-normalised sentence embeddings computed by ONNX Runtime
+    """
+
+    def __init__(self, model_dir: str, int8: bool = False, threads: Optional[int] = None, batch_size: int = 32):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        path = os.path.join(model_dir, INT8_MODEL_FILE if int8 else MODEL_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No ONNX model at {path}, export it with: python -m app.services.embedders export")
+        settings = {}
+        if os.path.exists(os.path.join(model_dir, SETTINGS_FILE)):
+            with open(os.path.join(model_dir, SETTINGS_FILE), encoding="utf-8") as f:
+                settings = json.load(f)
+        # int8 vectors differ a little from the float ones: a separate model for the manifest and the cache.
+        self.model_name = settings.get("model_name", os.path.basename(os.path.normpath(model_dir))) + (":int8" if int8 else "")
+        self.batch_size = batch_size
+        self.normalize = settings.get("normalize", True)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(settings.get("max_length", 256))
+        self.tokenizer.no_padding()
+        self.pad_id = settings.get("pad_id", 0)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or 0
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _embed_batch(self, encodings) -> np.ndarray:
+        length = max(len(encoding.ids) for encoding in encodings)
+        ids = np.full((len(encodings), length), self.pad_id, dtype=np.int64)
+        mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            ids[row, :len(encoding.ids)] = encoding.ids
+            mask[row, :len(encoding.ids)] = 1
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        tokens = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        weights = mask[:, :, None].astype(np.float32)
+        vectors = (tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(list(texts))
+        # Texts of similar length share a batch, so little of it is padding.
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch = self._embed_batch([encodings[i] for i in rows])
+            if not vectors.shape[1]:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    The embedding model of create_embeddings, created on first use by the process that uses it.
+
+    A server that loads the index before forking its workers (app.serve) must
+    not create the model there: the inference thread pools of torch and ONNX
+    Runtime do not survive fork().
+    """
+
+    def __init__(self, model_name: str, settings: Optional[Dict] = None):
+        self.model_name = model_name
+        self.settings = settings
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = create_embeddings(self.model_name, self.settings)
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    embed_documents through a SQLite table of vectors keyed on sha256(model name, text)
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_dir: str = CACHE_DIR):
+        self.embeddings = embeddings
+        self.model_name = getattr(embeddings, "model_name", type(embeddings).__name__)
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "vectors.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, embeddings: Embeddings, settings: Optional[Dict] = None) -> Embeddings:
+        """
+        embeddings behind the cache of rag.embedder.cache, or as they are when it is disabled
+        """
+        settings = ((embedder_settings() if settings is None else settings).get("cache")) or {}
+        if not settings.get("enabled", True):
+            return embeddings
+        return cls(embeddings, settings.get("dir", CACHE_DIR))
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).digest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # Stay under SQLite's limit on query parameters.
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(part))})", part).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32).tolist()) for key, vector in rows)
+            missing = {key: text for key, text in zip(keys, texts) if key not in found}
+            # Counted under the lock: the embed and index jobs share this object across threads.
+            self.stats["hits"] += len(texts) - sum(key in missing for key in keys)
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            found.update(zip(missing, vectors))
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?)", [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in zip(missing, vectors)])
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Questions are rarely repeated, and the answer cache covers those that are.
+        return self.embeddings.embed_query(text)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def export_onnx(model: str, out_dir: str, int8: bool = True, max_length: int = 256) -> Dict:
+    """
+    Export a Hugging Face / sentence-transformers model (name or directory) to out_dir
+    as model.onnx, and model_int8.onnx with dynamically quantised weights
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model)
+    transformer = AutoModel.from_pretrained(model).eval()
+    tokenizer.save_pretrained(out_dir)
+    inputs = tokenizer(["xuất mô hình", "export"], padding=True, return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in inputs]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+    class TokenEmbeddings(torch.nn.Module):
+        # Positional inputs in the order of names, whatever the model's forward() signature.
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *tensors):
+            return self.transformer(**dict(zip(names, tensors))).last_hidden_state
+
+    with torch.no_grad():
+        torch.onnx.export(TokenEmbeddings(), tuple(inputs[name] for name in names), os.path.join(out_dir, MODEL_FILE),
+                          input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes,
+                          opset_version=14, dynamo=False)
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(out_dir, MODEL_FILE), os.path.join(out_dir, INT8_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+    settings = {"model_name": model, "max_length": max_length, "pad_id": tokenizer.pad_token_id or 0, "normalize": True}
+    with open(os.path.join(out_dir, SETTINGS_FILE), "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=1)
+    return settings
+
+
+def main(argv=None):
+    rag_config = load_config().get("rag") or {}
+    parser = argparse.ArgumentParser(description="Prepare the ONNX embedding backend")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="export the embedding model to ONNX (needs torch and the model)")
+    export.add_argument("--model", default=rag_config.get("embedding_model"))
+    export.add_argument("--out", default=(rag_config.get("embedder") or {}).get("model_dir"))
+    export.add_argument("--no-int8", action="store_true", help="skip the int8-quantised model")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_onnx(args.model, args.out, int8=not args.no_int8)
+        print(f"📦 Đã xuất {args.model} sang ONNX trong {args.out}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
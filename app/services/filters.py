@@ -0,0 +1,229 @@
+"""
+Structured retrieval filters (category, date range, source file), resolved before the search.
+
+A filter is a dict with any of:
+    category   "event", "industry", ... or a list of them
+    source     the data file a document was loaded from ("notices", "news", ...) or a list
+    date_from  first day, "dd/mm/yyyy", "yyyy-mm-dd" or a yyyymmdd integer
+    date_to    last day, same formats
+
+MetadataIndex keeps one row per indexed chunk with its FAISS id, category,
+source and date span as sortable yyyymmdd integers, parsed from the dates
+the crawlers scrape ("08/12/2024", "27/11/2024 13:00 - 27/02/2025 16:00").
+A filter is evaluated with numpy over these columns. The matching FAISS ids
+become an IDSelector passed to index.search, so only candidate vectors are
+scored, and the matching BM25 slots mask the lexical scores before their
+top-k. A document matches a date range when its span overlaps it; documents
+without a date never match one.
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.services.indexing import faiss_id
+
+FILTER_KEYS = ("category", "source", "date_from", "date_to")
+
+DMY = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+ISO = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+
+# Selectors of the most recent distinct filters, per MetadataIndex.
+SELECTION_CACHE_SIZE = 64
+
+
+def _ymd(year: int, month: int, day: int) -> Optional[int]:
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return year * 10000 + month * 100 + day
+
+
+def parse_dates(text) -> List[int]:
+    """
+    Every date of text as a yyyymmdd integer, in order of appearance
+    """
+    if text is None or text == "":
+        return []
+    if isinstance(text, (int, np.integer)):
+        return [int(text)] if 10000101 <= text <= 99991231 else []
+    text = str(text)
+    dates = [_ymd(int(y), int(m), int(d)) for d, m, y in DMY.findall(text)]
+    dates += [_ymd(int(y), int(m), int(d)) for y, m, d in ISO.findall(text)]
+    if not dates and text.isdigit() and len(text) == 8:
+        dates = [_ymd(int(text[:4]), int(text[4:6]), int(text[6:]))]
+    return [date for date in dates if date is not None]
+
+
+def parse_date(text) -> Optional[int]:
+    """
+    "08/12/2024" -> 20241208; None when text holds no date
+    """
+    dates = parse_dates(text)
+    return dates[0] if dates else None
+
+
+def date_span(text) -> Tuple[int, int]:
+    """
+    First and last day of a scraped date, (0, 0) when it has none
+    """
+    dates = parse_dates(text)
+    return (min(dates), max(dates)) if dates else (0, 0)
+
+
+def _values(value) -> Tuple[str, ...]:
+    if isinstance(value, str):
+        value = [value]
+    return tuple(sorted({str(v).strip() for v in value if str(v).strip()}))
+
+
+def normalize_filters(filters: Optional[Dict]) -> Optional[Dict]:
+    """
+    Validate filters and put them in canonical form; None when nothing is filtered.
+    Raise ValueError for an unknown key or a date that cannot be parsed.
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter {', '.join(sorted(unknown))}, expected one of {', '.join(FILTER_KEYS)}")
+    normalized = {}
+    for key in ("category", "source"):
+        if filters.get(key):
+            normalized[key] = _values(filters[key])
+    for key in ("date_from", "date_to"):
+        value = filters.get(key)
+        if value is None or value == "":
+            continue
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"{key}={value!r} is not a date, expected dd/mm/yyyy or yyyy-mm-dd")
+        normalized[key] = date
+    if normalized.get("date_from", 0) > normalized.get("date_to", 99991231):
+        raise ValueError("date_from is after date_to")
+    return normalized or None
+
+
+def filter_key(filters: Optional[Dict]) -> Optional[Tuple]:
+    """
+    Hashable form of normalized filters
+    """
+    return tuple(sorted(filters.items())) if filters else None
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """
+    SearchParameters restricting index.search to selector, keeping the index's nprobe / efSearch
+    """
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        # The graph walk only returns reachable candidates: a very selective
+        # filter can yield fewer than k hits.
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+class Selection:
+    """
+    The chunks that match a filter: an IDSelector over their FAISS ids and their BM25 slots
+    """
+
+    def __init__(self, ids: np.ndarray, lexical_slots: np.ndarray):
+        self.ids = ids
+        self.lexical_slots = lexical_slots
+        # IDSelectorBatch copies the ids into a hash set with a bloom filter in front.
+        self.selector = faiss.IDSelectorBatch(ids) if len(ids) else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class MetadataIndex:
+    """
+    Columns of filterable metadata, one row per chunk of a FAISS store
+    """
+
+    def __init__(self, doc_ids: Sequence[str], metadata: Iterable[Dict], lexical_index=None):
+        self.doc_ids = list(doc_ids)
+        self.ids = np.fromiter((faiss_id(doc_id) for doc_id in self.doc_ids), dtype=np.int64, count=len(self.doc_ids))
+        self.categories: List[str] = []
+        self.sources: List[str] = []
+        categories, sources, starts, ends = [], [], [], []
+        codes = {"category": {}, "source": {}}
+        for meta in metadata:
+            categories.append(self._code(codes["category"], self.categories, meta.get("category") or "unknown"))
+            sources.append(self._code(codes["source"], self.sources, meta.get("source") or "unknown"))
+            start, end = date_span(meta.get("date"))
+            starts.append(start)
+            ends.append(end)
+        self.category = np.asarray(categories, dtype=np.int32)
+        self.source = np.asarray(sources, dtype=np.int32)
+        self.date_from = np.asarray(starts, dtype=np.int32)
+        self.date_to = np.asarray(ends, dtype=np.int32)
+        # The store and BM25 index the rows were read from.
+        self.vector_store = None
+        self.lexical_index = lexical_index
+        slot_of = lexical_index.slot_of if lexical_index is not None else {}
+        self.lexical_slots = np.fromiter((slot_of.get(doc_id, -1) for doc_id in self.doc_ids), dtype=np.int32,
+                                         count=len(self.doc_ids))
+        self._selections = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _code(codes: Dict[str, int], names: List[str], name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    @classmethod
+    def from_store(cls, vector_store, lexical_index=None) -> "MetadataIndex":
+        doc_ids, metadata = [], []
+        for doc_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(doc_id)
+            if not isinstance(doc, str):
+                doc_ids.append(doc_id)
+                metadata.append(doc.metadata)
+        index = cls(doc_ids, metadata, lexical_index)
+        index.vector_store = vector_store
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def mask(self, filters: Dict) -> np.ndarray:
+        """
+        Boolean row mask of the chunks matching normalized filters
+        """
+        keep = np.ones(len(self.doc_ids), dtype=bool)
+        for key, names, column in (("category", self.categories, self.category), ("source", self.sources, self.source)):
+            if key in filters:
+                wanted = [names.index(name) for name in filters[key] if name in names]
+                keep &= np.isin(column, wanted)
+        if "date_from" in filters or "date_to" in filters:
+            keep &= self.date_to > 0
+            if "date_from" in filters:
+                keep &= self.date_to >= filters["date_from"]
+            if "date_to" in filters:
+                keep &= self.date_from <= filters["date_to"]
+        return keep
+
+    def select(self, filters: Dict) -> Selection:
+        """
+        The Selection of normalized filters, cached for the most recent distinct filters
+        """
+        key = filter_key(filters)
+        selection = self._selections.get(key)
+        if selection is None:
+            keep = self.mask(filters)
+            slots = self.lexical_slots[keep]
+            selection = Selection(self.ids[keep], slots[slots >= 0])
+            with self._lock:
+                if len(self._selections) >= SELECTION_CACHE_SIZE:
+                    self._selections.clear()
+                self._selections[key] = selection
+        return selection
@@ -1,27 +1,285 @@
-import pytesseract
-import cv2
+"""
+OCR of notice scans and other images with OpenCV preprocessing and tesseract.
+
+Batch mode OCRs a directory or a list of image links (as collected by the
+crawlers in image_links / images) on a process pool. Results are stored as
+data/text_from_image/<content hash>.json, so an image already OCR'd under
+any name or url is skipped.
+
+Images are decoded and OCR'd in memory (get_text_from_bytes) by one of the
+OCR backends (ocr.backend in config.yaml):
+    tesserocr    libtesseract bound in-process; the model is loaded once per
+                 thread and reused, no subprocess and no files
+    stdin        the tesseract CLI fed the image on stdin, text read on stdout
+    pytesseract  the tesseract CLI through temp files, as before
+
+With ocr.adaptive, text lines are first found on a downscaled copy of the
+image. Images without any are skipped, and only the text blocks are OCR'd,
+rescaled so that lines are about ocr.target_line_height pixels high (the
+size tesseract reads best) and in parallel on ocr.region_threads threads.
+
+    python -m app.services.image_processor scans/
+    python -m app.services.image_processor --from-raw data/raw
+"""
+import argparse
+import hashlib
 import json
+import logging
 import os
-import re
-import textwrap
-from PIL import Image
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-def get_text_from_image(image_path):
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+import cv2
+import numpy as np
+import pytesseract
+import requests
+
+from app.utils import metrics
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+TEXT_DIR = os.path.join("data", "text_from_image")
+LANG = "vie+eng"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+BACKENDS = ("tesserocr", "stdin", "pytesseract")
+# Width text lines are detected at, and the line height crops are scaled to for OCR
+DETECT_WIDTH = 1000
+TARGET_LINE_HEIGHT = 40
+MIN_STROKE_CONTRAST = 40
+
+_local = threading.local()
+_region_pool = None
+_region_lock = threading.Lock()
+
+
+@lru_cache()
+def ocr_settings() -> Dict:
+    """
+    The OCR backend, languages and tessdata directory; backend "auto" picks
+    tesserocr if installed, else the tesseract CLI through stdin
+    """
+    settings = load_config().get("ocr") or {}
+    backend = settings.get("backend") or "auto"
+    if backend == "auto":
+        try:
+            import tesserocr  # noqa: F401
+            backend = "tesserocr"
+        except ImportError:
+            backend = "stdin" if shutil.which("tesseract") else "pytesseract"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return {
+        "backend": backend,
+        "lang": settings.get("lang") or LANG,
+        "tessdata": settings.get("tessdata"),
+        "adaptive": bool(settings.get("adaptive", False)),
+        "detect_width": int(settings.get("detect_width") or DETECT_WIDTH),
+        "target_line_height": int(settings.get("target_line_height") or TARGET_LINE_HEIGHT),
+        "region_threads": int(settings.get("region_threads") or 1),
+    }
+
+
+def preprocess(img):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
     gray = cv2.GaussianBlur(gray, (3,3), 0) #giảm nhiễu bằng GaussianBlur
     #gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
     gray = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
-    
-    text = pytesseract.image_to_string(gray, lang="vie+eng")
+    return gray
+
+
+def _tesserocr_api(lang: str, tessdata: Optional[str]):
+    # PyTessBaseAPI is not thread-safe, so each thread keeps its own, loaded once.
+    apis = _local.__dict__.setdefault("apis", {})
+    if (lang, tessdata) not in apis:
+        import tesserocr
+        kwargs = {"lang": lang}
+        if tessdata:
+            kwargs["path"] = tessdata
+        apis[lang, tessdata] = tesserocr.PyTessBaseAPI(**kwargs)
+    return apis[lang, tessdata]
+
+
+def ocr_array(img: np.ndarray, lang: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """
+    OCR a preprocessed (grayscale or BGR) image held in memory
+    """
+    with metrics.timed("ocr_recognize"):
+        return _ocr_array(img, lang, backend)
+
+
+def _ocr_array(img: np.ndarray, lang: Optional[str], backend: Optional[str]) -> str:
+    settings = ocr_settings()
+    lang = lang or settings["lang"]
+    backend = backend or settings["backend"]
+    if backend == "tesserocr":
+        api = _tesserocr_api(lang, settings["tessdata"])
+        img = np.ascontiguousarray(img)
+        channels = 1 if img.ndim == 2 else img.shape[2]
+        api.SetImageBytes(img.tobytes(), img.shape[1], img.shape[0], channels, img.strides[0])
+        return api.GetUTF8Text()
+    if backend == "stdin":
+        ok, encoded = cv2.imencode(".pgm" if img.ndim == 2 else ".ppm", img)
+        if not ok:
+            # Empty input would make tesseract fail with an unrelated error, or read nothing.
+            raise RuntimeError(f"Could not encode a {img.dtype} image of shape {img.shape} for tesseract")
+        command = ["tesseract", "stdin", "stdout", "-l", lang]
+        if settings["tessdata"]:
+            command += ["--tessdata-dir", settings["tessdata"]]
+        result = subprocess.run(command, input=encoded.tobytes(), capture_output=True, check=True)
+        return result.stdout.decode("utf-8")
+    return pytesseract.image_to_string(img, lang=lang)
+
+
+def warm_up() -> None:
+    """
+    Load the OCR model of the calling thread (tesserocr) or run the tesseract CLI once
+    """
+    ocr_array(np.full((32, 128), 255, dtype=np.uint8))
+
+
+def decode_image(data: Union[bytes, np.ndarray]) -> np.ndarray:
+    """
+    Decode an encoded image (bytes or a 1-d uint8 buffer); a decoded image array is returned as is
+    """
+    if isinstance(data, np.ndarray) and data.ndim > 1:
+        return data
+    buffer = data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    with metrics.timed("ocr_decode"):
+        img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("not a decodable image")
+    return img
+
+
+def find_text_lines(gray: np.ndarray, detect_width: int = DETECT_WIDTH) -> Tuple[float, List[Tuple[int, int, int, int]]]:
+    """
+    Boxes (x, y, w, h) of the text lines of a grayscale image, found on a copy
+    downscaled to detect_width. Returns the downscale factor and the boxes in
+    downscaled coordinates.
+    """
+    scale = min(1.0, detect_width / gray.shape[1])
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    # Strokes have strong local contrast; closing horizontally joins the glyphs and the words
+    # of a line, whose gaps reach about 12 px at the default detect_width.
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    threshold = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[0]
+    # On images without text Otsu splits mere shading, so ask for some stroke contrast.
+    strokes = cv2.threshold(gradient, max(threshold, MIN_STROKE_CONTRAST), 255, cv2.THRESH_BINARY)[1]
+    joined = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 1)))
+    stats = cv2.connectedComponentsWithStats(joined, connectivity=8)[2]
+    lines = []
+    for x, y, w, h, _ in stats[1:].tolist():
+        if h < 5 or w < 10 or w < h or h > small.shape[0] * 0.3:
+            continue
+        box = strokes[y:y + h, x:x + w]
+        density = cv2.countNonZero(box) / float(w * h)
+        # Edges in photos give lone blobs; a line of text is several words, or at least a long one.
+        words = cv2.connectedComponentsWithStats(box)[0] - 1
+        if 0.2 < density < 0.9 and (words >= 2 or w >= 4 * h):
+            lines.append((x, y, w, h))
+    return scale, lines
+
+
+def text_regions(gray: np.ndarray, detect_width: int = DETECT_WIDTH,
+                 target_line_height: int = TARGET_LINE_HEIGHT) -> Tuple[float, List[Tuple[int, int, int, int]]]:
+    """
+    Text blocks (x, y, w, h) of a grayscale image in reading order, in its own
+    coordinates, and the factor that brings its lines to target_line_height.
+    No blocks means the image has no text.
+    """
+    scale, lines = find_text_lines(gray, detect_width)
+    if not lines:
+        return 1.0, []
+    line_height = float(np.median([h for _, _, _, h in lines]))
+    # Lines closer than about a line height merge into one block.
+    mask = np.zeros((int(round(gray.shape[0] * scale)), int(round(gray.shape[1] * scale))), dtype=np.uint8)
+    for x, y, w, h in lines:
+        mask[y:y + h, x:x + w] = 255
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (int(line_height * 2) | 1, int(line_height) | 1))
+    stats = cv2.connectedComponentsWithStats(cv2.dilate(mask, kernel))[2]
+    height, width = gray.shape
+    blocks = []
+    for x, y, w, h, _ in sorted(stats[1:].tolist(), key=lambda box: (box[1], box[0])):
+        x0, y0 = max(0, int(x / scale)), max(0, int(y / scale))
+        x1, y1 = min(width, int((x + w) / scale) + 1), min(height, int((y + h) / scale) + 1)
+        blocks.append((x0, y0, x1 - x0, y1 - y0))
+    return min(2.0, max(0.2, target_line_height * scale / line_height)), blocks
+
+
+def _ocr_region(gray, box, scale, lang):
+    x, y, w, h = box
+    crop = gray[y:y + h, x:x + w]
+    if scale != 1.0:
+        crop = cv2.resize(crop, None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+    return ocr_array(preprocess(crop), lang).strip()
+
+
+def _region_executor(threads: int) -> ThreadPoolExecutor:
+    global _region_pool
+    with _region_lock:
+        if _region_pool is None:
+            _region_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ocr-region")
+        return _region_pool
+
+
+def ocr_adaptive(img: np.ndarray, lang: Optional[str] = None, region_threads: Optional[int] = None) -> str:
+    """
+    OCR only the text blocks of an image, each rescaled to the target line
+    height, on region_threads threads (ocr.region_threads by default);
+    returns "" without running OCR when no text is found
+    """
+    settings = ocr_settings()
+    region_threads = region_threads or settings["region_threads"]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    with metrics.timed("ocr_detect"):
+        scale, blocks = text_regions(gray, settings["detect_width"], settings["target_line_height"])
+    if not blocks:
+        return ""
+    if len(blocks) == 1 or region_threads <= 1:
+        texts = [_ocr_region(gray, box, scale, lang) for box in blocks]
+    else:
+        pool = _region_executor(region_threads)
+        texts = list(pool.map(lambda box: _ocr_region(gray, box, scale, lang), blocks))
+    return "\n\n".join(text for text in texts if text)
+
+
+def ocr_image(img: np.ndarray, lang: Optional[str] = None, region_threads: Optional[int] = None) -> str:
+    """
+    OCR a decoded image, adaptively or the whole frame as configured
+    """
+    if ocr_settings()["adaptive"]:
+        return ocr_adaptive(img, lang, region_threads)
+    return ocr_array(preprocess(img), lang)
+
+
+def get_text_from_bytes(data: Union[bytes, np.ndarray], lang: Optional[str] = None,
+                        region_threads: Optional[int] = None) -> str:
+    """
+    OCR an uploaded or downloaded image without writing it to disk
+    """
+    return ocr_image(decode_image(data), lang, region_threads)
+
+
+def get_text_from_image(image_path):
+    img = cv2.imread(image_path)
+    text = ocr_image(img)
     # if "\n" in text:
     #     text = text.replace("\n", " ")
     return text
 
-def save_to_json(image_path, json_dir):
-    text = get_text_from_image(image_path)
 
-    filename = os.path.splitext(os.path.basename(image_path))[0]
+def save_to_json(image_path, json_dir, text=None, name=None):
+    if text is None:
+        text = get_text_from_image(image_path)
+
+    filename = name or os.path.splitext(os.path.basename(image_path))[0]
     json_path = os.path.join(json_dir, f"{filename}.json")
 
     data = {
@@ -33,9 +291,148 @@ def save_to_json(image_path, json_dir):
         json.dump(data, f, ensure_ascii=False, indent=4)
 
     print(f"Saved successfully: {json_path}")
+    return json_path
+
+
+def image_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _ocr_job(data: bytes) -> str:
+    # Runs in the pool workers, one region at a time: the pool already uses every core.
+    # Some tesseract errors cannot be unpickled, which would break the whole pool.
+    try:
+        return get_text_from_bytes(data, region_threads=1)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+def _init_worker():
+    # One tesseract thread per process: the pool already uses every core.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def list_images(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def image_links_from_raw(data_folder: str) -> List[str]:
+    """
+    Image links of every crawled post in data_folder, without duplicates
+    """
+    from app.services.loaders import iter_records
+
+    links = {}
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith((".json", ".jsonl")):
+            continue
+        for item in iter_records(os.path.join(data_folder, filename)):
+            content = item.get("content")
+            if isinstance(content, dict):
+                for link in content.get("image_links") or content.get("images") or []:
+                    links[link.strip()] = None
+    return list(links)
+
+
+def _read_sources(sources: Iterable[str], session: requests.Session) -> Iterator[Tuple[str, Optional[bytes]]]:
+    for source in sources:
+        try:
+            if source.startswith(("http://", "https://")):
+                response = session.get(source, timeout=30)
+                response.raise_for_status()
+                yield source, response.content
+            else:
+                with open(source, "rb") as f:
+                    yield source, f.read()
+        except (OSError, requests.RequestException) as e:
+            logger.warning(f"Could not read image {source}: {e}")
+            yield source, None
+
+
+def ocr_batch(sources: Union[str, Iterable[str]], json_dir: str = TEXT_DIR, workers: Optional[int] = None,
+              force: bool = False) -> Dict:
+    """
+    OCR a directory of images or a list of image paths / urls into json_dir.
+    workers=None uses one process per core, 0 runs in this process.
+    Returns counts and images/sec.
+    """
+    if isinstance(sources, str):
+        sources = list_images(sources)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(json_dir, exist_ok=True)
+    stats = {"images": 0, "ocr": 0, "skipped": 0, "failed": 0}
+    start = time.perf_counter()
+
+    def store(source, digest, text):
+        save_to_json(source, json_dir, text, name=digest)
+        stats["ocr"] += 1
+
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker) if workers else None
+    pending = {}
+    try:
+        for source, data in _read_sources(sources, requests.Session()):
+            stats["images"] += 1
+            if data is None:
+                stats["failed"] += 1
+                continue
+            digest = image_hash(data)
+            if digest in pending or not force and os.path.exists(os.path.join(json_dir, f"{digest}.json")):
+                stats["skipped"] += 1
+                continue
+            if pool is None:
+                try:
+                    store(source, digest, get_text_from_bytes(data))
+                except Exception as e:
+                    logger.warning(f"OCR failed for {source}: {e}")
+                    stats["failed"] += 1
+                continue
+            pending[digest] = (source, pool.submit(_ocr_job, data))
+            # Bound the images held in memory while the pool is busy.
+            if len(pending) >= 2 * workers:
+                _drain(pending, store, stats, keep=workers)
+        _drain(pending, store, stats, keep=0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["images_per_s"] = stats["images"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def _drain(pending, store, stats, keep):
+    while len(pending) > keep:
+        digest = next(iter(pending))
+        source, future = pending.pop(digest)
+        try:
+            store(source, digest, future.result())
+        except Exception as e:
+            logger.warning(f"OCR failed for {source}: {e}")
+            stats["failed"] += 1
+
+
+def main():
+    ocr_config = load_config().get("ocr") or {}
+    parser = argparse.ArgumentParser(description="OCR images into data/text_from_image")
+    parser.add_argument("sources", nargs="*", help="an image directory, or image paths / urls")
+    parser.add_argument("--from-raw", metavar="DATA_DIR", help="OCR the image links of the crawled posts")
+    parser.add_argument("--json-dir", default=ocr_config.get("json_dir", TEXT_DIR))
+    parser.add_argument("--workers", type=int, default=ocr_config.get("workers"))
+    parser.add_argument("--force", action="store_true", help="OCR images that already have a json again")
+    args = parser.parse_args()
 
-image_path = r"E:\Project\2025_Project\virtual_personal_assistant\app\services\test2.jpg"
-json_dir = r"E:\Project\2025_Project\virtual_personal_assistant\data\text_from_image"
+    if args.from_raw:
+        sources = image_links_from_raw(args.from_raw)
+    elif len(args.sources) == 1 and os.path.isdir(args.sources[0]):
+        sources = args.sources[0]
+    else:
+        sources = args.sources
+    print(json.dumps(ocr_batch(sources, args.json_dir, args.workers, args.force), indent=2))
 
 
-save_to_json(image_path, json_dir)
+if __name__ == "__main__":
+    main()
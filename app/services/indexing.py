@@ -0,0 +1,563 @@
+"""
+Offline FAISS index build and read-only loading for the RAG service.
+
+The corpus under data/raw, with the texts OCR'd from images (rag.ocr_dir),
+is embedded once by an explicit build step:
+
+    python -m app.services.indexing build
+
+(or the index job of app.services.pipeline), which writes the FAISS index,
+the docstore and the index_to_docstore_id mapping to
+data/processed/faiss_index. API workers then open the index
+memory-mapped and read-only, so several workers share one copy of the
+vectors through the page cache instead of re-embedding at import time.
+
+Each build writes a new version directory under versions/ and then
+atomically replaces the CURRENT file naming it, so a worker loading the
+index never sees the files of two versions (current_index_dir).
+
+Every document gets a stable id hashed from its url (or title), and a
+manifest records the content hash indexed for each id. Later builds only
+embed new or changed documents and drop the vectors of documents that are
+gone; pass --full to re-embed everything. The BM25 index used for hybrid
+retrieval (app.services.lexical) is kept in step with the vectors.
+
+For a smaller footprint per worker, the sq8 / sqfp16 index types store the
+vectors scalar-quantised to 8 bits / float16, and rag.index.docstore "blob"
+moves the document texts out of the pickle into a memory-mapped file
+(app.services.docstore).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from app.services.docstore import BlobDocstore, remove_stale_blobs, save_blob_docstore
+from app.services.embedders import BACKENDS, CachedEmbeddings, create_embeddings, embedder_settings
+from app.services.lexical import LEXICAL_FILE, LexicalIndex, build_from_store, indexed_text, load_lexical_index
+from app.services.loaders import iter_documents, iter_ocr_documents
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+DATA_FOLDER = os.path.join("data", "raw")
+OCR_FOLDER = os.path.join("data", "text_from_image")
+INDEX_DIR = os.path.join("data", "processed", "faiss_index")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Same file names as FAISS.save_local so the artefacts stay loadable by langchain.
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+MANIFEST_FILE = "manifest.json"
+# index_dir/CURRENT names the directory of index_dir/versions holding the version to read.
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+# Previous versions kept besides the current one, for workers still loading them.
+KEEP_VERSIONS = 2
+
+# IO_FLAG_MMAP_IFC maps the codes of flat indexes, also when wrapped in an
+# IndexIDMap2. Combining it with IO_FLAG_MMAP disables it for wrapped indexes.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+EMBED_BATCH_SIZE = 64
+
+# Index types (rag.index in config.yaml):
+#   flat      exact brute-force scan, the baseline
+#   sqfp16    exact scan over vectors stored as float16, half the bytes
+#   sq8       exact scan over vectors scalar-quantised to 8 bits per dimension, a quarter
+#   ivf_flat  inverted lists over nlist k-means cells, nprobe cells searched per query
+#   hnsw      graph index with hnsw_m links per node, ef_search candidates per query
+#   ivf_pq    ivf with vectors compressed to pq_m codes of pq_nbits bits
+INDEX_DEFAULTS = {
+    "type": "flat",
+    "nlist": 100,
+    "nprobe": 8,
+    "hnsw_m": 32,
+    "ef_search": 64,
+    "pq_m": 48,
+    "pq_nbits": 8,
+    # memory (Documents pickled in index.pkl) or blob (texts in a memory-mapped file)
+    "docstore": "memory",
+}
+INDEX_TYPES = ("flat", "sqfp16", "sq8", "ivf_flat", "hnsw", "ivf_pq")
+SEARCH_PARAMS = ("nprobe", "ef_search")
+# Parameters that change how the index is stored, not what is embedded: no rebuild needed.
+STORAGE_PARAMS = ("docstore",)
+# Vectors the per-dimension ranges of sq8 are trained on.
+SQ_TRAIN_SIZE = 10000
+
+
+def load_documents(data_folder: str = DATA_FOLDER) -> List[Document]:
+    """
+    Read every record under data_folder into a list of Documents.
+    Prefer app.services.loaders.iter_documents for large corpora.
+    """
+    return list(iter_documents(data_folder))
+
+
+def corpus(data_dir: str = DATA_FOLDER, ocr_dir: Optional[str] = None) -> Iterator[Document]:
+    """
+    The chunks the index is built from: the crawled records of data_dir and
+    the texts OCR'd into ocr_dir, chunked as rag.chunking says
+    """
+    from app.services.chunking import CHUNK_OVERLAP, CHUNK_SIZE, chunk_documents
+
+    chunking = load_config().get("rag", {}).get("chunking") or {}
+    documents = iter_documents(data_dir)
+    if ocr_dir:
+        documents = chain(documents, iter_ocr_documents(ocr_dir))
+    return chunk_documents(documents, chunking.get("chunk_size", CHUNK_SIZE),
+                           chunking.get("chunk_overlap", CHUNK_OVERLAP))
+
+
+def get_embeddings(model_name: str = EMBEDDING_MODEL, settings: Optional[Dict] = None, cache: bool = False):
+    """
+    Create the embedding model with the backend of settings (rag.embedder by default),
+    behind the on-disk cache of embedded texts when cache is set
+    """
+    settings = embedder_settings() if settings is None else settings
+    embeddings = create_embeddings(model_name, settings)
+    return CachedEmbeddings.from_config(embeddings, settings) if cache else embeddings
+
+
+def _atomic_write(path: str, write) -> None:
+    # Write next to the target and rename, so a reader never maps a half-written file.
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_index(vector_store: FAISS, index_dir: str = INDEX_DIR, docstore: str = "memory") -> None:
+    """
+    Persist the FAISS index, docstore and id mapping of vector_store.
+    With docstore="blob" the documents go to a memory-mapped file, which
+    then replaces the docstore of vector_store.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    documents = ((doc_id, vector_store.docstore.search(doc_id)) for doc_id in vector_store.index_to_docstore_id.values())
+    if docstore == "blob":
+        vector_store.docstore = save_blob_docstore(index_dir, documents)
+    elif docstore != "memory":
+        raise ValueError(f"Unknown docstore {docstore!r}, expected memory or blob")
+    elif isinstance(vector_store.docstore, BlobDocstore):
+        # The blob may be in the directory of another version: move the texts into the pickle.
+        vector_store.docstore = InMemoryDocstore(dict(documents))
+
+    def write_docstore(path):
+        with open(path, "wb") as f:
+            pickle.dump((vector_store.docstore, vector_store.index_to_docstore_id), f)
+
+    # Each file is replaced atomically, but not the pair: update_index writes a new
+    # version directory and switches to it once complete.
+    _atomic_write(os.path.join(index_dir, DOCSTORE_FILE), write_docstore)
+    _atomic_write(os.path.join(index_dir, INDEX_FILE),
+                  lambda path: faiss.write_index(vector_store.index, path))
+    remove_stale_blobs(index_dir, getattr(vector_store.docstore, "filename", None))
+
+
+def document_id(doc: Document) -> str:
+    """
+    Stable id of a document, hashed from its url, or its title when it has no url.
+    Chunks are identified by their parent id and chunk key.
+    """
+    key = doc.metadata.get("url") or doc.metadata.get("title") or doc.page_content
+    if "chunk" in doc.metadata:
+        key = f"{doc.metadata['parent_id']}#{doc.metadata['chunk']}"
+    return hashlib.sha256(f"{doc.metadata.get('category', '')}|{key}".encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(doc: Document) -> str:
+    payload = json.dumps([doc.page_content, doc.metadata], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def faiss_id(doc_id: str) -> int:
+    # FAISS labels are signed 64-bit integers.
+    return int(doc_id, 16) & 0x7FFFFFFFFFFFFFFF
+
+
+def current_index_dir(index_dir: str = INDEX_DIR) -> str:
+    """
+    Directory of the version CURRENT points to, or index_dir itself for an index
+    saved there directly (by save_index, or before versions existed).
+    Read every file of one version from the directory returned by a single call.
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return os.path.join(index_dir, VERSIONS_DIR, f.read().strip())
+    except FileNotFoundError:
+        return index_dir
+
+
+def _new_version_dir(index_dir: str, version: int) -> str:
+    # A fresh name every time, so a build that died half-way is never reused.
+    path = os.path.join(index_dir, VERSIONS_DIR, f"v{version}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(path)
+    return path
+
+
+def _version_number(name: str) -> int:
+    try:
+        return int(name[1:].split("-")[0])
+    except ValueError:
+        return -1
+
+
+def _switch_version(index_dir: str, version_dir: str) -> None:
+    """
+    Point CURRENT at the complete version_dir, then delete the files of the
+    layout before versions and all but KEEP_VERSIONS previous versions
+    """
+    name = os.path.basename(version_dir)
+
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(name)
+
+    _atomic_write(os.path.join(index_dir, CURRENT_FILE), write)
+    for filename in (INDEX_FILE, DOCSTORE_FILE, MANIFEST_FILE, LEXICAL_FILE):
+        if os.path.exists(os.path.join(index_dir, filename)):
+            os.remove(os.path.join(index_dir, filename))
+    remove_stale_blobs(index_dir)
+    versions_dir = os.path.join(index_dir, VERSIONS_DIR)
+    previous = sorted((other for other in os.listdir(versions_dir) if other != name), key=_version_number)
+    # Open maps of a deleted version stay readable.
+    for other in previous[:max(0, len(previous) - KEEP_VERSIONS)]:
+        shutil.rmtree(os.path.join(versions_dir, other), ignore_errors=True)
+
+
+def read_manifest(index_dir: str = INDEX_DIR) -> Optional[Dict]:
+    path = os.path.join(current_index_dir(index_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest: Dict, index_dir: str) -> None:
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+    _atomic_write(os.path.join(index_dir, MANIFEST_FILE), write)
+
+
+def _model_name(embeddings) -> str:
+    return getattr(embeddings, "model_name", type(embeddings).__name__)
+
+
+def index_factory_string(params: Dict, dim: int, n_train: int) -> str:
+    """
+    FAISS factory string for params, scaled down when there is little training data
+    """
+    index_type = params["type"]
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "sqfp16":
+        return "IDMap2,SQfp16"
+    if index_type == "sq8":
+        return "IDMap2,SQ8"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{params['hnsw_m']},Flat"
+    if index_type not in ("ivf_flat", "ivf_pq"):
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+
+    # k-means wants ~39 points per centroid; fewer centroids beat a badly trained quantizer.
+    nlist = min(params["nlist"], max(1, n_train // 39))
+    if nlist < params["nlist"]:
+        logger.warning(f"Only {n_train} training vectors, using nlist={nlist} instead of {params['nlist']}")
+    if index_type == "ivf_flat":
+        return f"IDMap2,IVF{nlist},Flat"
+
+    if dim % params["pq_m"]:
+        raise ValueError(f"pq_m={params['pq_m']} must divide the embedding dimension {dim}")
+    nbits = min(params["pq_nbits"], max(1, n_train.bit_length() - 1))
+    if nbits < params["pq_nbits"]:
+        logger.warning(f"Only {n_train} training vectors, using pq_nbits={nbits} instead of {params['pq_nbits']}")
+    return f"IDMap2,IVF{nlist},PQ{params['pq_m']}x{nbits}"
+
+
+def index_params(params: Optional[Dict] = None) -> Dict:
+    return {**INDEX_DEFAULTS, **(params or {})}
+
+
+def _train_size(params: Dict) -> int:
+    if params["type"] == "ivf_flat":
+        return 39 * params["nlist"]
+    if params["type"] == "ivf_pq":
+        return 39 * max(params["nlist"], 2 ** params["pq_nbits"])
+    if params["type"] == "sq8":
+        return SQ_TRAIN_SIZE
+    return 0
+
+
+def create_index(params: Dict, train_vectors: np.ndarray) -> faiss.Index:
+    """
+    Create an empty ID-mapped index of params["type"], trained on train_vectors when needed
+    """
+    dim = train_vectors.shape[1]
+    index = faiss.index_factory(dim, index_factory_string(params, dim, len(train_vectors)))
+    if params["type"] == "ivf_pq":
+        # Polysemous codes are never used at search time and dominate training cost.
+        faiss.downcast_index(faiss.extract_index_ivf(index)).do_polysemous_training = False
+    if not index.is_trained:
+        if not len(train_vectors):
+            raise ValueError(f"A {params['type']} index needs documents to train on")
+        index.train(train_vectors)
+    set_search_params(index, params)
+    return index
+
+
+def set_search_params(index: faiss.Index, params: Dict) -> None:
+    """
+    Apply the query-time knobs (nprobe, efSearch) that do not require a rebuild
+    """
+    parameter_space = faiss.ParameterSpace()
+    if params["type"] in ("ivf_flat", "ivf_pq"):
+        parameter_space.set_index_parameter(index, "nprobe", params["nprobe"])
+    elif params["type"] == "hnsw":
+        parameter_space.set_index_parameter(index, "efSearch", params["ef_search"])
+
+
+def _empty_store(embeddings) -> FAISS:
+    # The index itself is created once enough vectors exist to train it.
+    return FAISS(
+        embedding_function=embeddings,
+        index=None,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+
+
+def _embed_batches(embeddings, items: Iterable[Tuple[str, Document]], batch_size: int):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        vectors = embeddings.embed_documents([doc.page_content for _, doc in batch])
+        yield batch, np.asarray(vectors, dtype=np.float32)
+
+
+def _add_vectors(vector_store: FAISS, batch: List[Tuple[str, Document]], vectors: np.ndarray) -> None:
+    ids = [faiss_id(doc_id) for doc_id, _ in batch]
+    vector_store.index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    vector_store.docstore.add(dict(batch))
+    vector_store.index_to_docstore_id.update(zip(ids, (doc_id for doc_id, _ in batch)))
+
+
+def add_documents(vector_store: FAISS, documents: Iterable[Tuple[str, Document]], params: Optional[Dict] = None,
+                  batch_size: int = EMBED_BATCH_SIZE) -> None:
+    """
+    Embed (document id, Document) pairs batch by batch and add them under their FAISS ids.
+    A store without an index gets one, trained on the first embedded batches.
+    """
+    params = index_params(params)
+    pending = []
+    for batch, vectors in _embed_batches(vector_store.embedding_function, documents, batch_size):
+        if vector_store.index is not None:
+            _add_vectors(vector_store, batch, vectors)
+            continue
+        pending.append((batch, vectors))
+        if sum(len(v) for _, v in pending) >= _train_size(params):
+            vector_store.index = create_index(params, np.vstack([v for _, v in pending]))
+            for pending_batch, pending_vectors in pending:
+                _add_vectors(vector_store, pending_batch, pending_vectors)
+            pending = []
+
+    if vector_store.index is None:
+        if pending:
+            train_vectors = np.vstack([v for _, v in pending])
+        else:
+            train_vectors = np.empty((0, len(vector_store.embedding_function.embed_query("test"))), dtype=np.float32)
+        vector_store.index = create_index(params, train_vectors)
+        for pending_batch, pending_vectors in pending:
+            _add_vectors(vector_store, pending_batch, pending_vectors)
+
+
+def remove_documents(vector_store: FAISS, doc_ids: List[str], params: Optional[Dict] = None) -> None:
+    """
+    Drop the vectors and docstore entries of doc_ids
+    """
+    remove = {faiss_id(doc_id) for doc_id in doc_ids}
+    try:
+        vector_store.index.remove_ids(np.fromiter(remove, dtype=np.int64, count=len(remove)))
+    except RuntimeError:
+        # HNSW cannot delete: rebuild the graph from the stored vectors, no re-embedding.
+        keep = np.array([i for i in vector_store.index_to_docstore_id if i not in remove], dtype=np.int64)
+        vectors = vector_store.index.reconstruct_batch(keep) if len(keep) else np.empty((0, vector_store.index.d), dtype=np.float32)
+        index = create_index(index_params(params), vectors)
+        index.add_with_ids(vectors, keep)
+        vector_store.index = index
+    vector_store.docstore.delete(doc_ids)
+    for i in remove:
+        vector_store.index_to_docstore_id.pop(i, None)
+
+
+def _add_lexical(lexical: LexicalIndex, items: Iterable[Tuple[str, Document]]) -> Iterator[Tuple[str, Document]]:
+    for doc_id, doc in items:
+        lexical.add(doc_id, indexed_text(doc))
+        yield doc_id, doc
+
+
+def update_index(documents: Iterable[Document], embeddings, index_dir: str = INDEX_DIR,
+                 full: bool = False, params: Optional[Dict] = None,
+                 batch_size: int = EMBED_BATCH_SIZE) -> Tuple[FAISS, Dict]:
+    """
+    Bring the index in index_dir in line with documents, embedding only new or changed ones.
+    params selects the index type (see INDEX_DEFAULTS); changing a build parameter rebuilds.
+
+    documents is consumed once as a stream: new and changed documents are spooled
+    to a temporary file and embedded batch_size at a time, so memory stays bounded
+    by the batch rather than the corpus (the docstore aside).
+    """
+    params = index_params(params)
+    build_params = {key: value for key, value in params.items() if key not in SEARCH_PARAMS + STORAGE_PARAMS}
+
+    source_dir = current_index_dir(index_dir)
+    manifest = read_manifest(source_dir)
+    if (full or manifest is None or manifest.get("model") != _model_name(embeddings)
+            or manifest.get("index") != build_params):
+        vector_store, indexed, version = _empty_store(embeddings), {}, (manifest or {}).get("version", 0)
+        lexical = LexicalIndex()
+    else:
+        vector_store, indexed, version = load_index(embeddings, source_dir, mmap=False, params=params), manifest["documents"], manifest["version"]
+        lexical = load_lexical_index(source_dir)
+        if lexical is None:
+            # An index built before the BM25 index existed: fill it from the docstore once.
+            lexical = build_from_store(vector_store)
+            lexical.save(os.path.join(source_dir, LEXICAL_FILE))
+
+    hashes = {}
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        fresh = 0
+        for doc in documents:
+            doc_id = document_id(doc)
+            if doc_id in hashes:
+                logger.warning(f"Duplicate document {doc.metadata.get('url') or doc.metadata.get('title')}, keeping the first one")
+                continue
+            hashes[doc_id] = content_hash(doc)
+            # A changed document is both stale and fresh: its old vector goes, the new one comes in.
+            if indexed.get(doc_id) != hashes[doc_id]:
+                spool.write(json.dumps([doc_id, doc.page_content, doc.metadata], ensure_ascii=False) + "\n")
+                fresh += 1
+        stale = [doc_id for doc_id, digest in indexed.items() if hashes.get(doc_id) != digest]
+
+        stats = {"added": fresh, "removed": len(stale), "unchanged": len(hashes) - fresh, "version": version}
+        # A docstore switch alone rewrites the files without embedding anything.
+        stored_as = "blob" if isinstance(vector_store.docstore, BlobDocstore) else "memory"
+        if indexed and not stale and not fresh and stored_as == params["docstore"]:
+            return vector_store, stats
+
+        if stale:
+            remove_documents(vector_store, stale, params)
+            lexical.remove(stale)
+        spool.seek(0)
+        spooled = (json.loads(line) for line in spool)
+        add_documents(vector_store, _add_lexical(lexical, ((doc_id, Document(page_content=text, metadata=metadata))
+                                                           for doc_id, text, metadata in spooled)), params, batch_size)
+
+    stats["version"] = version + 1
+    version_dir = _new_version_dir(index_dir, stats["version"])
+    save_index(vector_store, version_dir, params["docstore"])
+    lexical.save(os.path.join(version_dir, LEXICAL_FILE))
+    _write_manifest({
+        "version": stats["version"],
+        "model": _model_name(embeddings),
+        "dim": vector_store.index.d,
+        "index": build_params,
+        "documents": hashes,
+    }, version_dir)
+    _switch_version(index_dir, version_dir)
+    logger.info(f"Index version {stats['version']}: +{stats['added']} -{stats['removed']}, "
+                f"{vector_store.index.ntotal} vectors in {index_dir}")
+    return vector_store, stats
+
+
+def build_index(documents: Iterable[Document], embeddings, index_dir: str = INDEX_DIR,
+                params: Optional[Dict] = None) -> FAISS:
+    """
+    Re-embed every document into a fresh index in index_dir
+    """
+    return update_index(documents, embeddings, index_dir, full=True, params=params)[0]
+
+
+def load_index(embeddings, index_dir: str = INDEX_DIR, mmap: bool = True, params: Optional[Dict] = None) -> FAISS:
+    """
+    Load a prebuilt index; with mmap the vectors stay in the shared page cache.
+    The search parameters of params (nprobe, ef_search) are applied to it.
+    """
+    index_dir = current_index_dir(index_dir)
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(
+            f"No FAISS index at {index_path}, build it with: python -m app.services.indexing build"
+        )
+
+    index = faiss.read_index(index_path, MMAP_FLAGS if mmap else 0)
+    if params is not None:
+        set_search_params(index, index_params(params))
+    with open(os.path.join(index_dir, DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    if isinstance(docstore, BlobDocstore):
+        docstore.open(index_dir)
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def main(argv=None):
+    rag_config = load_config().get("rag", {})
+    parser = argparse.ArgumentParser(description="Build the FAISS index used by the RAG service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="embed new or changed documents of data/raw into the index")
+    build.add_argument("--data-dir", default=DATA_FOLDER)
+    build.add_argument("--ocr-dir", default=rag_config.get("ocr_dir", OCR_FOLDER),
+                       help="texts OCR'd from images to index too; empty to leave them out")
+    build.add_argument("--index-dir", default=rag_config.get("index_dir", INDEX_DIR))
+    build.add_argument("--model", default=rag_config.get("embedding_model", EMBEDDING_MODEL))
+    build.add_argument("--index-type", choices=INDEX_TYPES,
+                       help="override rag.index.type from config.yaml")
+    build.add_argument("--backend", choices=BACKENDS, help="override rag.embedder.backend from config.yaml")
+    build.add_argument("--full", action="store_true", help="re-embed every document")
+    build.add_argument("--batch-size", type=int, default=rag_config.get("embed_batch_size", EMBED_BATCH_SIZE),
+                       help="documents per embedding call, bounds peak memory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        params = dict(rag_config.get("index") or {})
+        if args.index_type:
+            params["type"] = args.index_type
+        start = time.perf_counter()
+        documents = corpus(args.data_dir, args.ocr_dir)
+        settings = embedder_settings()
+        if args.backend:
+            settings = {**settings, "backend": args.backend}
+        embeddings = get_embeddings(args.model, settings, cache=True)
+        vector_store, stats = update_index(documents, embeddings, args.index_dir,
+                                           full=args.full, params=params, batch_size=args.batch_size)
+        print(f"📦 Index v{stats['version']}: +{stats['added']} / -{stats['removed']} đoạn, "
+              f"{vector_store.index.ntotal} vector trong {args.index_dir} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,226 @@
+"""
+Write-behind persistence of /qa/ask interactions and /qa/feedback.
+
+Requests only put a record on an in-memory queue. A writer task takes them
+off in batches, when batch_size records are waiting or flush_interval_s has
+passed since the first of them, and inserts each batch in one transaction
+(one executemany per table) on a dedicated thread, so that the latency of
+the database never reaches the event loop. When the database falls behind
+and max_queue records are waiting, record() waits up to put_timeout_s for
+room, slowing the requests down, then drops the record rather than fail
+the request. close() writes out everything queued.
+
+Settings under database.interaction_log in config.yaml; the tables are
+created on first use.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import JSON, Column, DateTime, Float, Integer, MetaData, String, Table, Text, create_engine
+
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+metadata = MetaData()
+
+interactions = Table(
+    "qa_interactions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("question_id", String(32), nullable=False, index=True),
+    Column("endpoint", String(16), nullable=False),
+    Column("question", Text, nullable=False),
+    Column("context", Text),
+    Column("filters", JSON),
+    Column("answer", Text),
+    Column("sentiment", JSON),
+    Column("latency_ms", Float),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+)
+
+feedback = Table(
+    "qa_feedback", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("question_id", String(32), nullable=False, index=True),
+    Column("feedback", Text),
+    Column("rating", Integer),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+)
+
+TABLES = {table.name: table for table in (interactions, feedback)}
+
+
+def database_url(settings: Optional[Dict] = None) -> Optional[str]:
+    """
+    database.interaction_log.url, else database.sql.url, with environment variables
+    expanded; None when it names an unset variable
+    """
+    database = load_config().get("database") or {}
+    settings = settings if settings is not None else database.get("interaction_log") or {}
+    url = os.path.expandvars(settings.get("url") or ((database.get("sql") or {}).get("url")) or "")
+    return None if not url or "$" in url else url
+
+
+def create_db_engine(url: str):
+    """
+    An engine with the pool of database.sql (pool_size, max_overflow); SQLite keeps its own
+    """
+    if url.startswith("sqlite"):
+        return create_engine(url)
+    sql_config = (load_config().get("database") or {}).get("sql") or {}
+    return create_engine(url, pool_size=sql_config.get("pool_size", 5),
+                         max_overflow=sql_config.get("max_overflow", 10), pool_pre_ping=True)
+
+
+class WriteBehindLog:
+    """
+    await record(table, row) queues a row of a table of TABLES; a background task inserts them in batches
+    """
+
+    def __init__(self, engine, batch_size: int = 500, flush_interval: float = 1.0, max_queue: int = 10000,
+                 put_timeout: Optional[float] = 0.5, retries: int = 3, backoff: float = 0.5):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "write_s": 0.0}
+        self._queue = None
+        self._task = None
+        self._closed = False
+        # One writer thread: batches are inserted in the order they were queued.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="interaction-log")
+        self._tables_created = False
+
+    @classmethod
+    def from_config(cls) -> Optional["WriteBehindLog"]:
+        """
+        The log of database.interaction_log, or None when it is disabled or has no database
+        """
+        settings = (load_config().get("database") or {}).get("interaction_log") or {}
+        if not settings.get("enabled", True):
+            return None
+        url = database_url(settings)
+        if url is None:
+            logger.warning("No database configured (DATABASE_URL), questions and feedback are not stored")
+            return None
+        return cls(
+            create_db_engine(url),
+            batch_size=settings.get("batch_size", 500),
+            flush_interval=settings.get("flush_interval_s", 1.0),
+            max_queue=settings.get("max_queue", 10000),
+            put_timeout=settings.get("put_timeout_s", 0.5),
+            retries=settings.get("retries", 3),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _start(self) -> None:
+        # The queue and the writer belong to the event loop of the first record.
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def record(self, table: str, row: Dict) -> bool:
+        """
+        Queue row for table; False if it was dropped, the queue having stayed full for put_timeout
+        """
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table!r}, expected one of {', '.join(TABLES)}")
+        if self._closed:
+            logger.warning(f"Interaction log closed, dropping a {table} record")
+            self.stats["dropped"] += 1
+            return False
+        if self._task is None:
+            self._start()
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        try:
+            if self.put_timeout is None:
+                await self._queue.put((table, row))
+            elif self.put_timeout <= 0:
+                self._queue.put_nowait((table, row))
+            else:
+                await asyncio.wait_for(self._queue.put((table, row)), self.put_timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.stats["dropped"] += 1
+            logger.warning(f"Interaction log full ({self.max_queue} records), dropping a {table} record")
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    async def _next_batch(self) -> Tuple[List[Tuple[str, Dict]], bool]:
+        # Waits for a first record, then for more until the batch is full or flush_interval has passed.
+        loop = asyncio.get_running_loop()
+        batch = []
+        item = await self._queue.get()
+        deadline = loop.time() + self.flush_interval
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                return batch, False
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return batch, False
+        return batch, True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            batch, closing = await self._next_batch()
+            if batch:
+                await loop.run_in_executor(self._executor, self._write, batch)
+
+    def _write(self, batch: List[Tuple[str, Dict]]) -> None:
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                if not self._tables_created:
+                    metadata.create_all(self.engine)
+                    self._tables_created = True
+                with self.engine.begin() as connection:
+                    for table, table_rows in rows.items():
+                        connection.execute(TABLES[table].insert(), table_rows)
+            except Exception as e:
+                if attempt == self.retries:
+                    self.stats["dropped"] += len(batch)
+                    logger.error(f"Could not write {len(batch)} interaction records: {e}")
+                    return
+                logger.warning(f"Writing interaction records failed ({e}), retrying")
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["write_s"] += time.perf_counter() - start
+            return
+
+    async def close(self) -> None:
+        """
+        Write out the queued records and stop the writer; later records are dropped
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+        self._executor.shutdown(wait=True)
+        self.engine.dispose()
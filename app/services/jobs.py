@@ -0,0 +1,739 @@
+"""
+Background jobs: typed, retried and idempotent units of work run by worker pools.
+
+A job is a row of the jobs table (jobs.url in config.yaml, a SQLite file by
+default): its type, a JSON payload checked against the fields its type
+declares, a status (queued, running, done, failed), its attempts, progress
+and result. Its id is its idempotency key, by default a hash of the type and
+payload, so submitting the same work again returns the job already queued,
+running or done instead of running it twice; a failed job submitted again is
+queued anew.
+
+The broker tells the workers which jobs to run:
+    sql       workers poll the jobs table; with SQLite, the processes of one
+              host (the stand-in the tests use)
+    rabbitmq  a durable queue per job type on message_broker.rabbitmq, and a
+              delay queue per type for retries (needs pika)
+Either way a worker claims a job in the table (queued -> running) before it
+runs it, so a job delivered twice still runs once.
+
+A Worker runs the jobs of its types on a pool of threads. Each stage scales
+on its own, with its own processes and threads:
+
+    python -m app.services.jobs worker --types ocr --concurrency 4
+    python -m app.services.jobs worker --types crawl chunk embed index
+
+A job that raises is retried after backoff_s * 2^(attempt - 1) seconds, up to
+max_attempts, then marked failed. A job waits for the jobs it depends on, and
+fails if one of them does. Jobs left running by a worker that died are queued
+again once stale_after_s passes without a heartbeat, with the same backoff, and
+failed once out of attempts, so that a job killing its worker is not retried forever.
+
+    python -m app.services.jobs submit crawl source=notices
+    python -m app.services.jobs status --status failed
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import typing
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import JSON, Column, Float, Integer, MetaData, String, Table, Text, create_engine, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.utils import metrics
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+STATUSES = (QUEUED, RUNNING, DONE, FAILED)
+JOBS_URL = "sqlite:///data/jobs.sqlite"
+# Seconds a job waits before looking at its dependencies again.
+DEPENDENCY_WAIT = 1.0
+
+metadata = MetaData()
+
+jobs = Table(
+    "jobs", metadata,
+    Column("id", String(64), primary_key=True),
+    Column("type", String(32), nullable=False, index=True),
+    Column("payload", JSON, nullable=False),
+    Column("status", String(16), nullable=False, index=True),
+    Column("attempts", Integer, nullable=False),
+    Column("max_attempts", Integer, nullable=False),
+    Column("depends_on", JSON),
+    Column("progress", Float),
+    Column("message", Text),
+    Column("result", JSON),
+    Column("error", Text),
+    Column("worker", String(64)),
+    # Unix times: comparable the same way in SQLite and PostgreSQL.
+    Column("run_after", Float, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+
+def retry_delay(backoff: float, attempts: int) -> float:
+    return backoff * 2 ** (attempts - 1)
+
+
+def jobs_settings() -> Dict:
+    settings = load_config().get("jobs") or {}
+    return {
+        "broker": settings.get("broker", "sql"),
+        "url": os.path.expandvars(settings.get("url") or JOBS_URL),
+        "poll_interval_s": settings.get("poll_interval_s", 0.5),
+        "max_attempts": settings.get("max_attempts", 3),
+        "backoff_s": settings.get("backoff_s", 5.0),
+        "stale_after_s": settings.get("stale_after_s", 300.0),
+        "concurrency": settings.get("concurrency") or {},
+    }
+
+
+class JobType:
+    def __init__(self, name: str, run: Callable, fields: Dict[str, Any], max_attempts: Optional[int] = None,
+                 period: Optional[float] = None):
+        self.name = name
+        self.run = run
+        self.fields = fields
+        self.max_attempts = max_attempts
+        self.period = period
+
+    def check(self, payload: Dict) -> None:
+        """
+        Raise ValueError for unknown or missing fields and TypeError for values of the wrong type
+        """
+        unknown = set(payload) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields for a {self.name} job: {', '.join(sorted(unknown))}")
+        for field, annotation in self.fields.items():
+            optional = typing.get_origin(annotation) is typing.Union and type(None) in typing.get_args(annotation)
+            if optional:
+                annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+            value = payload.get(field)
+            if value is None:
+                if not optional:
+                    raise ValueError(f"A {self.name} job needs {field}")
+                continue
+            expected = typing.get_origin(annotation) or annotation
+            if not isinstance(value, expected) or isinstance(value, bool) and expected is not bool:
+                raise TypeError(f"{field} of a {self.name} job must be {getattr(expected, '__name__', expected)}, "
+                                f"not {type(value).__name__}")
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_type(name: str, max_attempts: Optional[int] = None, period: Optional[float] = None, **fields):
+    """
+    Register the decorated run(context, **payload) as the handler of name.
+    fields maps each payload field to its type; Optional ones may be left out.
+    With period, default keys change every period seconds, so that the same
+    payload runs again in the next period (a crawl an hour).
+    """
+    def register(run: Callable) -> Callable:
+        JOB_TYPES[name] = JobType(name, run, fields, max_attempts, period)
+        return run
+    return register
+
+
+def job_key(job_type: str, payload: Dict, key: Optional[str] = None) -> str:
+    """
+    The id of a job: "<type>:<key>", the key hashed from the payload when not given
+    """
+    if key is None:
+        period = JOB_TYPES[job_type].period if job_type in JOB_TYPES else None
+        data = json.dumps([payload, int(time.time() // period) if period else None], sort_keys=True)
+        key = hashlib.sha256(data.encode("utf-8")).hexdigest()[:24]
+    job_id = f"{job_type}:{key}"
+    if len(job_id) > 64:
+        job_id = f"{job_type}:{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}"
+    return job_id
+
+
+class JobStore:
+    """
+    The jobs table; every status change is a single UPDATE guarded by the expected status
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        metadata.create_all(engine)
+
+    @classmethod
+    def from_url(cls, url: str) -> "JobStore":
+        if url.startswith("sqlite:///"):
+            os.makedirs(os.path.dirname(os.path.abspath(url[len("sqlite:///"):])), exist_ok=True)
+            # Workers of several processes share the file; wait for each other's writes.
+            return cls(create_engine(url, connect_args={"timeout": 30}))
+        return cls(create_engine(url, pool_pre_ping=True))
+
+    def add(self, job: Dict) -> Tuple[Dict, bool]:
+        """
+        Insert job unless a job with its id exists; a failed one is queued again.
+        Returns the stored job and whether it was (re)queued.
+        """
+        for _ in range(2):
+            existing = self.get(job["id"])
+            if existing is not None:
+                if existing["status"] != FAILED:
+                    return existing, False
+                changes = {key: job[key] for key in ("payload", "max_attempts", "depends_on", "run_after")}
+                if self._update(job["id"], FAILED, status=QUEUED, attempts=0, error=None, progress=None,
+                                message=None, result=None, **changes):
+                    return self.get(job["id"]), True
+                continue
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(jobs.insert(), [job])
+                return self.get(job["id"]), True
+            except IntegrityError:
+                # Submitted by someone else in the meantime.
+                continue
+        return self.get(job["id"]), False
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.engine.connect() as connection:
+            row = connection.execute(select(jobs).where(jobs.c.id == job_id)).mappings().first()
+        return dict(row) if row is not None else None
+
+    def list(self, status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        query = select(jobs).order_by(jobs.c.updated_at.desc()).limit(limit)
+        if status:
+            query = query.where(jobs.c.status == status)
+        if job_type:
+            query = query.where(jobs.c.type == job_type)
+        with self.engine.connect() as connection:
+            return [dict(row) for row in connection.execute(query).mappings()]
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """
+        Jobs per (type, status)
+        """
+        query = select(jobs.c.type, jobs.c.status, func.count()).group_by(jobs.c.type, jobs.c.status)
+        with self.engine.connect() as connection:
+            return {(job_type, status): count for job_type, status, count in connection.execute(query)}
+
+    def statuses(self, job_ids: Sequence[str]) -> Dict[str, str]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(jobs.c.id, jobs.c.status).where(jobs.c.id.in_(list(job_ids))))
+            return dict(rows.all())
+
+    def due(self, job_types: Sequence[str], limit: int = 8) -> List[Tuple[str, str]]:
+        """
+        (type, id) of queued jobs of job_types whose time has come, oldest first
+        """
+        query = (select(jobs.c.type, jobs.c.id)
+                 .where(jobs.c.status == QUEUED, jobs.c.type.in_(list(job_types)), jobs.c.run_after <= time.time())
+                 .order_by(jobs.c.run_after).limit(limit))
+        with self.engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(query)]
+
+    def pending(self, job_types: Sequence[str]) -> int:
+        """
+        Queued and running jobs of job_types
+        """
+        query = select(func.count()).where(jobs.c.status.in_([QUEUED, RUNNING]), jobs.c.type.in_(list(job_types)))
+        with self.engine.connect() as connection:
+            return connection.execute(query).scalar()
+
+    def _update(self, job_id: str, expected: Optional[str], **values) -> bool:
+        query = jobs.update().where(jobs.c.id == job_id)
+        if expected is not None:
+            query = query.where(jobs.c.status == expected)
+        with self.engine.begin() as connection:
+            return connection.execute(query.values(updated_at=time.time(), **values)).rowcount == 1
+
+    def claim(self, job_id: str, worker: str) -> Optional[Dict]:
+        """
+        Mark a queued job running for worker; None if another worker got it first
+        """
+        if not self._update(job_id, QUEUED, status=RUNNING, worker=worker, attempts=jobs.c.attempts + 1):
+            return None
+        return self.get(job_id)
+
+    def defer(self, job_id: str, delay: float) -> bool:
+        return self._update(job_id, QUEUED, run_after=time.time() + delay)
+
+    def progress(self, job_id: str, fraction: Optional[float], message: Optional[str] = None) -> None:
+        self._update(job_id, RUNNING, progress=fraction, message=message)
+
+    def heartbeat(self, job_ids: Iterable[str]) -> None:
+        job_ids = list(job_ids)
+        if job_ids:
+            with self.engine.begin() as connection:
+                connection.execute(jobs.update().where(jobs.c.id.in_(job_ids), jobs.c.status == RUNNING)
+                                   .values(updated_at=time.time()))
+
+    def finish(self, job_id: str, result: Any) -> bool:
+        return self._update(job_id, RUNNING, status=DONE, progress=1.0, result=result, error=None)
+
+    def retry(self, job_id: str, error: str, delay: float) -> bool:
+        return self._update(job_id, RUNNING, status=QUEUED, error=error, run_after=time.time() + delay)
+
+    def fail(self, job_id: str, error: str, expected: Optional[str] = RUNNING) -> bool:
+        return self._update(job_id, expected, status=FAILED, error=error)
+
+    def requeue_stale(self, stale_after: float, backoff: float = 0.0) -> List[Tuple[str, str]]:
+        """
+        Queue again, after the retry backoff, the running jobs without a heartbeat for
+        stale_after seconds, or fail those out of attempts; the (type, id) of the queued ones
+        """
+        cutoff = time.time() - stale_after
+        with self.engine.connect() as connection:
+            stale = [tuple(row) for row in connection.execute(
+                select(jobs.c.type, jobs.c.id, jobs.c.attempts, jobs.c.max_attempts)
+                .where(jobs.c.status == RUNNING, jobs.c.updated_at < cutoff))]
+        requeued = []
+        for job_type, job_id, attempts, max_attempts in stale:
+            # A job that kills its worker (out of memory, a crash in native code) never gets to fail().
+            if attempts >= max_attempts:
+                values = {"status": FAILED, "error": f"worker lost on each of {attempts} attempts"}
+            else:
+                values = {"status": QUEUED, "run_after": time.time() + retry_delay(backoff, attempts),
+                          "error": "worker lost, queued again"}
+            # Guarded on the heartbeat too, in case the worker was only slow.
+            with self.engine.begin() as connection:
+                changed = connection.execute(
+                    jobs.update().where(jobs.c.id == job_id, jobs.c.status == RUNNING, jobs.c.updated_at < cutoff)
+                    .values(updated_at=time.time(), **values)).rowcount
+            if not changed:
+                continue
+            if values["status"] == FAILED:
+                logger.error(f"Job {job_id} had no heartbeat for {stale_after:.0f}s after {attempts} attempts, failed")
+                JOBS_RUN.inc(job_type, FAILED)
+            else:
+                logger.warning(f"Job {job_id} had no heartbeat for {stale_after:.0f}s, queued again")
+                requeued.append((job_type, job_id))
+        return requeued
+
+
+class SQLBroker:
+    """
+    Workers poll the jobs table for due jobs; publishing has nothing to do
+    """
+
+    def __init__(self, store: JobStore, poll_interval: float = 0.5):
+        self.store = store
+        self.poll_interval = poll_interval
+
+    def publish(self, job_type: str, job_id: str, delay: float = 0.0) -> None:
+        pass
+
+    def receive(self, job_types: Sequence[str], timeout: float) -> Optional[Tuple[str, str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            due = self.store.due(job_types)
+            if due:
+                # Not always the oldest, so that idle workers do not all race for the same job.
+                job_type, job_id = random.choice(due)
+                return job_type, job_id, None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.poll_interval, remaining))
+
+    def ack(self, tag: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RabbitMQBroker:
+    """
+    A durable queue <queue_prefix>.<type> per job type, bound to the exchange by
+    the type's name. A delayed job is published to <queue>.delay, whose messages
+    expire back into the exchange.
+    """
+
+    def __init__(self, url: str, exchange: str = "vpa_exchange", queue_prefix: str = "vpa_queue",
+                 poll_interval: float = 0.5):
+        # Imported here so that the SQL broker works without pika.
+        import pika
+
+        self.pika = pika
+        self.url = url
+        self.exchange = exchange
+        self.queue_prefix = queue_prefix
+        self.poll_interval = poll_interval
+        # A pika connection must stay on the thread that opened it.
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, poll_interval: float = 0.5) -> "RabbitMQBroker":
+        settings = (load_config().get("message_broker") or {}).get("rabbitmq") or {}
+        url = os.path.expandvars(settings.get("url") or "")
+        if not url or "$" in url:
+            raise ValueError("jobs.broker is rabbitmq but message_broker.rabbitmq.url (RABBITMQ_URL) is not set")
+        return cls(url, settings.get("exchange", "vpa_exchange"), settings.get("queue_prefix", "vpa_queue"),
+                   poll_interval)
+
+    def _queue(self, job_type: str) -> str:
+        return f"{self.queue_prefix}.{job_type}"
+
+    def _channel(self):
+        channel = getattr(self._local, "channel", None)
+        if channel is None or channel.is_closed:
+            connection = self.pika.BlockingConnection(self.pika.URLParameters(self.url))
+            with self._lock:
+                self._connections.append(connection)
+            channel = self._local.channel = connection.channel()
+            channel.exchange_declare(self.exchange, exchange_type="direct", durable=True)
+            self._local.declared = set()
+        return channel
+
+    def _declare(self, channel, job_type: str) -> str:
+        queue = self._queue(job_type)
+        if job_type not in self._local.declared:
+            channel.queue_declare(queue, durable=True)
+            channel.queue_bind(queue, self.exchange, routing_key=job_type)
+            channel.queue_declare(f"{queue}.delay", durable=True, arguments={
+                "x-dead-letter-exchange": self.exchange, "x-dead-letter-routing-key": job_type})
+            self._local.declared.add(job_type)
+        return queue
+
+    def publish(self, job_type: str, job_id: str, delay: float = 0.0) -> None:
+        channel = self._channel()
+        queue = self._declare(channel, job_type)
+        if delay > 0:
+            properties = self.pika.BasicProperties(delivery_mode=2, expiration=str(int(delay * 1000)))
+            channel.basic_publish("", f"{queue}.delay", job_id.encode("utf-8"), properties)
+        else:
+            channel.basic_publish(self.exchange, job_type, job_id.encode("utf-8"),
+                                  self.pika.BasicProperties(delivery_mode=2))
+
+    def receive(self, job_types: Sequence[str], timeout: float) -> Optional[Tuple[str, str, Any]]:
+        channel = self._channel()
+        deadline = time.monotonic() + timeout
+        while True:
+            for job_type in random.sample(list(job_types), len(job_types)):
+                method, _, body = channel.basic_get(self._declare(channel, job_type), auto_ack=False)
+                if method is not None:
+                    return job_type, body.decode("utf-8"), method.delivery_tag
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            channel.connection.sleep(min(self.poll_interval, remaining))
+
+    def ack(self, tag: Any) -> None:
+        self._channel().basic_ack(tag)
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            if connection.is_open:
+                connection.close()
+
+
+class JobQueue:
+    """
+    submit() jobs, look them up; Workers run them
+    """
+
+    def __init__(self, store: JobStore, broker=None, max_attempts: int = 3, backoff: float = 5.0,
+                 stale_after: float = 300.0):
+        self.store = store
+        self.broker = broker if broker is not None else SQLBroker(store)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.stale_after = stale_after
+
+    @classmethod
+    def from_config(cls) -> "JobQueue":
+        settings = jobs_settings()
+        store = JobStore.from_url(settings["url"])
+        if settings["broker"] == "rabbitmq":
+            broker = RabbitMQBroker.from_config(settings["poll_interval_s"])
+        elif settings["broker"] == "sql":
+            broker = SQLBroker(store, settings["poll_interval_s"])
+        else:
+            raise ValueError(f"Unknown jobs.broker {settings['broker']!r}, expected sql or rabbitmq")
+        return cls(store, broker, settings["max_attempts"], settings["backoff_s"], settings["stale_after_s"])
+
+    def submit(self, job_type: str, payload: Optional[Dict] = None, key: Optional[str] = None,
+               depends_on: Sequence[str] = (), delay: float = 0.0) -> Dict:
+        """
+        Queue a job of job_type, or return the job already submitted with the same key
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type {job_type!r}, expected one of {', '.join(sorted(JOB_TYPES))}")
+        payload = dict(payload or {})
+        JOB_TYPES[job_type].check(payload)
+        now = time.time()
+        job, queued = self.store.add({
+            "id": job_key(job_type, payload, key),
+            "type": job_type,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": JOB_TYPES[job_type].max_attempts or self.max_attempts,
+            "depends_on": list(depends_on),
+            "run_after": now + delay,
+            "created_at": now,
+            "updated_at": now,
+        })
+        if queued:
+            self.broker.publish(job_type, job["id"], delay)
+            logger.info(f"Queued job {job['id']}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def recover(self, job_types: Sequence[str]) -> None:
+        """
+        Queue again the jobs of dead workers, and publish the queued jobs a broker may have lost
+        """
+        self.store.requeue_stale(self.stale_after, self.backoff)
+        if not isinstance(self.broker, SQLBroker):
+            for job in self.store.list(QUEUED, limit=100000):
+                if job["type"] in job_types:
+                    # Duplicate messages are harmless: only one worker claims the job.
+                    self.broker.publish(job["type"], job["id"], max(0.0, job["run_after"] - time.time()))
+
+    def close(self) -> None:
+        self.broker.close()
+        self.store.engine.dispose()
+
+
+class JobContext:
+    """
+    What a handler gets besides its payload: its job, progress reports and follow-up jobs
+    """
+
+    def __init__(self, queue: JobQueue, job: Dict):
+        self.queue = queue
+        self.job = job
+
+    @property
+    def id(self) -> str:
+        return self.job["id"]
+
+    def progress(self, done: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        fraction = done / total if total else None
+        self.queue.store.progress(self.id, fraction, message)
+
+    def submit(self, job_type: str, payload: Optional[Dict] = None, key: Optional[str] = None,
+               depends_on: Sequence[str] = ()) -> Dict:
+        return self.queue.submit(job_type, payload, key, depends_on)
+
+
+JOBS_RUN = metrics.counter("vpa_jobs_total", "Jobs run by type and outcome", ["type", "outcome"])
+
+
+class Worker:
+    """
+    concurrency threads running the jobs of job_types
+    """
+
+    def __init__(self, queue: JobQueue, job_types: Sequence[str], concurrency: int = 1,
+                 name: Optional[str] = None):
+        unknown = set(job_types) - set(JOB_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown job types: {', '.join(sorted(unknown))}")
+        self.queue = queue
+        self.job_types = list(job_types)
+        self.concurrency = concurrency
+        self.name = name or f"{os.uname().nodename if hasattr(os, 'uname') else 'worker'}-{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def process(self, job_type: str, job_id: str, tag: Any = None) -> Optional[str]:
+        """
+        Run a delivered job if it is still queued and its dependencies are done; its new status
+        """
+        store, broker = self.queue.store, self.queue.broker
+        try:
+            job = store.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                # Done already, or claimed by another worker.
+                return None
+            if job["depends_on"]:
+                statuses = store.statuses(job["depends_on"])
+                failed = [dep for dep in job["depends_on"] if statuses.get(dep, FAILED) == FAILED]
+                if failed:
+                    store.fail(job_id, f"dependency {failed[0]} failed", expected=QUEUED)
+                    JOBS_RUN.inc(job_type, FAILED)
+                    return FAILED
+                if any(status != DONE for status in statuses.values()):
+                    if store.defer(job_id, DEPENDENCY_WAIT):
+                        broker.publish(job_type, job_id, DEPENDENCY_WAIT)
+                    return QUEUED
+            job = store.claim(job_id, self.name)
+            if job is None:
+                return None
+            return self._run(job)
+        finally:
+            broker.ack(tag)
+
+    def _run(self, job: Dict) -> str:
+        job_id, job_type = job["id"], job["type"]
+        with self._lock:
+            self._running.add(job_id)
+        start = time.perf_counter()
+        try:
+            with metrics.timed(f"job_{job_type}"):
+                result = JOB_TYPES[job_type].run(JobContext(self.queue, job), **job["payload"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= job["max_attempts"]:
+                logger.exception(f"Job {job_id} failed after {job['attempts']} attempts")
+                self.queue.store.fail(job_id, error)
+                JOBS_RUN.inc(job_type, FAILED)
+                return FAILED
+            delay = retry_delay(self.queue.backoff, job["attempts"])
+            logger.warning(f"Job {job_id} failed ({error}), retrying in {delay:.1f}s")
+            self.queue.store.retry(job_id, error, delay)
+            self.queue.broker.publish(job_type, job_id, delay)
+            JOBS_RUN.inc(job_type, "retried")
+            return QUEUED
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+        self.queue.store.finish(job_id, result)
+        JOBS_RUN.inc(job_type, DONE)
+        logger.info(f"Job {job_id} done in {time.perf_counter() - start:.1f}s")
+        return DONE
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delivery = self.queue.broker.receive(self.job_types, timeout=1.0)
+                if delivery is not None:
+                    self.process(*delivery)
+            except Exception:
+                logger.exception("Job worker error")
+                self._stop.wait(1.0)
+
+    def _heartbeat(self) -> None:
+        interval = max(1.0, self.queue.stale_after / 3)
+        while not self._stop.wait(interval):
+            with self._lock:
+                running = list(self._running)
+            try:
+                self.queue.store.heartbeat(running)
+                self.queue.store.requeue_stale(self.queue.stale_after, self.queue.backoff)
+            except Exception:
+                logger.exception("Job heartbeat failed")
+
+    def start(self) -> None:
+        self.queue.recover(self.job_types)
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._loop, name=f"job-{'-'.join(self.job_types)}-{i}", daemon=True)
+                         for i in range(self.concurrency)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop taking jobs and wait for the running ones to finish
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def drain(self, timeout: Optional[float] = None, poll: float = 0.2) -> bool:
+        """
+        Run until no job of job_types is queued or running; False if timeout came first
+        """
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while self.queue.store.pending(self.job_types):
+                if deadline is not None and time.monotonic() > deadline:
+                    return False
+                time.sleep(poll)
+            return True
+        finally:
+            self.stop()
+
+
+def _parse_fields(fields: List[str]) -> Dict:
+    payload = {}
+    for field in fields:
+        name, _, value = field.partition("=")
+        try:
+            payload[name] = json.loads(value)
+        except json.JSONDecodeError:
+            payload[name] = value
+    return payload
+
+
+def main(argv=None):
+    # The job types of the ingestion pipeline.
+    import app.services.pipeline  # noqa: F401
+
+    settings = jobs_settings()
+    parser = argparse.ArgumentParser(description="Run, submit and inspect background jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker = subparsers.add_parser("worker", help="run the jobs of some types")
+    worker.add_argument("--types", nargs="+", default=sorted(JOB_TYPES), choices=sorted(JOB_TYPES))
+    worker.add_argument("--concurrency", type=int, help="threads per type, default from jobs.concurrency")
+    worker.add_argument("--drain", action="store_true", help="exit once no job of these types is left")
+    submit = subparsers.add_parser("submit", help="queue a job")
+    submit.add_argument("type", choices=sorted(JOB_TYPES))
+    submit.add_argument("fields", nargs="*", metavar="FIELD=VALUE", help="payload, values as JSON or plain strings")
+    submit.add_argument("--key", help="idempotency key, default a hash of the payload")
+    status = subparsers.add_parser("status", help="list jobs")
+    status.add_argument("--status", choices=STATUSES)
+    status.add_argument("--type", choices=sorted(JOB_TYPES))
+    status.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    queue = JobQueue.from_config()
+    try:
+        if args.command == "submit":
+            job = queue.submit(args.type, _parse_fields(args.fields), args.key)
+            print(json.dumps(job, ensure_ascii=False, indent=2))
+        elif args.command == "status":
+            for (job_type, job_status), count in sorted(queue.store.counts().items()):
+                print(f"{job_type:8} {job_status:8} {count}")
+            for job in queue.store.list(args.status, args.type, args.limit):
+                progress = "" if job["progress"] is None else f" {job['progress']:.0%}"
+                detail = job["error"] if job["status"] == FAILED else job["message"] or ""
+                print(f"{job['id']:40} {job['status']:8} lần {job['attempts']}{progress} {detail}")
+        else:
+            # One pool per type, so that a slow stage does not hold up the others.
+            workers = [Worker(queue, [job_type], args.concurrency or settings["concurrency"].get(job_type, 1))
+                       for job_type in args.types]
+            if args.drain:
+                for worker in workers:
+                    worker.start()
+                while queue.store.pending(args.types):
+                    time.sleep(0.5)
+                for worker in workers:
+                    worker.stop()
+                return
+            for worker in workers:
+                worker.start()
+            print(f"Đang chạy các job {', '.join(args.types)} (Ctrl+C để dừng)")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                for worker in workers:
+                    worker.stop()
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # Job types register with the imported app.services.jobs, not with this __main__ copy of it.
+    from app.services.jobs import main
+    main()
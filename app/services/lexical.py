@@ -0,0 +1,259 @@
+"""
+BM25 inverted index over the indexed chunks, fused with FAISS by reciprocal rank.
+
+all-MiniLM-L6-v2 is an English model and places Vietnamese questions
+poorly, while the exact words of a question ("học bổng", "Hà Đông",
+"KOICA") are strong evidence in PTIT notices. Every token is indexed under
+its diacritic-free form, and also as written when it has diacritics, so that
+a query typed without diacritics ("lich thi") still matches, and a query with
+them ranks the documents that have the same diacritics first.
+
+Posting lists are compact arrays (int32 document slots, uint16 term
+frequencies) scored with numpy. Documents are added and removed by the same
+ids as the FAISS docstore; removed ones are masked until the next save
+compacts them. The index is saved as bm25.npz next to index.faiss by
+app.services.indexing.update_index.
+"""
+import io
+import math
+import os
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LEXICAL_FILE = "bm25.npz"
+
+TOKEN = re.compile(r"\w+")
+# Weight of the diacritic-free form of a query token written with diacritics.
+FOLDED_WEIGHT = 0.5
+
+
+def fold(text: str) -> str:
+    """
+    Strip Vietnamese diacritics: "Đào tạo" -> "Dao tao"
+    """
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def document_terms(tokens: Sequence[str]) -> Counter:
+    terms = Counter()
+    for token in tokens:
+        folded = fold(token)
+        terms[folded] += 1
+        if folded != token:
+            terms[token] += 1
+    return terms
+
+
+def query_terms(text: str) -> Dict[str, float]:
+    weights = {}
+    for token in tokenize(text):
+        folded = fold(token)
+        if folded == token:
+            weights[folded] = max(weights.get(folded, 0.0), 1.0)
+        else:
+            weights[token] = 1.0
+            weights[folded] = max(weights.get(folded, 0.0), FOLDED_WEIGHT)
+    return weights
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists: an id scores sum(1 / (k + rank)) over the lists it appears in
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class LexicalIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms: Dict[str, int] = {}
+        # Per term: document slots (ascending) and term frequencies. Loaded
+        # postings are numpy slices, turned into arrays when appended to.
+        self._slots: List = []
+        self._freqs: List = []
+        self.doc_ids: List[str] = []
+        self.slot_of: Dict[str, int] = {}
+        self._lengths = array("f")
+        self._deleted = bytearray()
+        self._total_length = 0.0
+        # k1 * (1 - b + b * length / average length) per slot, until the next change.
+        self._norm = None
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.slot_of:
+            self.remove([doc_id])
+        tokens = tokenize(text)
+        slot = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.slot_of[doc_id] = slot
+        self._lengths.append(len(tokens))
+        self._deleted.append(0)
+        self._total_length += len(tokens)
+        self._norm = None
+        for term, count in document_terms(tokens).items():
+            posting = self.terms.get(term)
+            if posting is None:
+                posting = self.terms[term] = len(self._slots)
+                self._slots.append(array("i"))
+                self._freqs.append(array("H"))
+            elif isinstance(self._slots[posting], np.ndarray):
+                self._slots[posting] = array("i", self._slots[posting].tobytes())
+                self._freqs[posting] = array("H", self._freqs[posting].tobytes())
+            self._slots[posting].append(slot)
+            self._freqs[posting].append(min(count, 0xFFFF))
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        for doc_id in doc_ids:
+            slot = self.slot_of.pop(doc_id, None)
+            if slot is not None:
+                self._deleted[slot] = 1
+                self._total_length -= self._lengths[slot]
+                self._norm = None
+
+    def search(self, query: str, k: int = 10, slots: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        The k best (document id, BM25 score) for query, among the documents of slots when given
+        """
+        n_docs = len(self.slot_of)
+        if not n_docs:
+            return []
+        if self._norm is None:
+            lengths = np.frombuffer(self._lengths, dtype=np.float32)
+            average_length = self._total_length / n_docs or 1.0
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / average_length)
+            # Removed documents never score: an infinite norm zeroes their term weights.
+            if n_docs < len(self.doc_ids):
+                norm[np.frombuffer(self._deleted, dtype=np.uint8).astype(bool)] = np.inf
+            self._norm = norm
+        norm = self._norm
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term, weight in query_terms(query).items():
+            posting = self.terms.get(term)
+            if posting is None:
+                continue
+            postings = np.asarray(self._slots[posting], dtype=np.int32)
+            freqs = np.asarray(self._freqs[posting], dtype=np.float32)
+            # Masked documents still count in df until compaction; the idf error is small.
+            idf = math.log(1.0 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores[postings] += weight * idf * (self.k1 + 1.0) * freqs / (freqs + norm[postings])
+        if slots is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[slots[slots < len(scores)]] = True
+            scores[~allowed] = 0.0
+        found = np.flatnonzero(scores)
+        if len(found) > k:
+            found = found[np.argpartition(-scores[found], k - 1)[:k]]
+        found = found[np.argsort(-scores[found], kind="stable")]
+        return [(self.doc_ids[slot], float(scores[slot])) for slot in found]
+
+    def compact(self) -> None:
+        """
+        Drop removed documents from the posting lists and renumber the slots
+        """
+        if len(self.slot_of) == len(self.doc_ids):
+            return
+        keep = np.frombuffer(self._deleted, dtype=np.uint8) == 0
+        new_slot = np.cumsum(keep, dtype=np.int64) - 1
+        terms, slots_list, freqs_list = {}, [], []
+        for term, posting in self.terms.items():
+            slots = np.asarray(self._slots[posting], dtype=np.int32)
+            alive = keep[slots]
+            if alive.any():
+                terms[term] = len(slots_list)
+                slots_list.append(new_slot[slots[alive]].astype(np.int32))
+                freqs_list.append(np.asarray(self._freqs[posting], dtype=np.uint16)[alive])
+        self.terms, self._slots, self._freqs = terms, slots_list, freqs_list
+        self.doc_ids = [doc_id for doc_id, alive in zip(self.doc_ids, keep) if alive]
+        self.slot_of = {doc_id: slot for slot, doc_id in enumerate(self.doc_ids)}
+        self._lengths = array("f", np.frombuffer(self._lengths, dtype=np.float32)[keep].tobytes())
+        self._deleted = bytearray(len(self.doc_ids))
+        self._norm = None
+
+    def save(self, path: str) -> None:
+        """
+        Compact and write the index to path atomically
+        """
+        self.compact()
+        terms = list(self.terms)
+        postings = [self.terms[term] for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._slots[p]) for p in postings])
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            params=np.array([self.k1, self.b]),
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            doc_ids=np.frombuffer("\n".join(self.doc_ids).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets,
+            slots=np.concatenate([np.asarray(self._slots[p], dtype=np.int32) for p in postings] or [np.empty(0, np.int32)]),
+            freqs=np.concatenate([np.asarray(self._freqs[p], dtype=np.uint16) for p in postings] or [np.empty(0, np.uint16)]),
+            lengths=np.frombuffer(self._lengths, dtype=np.float32),
+        )
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1, b)
+            terms = data["terms"].tobytes().decode("utf-8")
+            doc_ids = data["doc_ids"].tobytes().decode("utf-8")
+            offsets, slots, freqs = data["offsets"], data["slots"], data["freqs"]
+            index._lengths = array("f", data["lengths"].tobytes())
+        index.terms = {term: i for i, term in enumerate(terms.split("\n"))} if terms else {}
+        index._slots = [slots[offsets[i]:offsets[i + 1]] for i in range(len(index.terms))]
+        index._freqs = [freqs[offsets[i]:offsets[i + 1]] for i in range(len(index.terms))]
+        index.doc_ids = doc_ids.split("\n") if doc_ids else []
+        index.slot_of = {doc_id: slot for slot, doc_id in enumerate(index.doc_ids)}
+        index._deleted = bytearray(len(index.doc_ids))
+        index._total_length = float(np.frombuffer(index._lengths, dtype=np.float32).sum())
+        return index
+
+
+def indexed_text(doc) -> str:
+    """
+    The text of a chunk that is indexed: its title and content
+    """
+    title = doc.metadata.get("title") or ""
+    return f"{title}\n{doc.page_content}" if title else doc.page_content
+
+
+def build_from_store(vector_store) -> LexicalIndex:
+    """
+    Index every document of a FAISS store's docstore, e.g. an index built before bm25.npz existed
+    """
+    index = LexicalIndex()
+    for doc_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(doc_id)
+        if not isinstance(doc, str):
+            index.add(doc_id, indexed_text(doc))
+    return index
+
+
+def load_lexical_index(index_dir: str) -> Optional[LexicalIndex]:
+    # Imported here: app.services.indexing imports this module.
+    from app.services.indexing import current_index_dir
+
+    path = os.path.join(current_index_dir(index_dir), LEXICAL_FILE)
+    return LexicalIndex.load(path) if os.path.exists(path) else None
@@ -0,0 +1,190 @@
+"""
+Streaming loaders for the crawled corpus in data/raw.
+
+Files are parsed item by item, JSON arrays (as written by the crawlers) with
+an incremental decoder and JSONL line by line, so no file is ever held in
+memory as a whole. Each file is turned into Documents by the record adapter
+registered for its name (events, news, notices, industries).
+
+The texts OCR'd from images (app.services.image_processor, one
+{"image_path", "extracted_text"} file per image) are read by
+iter_ocr_documents.
+"""
+import json
+import logging
+import os
+import re
+from typing import Callable, Dict, Iterator, Optional
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger('app')
+
+READ_SIZE = 1 << 16
+WHITESPACE = re.compile(r"\s*")
+
+RecordAdapter = Callable[[Dict, str], Optional[Document]]
+ADAPTERS: Dict[str, RecordAdapter] = {}
+
+
+def iter_json_array(path: str, read_size: int = READ_SIZE) -> Iterator:
+    """
+    Yield the items of a top-level JSON array one at a time
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+        want = read_size
+        state = "start"  # start -> (item -> separator)* -> done
+        while state != "done":
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer) or state == "more":
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of JSON array")
+                chunk = f.read(want)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                # An item bigger than one read is retried with doubling reads to stay linear.
+                want = want * 2 if state == "more" else read_size
+                state = "item" if state == "more" else state
+                continue
+
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                pos, state = pos + 1, "first"
+            elif state in ("first", "item"):
+                if state == "first" and char == "]":
+                    state = "done"
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    state = "more"
+                    continue
+                # A value that ends exactly at the buffer end may be cut (e.g. a number).
+                if end == len(buffer) and not eof:
+                    state = "more"
+                    continue
+                yield item
+                pos, state, want = end, "separator", read_size
+                if pos > read_size:
+                    buffer, pos = buffer[pos:], 0
+            elif char == ",":
+                pos, state = pos + 1, "item"
+            elif char == "]":
+                state = "done"
+            else:
+                raise ValueError(f"{path}: expected ',' or ']' at offset {pos}")
+
+
+def iter_jsonl(path: str) -> Iterator:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path: str) -> Iterator:
+    """
+    Yield the records of a .json (array) or .jsonl file
+    """
+    return iter_jsonl(path) if path.endswith(".jsonl") else iter_json_array(path)
+
+
+def record_adapter(*keywords: str):
+    """
+    Register an adapter for data files whose name contains one of keywords
+    """
+    def register(adapter: RecordAdapter) -> RecordAdapter:
+        for keyword in keywords:
+            ADAPTERS[keyword] = adapter
+        return adapter
+    return register
+
+
+def _text(content) -> str:
+    # Notices and news store {"text": ...}, events {"texts": ...}; a failed crawl stores None.
+    if isinstance(content, dict):
+        return content.get("text") or content.get("texts") or ""
+    return content or ""
+
+
+@record_adapter("events", "news", "notices")
+def post_record(item: Dict, source: str) -> Document:
+    return Document(
+        page_content=_text(item.get("content")),
+        metadata={"title": item.get("title", "No Title"), "category": "event", "url": item.get("url", ""),
+                  "date": item.get("date", ""), "source": source}
+    )
+
+
+@record_adapter("industries")
+def industry_record(item: Dict, source: str) -> Document:
+    # program_structure is split into per-semester chunks by app.services.chunking.
+    return Document(
+        page_content=item.get("content", ""),
+        metadata={"title": item.get("program_name", "No title"), "category": "industry",
+                  "program_structure": item.get("program_structure") or {}, "source": source}
+    )
+
+
+def unknown_record(item: Dict, source: str) -> Document:
+    return Document(
+        page_content=_text(item.get("content")),
+        metadata={"category": "unknown", "source": source}
+    )
+
+
+def adapter_for(filename: str) -> RecordAdapter:
+    name = filename.lower()
+    for keyword, adapter in ADAPTERS.items():
+        if keyword in name:
+            return adapter
+    return unknown_record
+
+
+def iter_documents(data_folder: str) -> Iterator[Document]:
+    """
+    Lazily yield a Document for every record of every .json/.jsonl file in data_folder
+    """
+    for filename in sorted(os.listdir(data_folder)):
+        if not filename.endswith((".json", ".jsonl")):
+            continue
+        adapter = adapter_for(filename)
+        source = filename.rsplit(".", 1)[0]
+        count = 0
+        for item in iter_records(os.path.join(data_folder, filename)):
+            doc = adapter(item, source)
+            if doc is not None:
+                count += 1
+                yield doc
+        logger.info(f"Loaded {count} documents from {filename}")
+
+
+def iter_ocr_documents(json_dir: str) -> Iterator[Document]:
+    """
+    Lazily yield a Document for every image with text OCR'd into json_dir
+    """
+    if not os.path.isdir(json_dir):
+        return
+    count = 0
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(json_dir, filename), encoding="utf-8") as f:
+            item = json.load(f)
+        text = (item.get("extracted_text") or "").strip()
+        if not text:
+            continue
+        image = item.get("image_path") or filename
+        count += 1
+        yield Document(
+            page_content=text,
+            metadata={"title": os.path.basename(image.replace("\\", "/")), "category": "image",
+                      "url": image if image.startswith(("http://", "https://")) else "",
+                      "source": os.path.basename(os.path.normpath(json_dir))}
+        )
+    logger.info(f"Loaded {count} OCR'd images from {json_dir}")
@@ -0,0 +1,263 @@
+"""
+The ingestion pipeline as background jobs (app.services.jobs):
+
+    crawl   one source of SOURCES, incrementally: only posts newer than the
+            saved ones are downloaded, into jobs.data_dir. Queues ocr jobs
+            for the images of the new posts, then a chunk job after them.
+    ocr     a batch of image links, into rag.ocr_dir (skipping images
+            already OCR'd)
+    chunk   the corpus, chunked as the index is; the chunks the index does
+            not have yet are written in shards of jobs.embed_shard texts,
+            an embed job is queued per shard and an index job after them
+    embed   one shard, into the embedding cache (rag.embedder.cache), so
+            that embedding runs on as many workers as there are shards
+    index   update_index of app.services.indexing, which finds every vector
+            in the cache, then writes a new index version that the API
+            workers pick up (rag.reload_interval_s)
+
+Queue an hourly update of the notices with
+
+    python -m app.services.jobs submit crawl source=notices
+
+and rebuild from the saved posts with `submit chunk full=true`. Only one
+index job writes an index directory at a time, whatever the worker.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.services.jobs import job_type
+from app.utils.config import load_config
+from app.utils.crawl_engine import CrawlEngine
+from app.utils.crawler import (DAO_TAO_URL, MAX_PAGE_SK, MAX_PAGE_TB, MAX_PAGE_TT, SU_KIEN_URL, THONG_BAO_URL,
+                               TIN_TUC_URL, DaoTaoCrawler, PTITEventCrawler, PTITNoticeCrawler)
+from app.utils.http_cache import HTTPCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: index jobs of one process still take turns
+    fcntl = None
+
+logger = logging.getLogger('app')
+
+# source -> (crawler, url, pages, file in data_dir); industries are crawled whole, without pages.
+SOURCES = {
+    "notices": (PTITNoticeCrawler, THONG_BAO_URL, MAX_PAGE_TB, "notices.json"),
+    "news": (PTITNoticeCrawler, TIN_TUC_URL, MAX_PAGE_TT, "news.json"),
+    "events": (PTITEventCrawler, SU_KIEN_URL, MAX_PAGE_SK, "events.json"),
+    "industries": (DaoTaoCrawler, DAO_TAO_URL, None, "industries.json"),
+}
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+_index_lock = threading.Lock()
+
+
+def pipeline_settings() -> Dict:
+    config = load_config()
+    settings = config.get("jobs") or {}
+    rag_config = config.get("rag") or {}
+    return {
+        "data_dir": settings.get("data_dir", os.path.join("data", "raw")),
+        "work_dir": settings.get("work_dir", os.path.join("data", "jobs")),
+        "ocr_batch": settings.get("ocr_batch", 20),
+        "embed_shard": settings.get("embed_shard", 512),
+        # OCR'd where the indexer reads OCR'd texts from.
+        "ocr_dir": rag_config.get("ocr_dir", os.path.join("data", "text_from_image")),
+        "index_dir": rag_config.get("index_dir", os.path.join("data", "processed", "faiss_index")),
+        "index": rag_config.get("index") or {},
+        "model": rag_config.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2"),
+        "embed_batch_size": rag_config.get("embed_batch_size", 64),
+    }
+
+
+def get_embeddings():
+    """
+    The embedding model of rag.embedding_model behind the embedding cache, loaded once per worker
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                # Imported here so that crawl and OCR workers never load FAISS or the model.
+                from app.services.indexing import get_embeddings as create
+
+                _embeddings = create(pipeline_settings()["model"], cache=True)
+    return _embeddings
+
+
+def _image_links(items: List[Dict]) -> List[str]:
+    links = {}
+    for item in items:
+        content = item.get("content")
+        if isinstance(content, dict):
+            for link in content.get("image_links") or content.get("images") or []:
+                links[link.strip()] = None
+    return list(links)
+
+
+async def _acrawl(source: str, url: str, max_pages: Optional[int], seen_urls: Optional[set]) -> List[Dict]:
+    crawler_class = SOURCES[source][0]
+    async with CrawlEngine.from_config() as engine:
+        if crawler_class is DaoTaoCrawler:
+            crawler = DaoTaoCrawler(url, cache=HTTPCache.from_config())
+            return await crawler.aget_industries_from_a_page(engine, url)
+        crawler = crawler_class(url, max_pages, cache=HTTPCache.from_config())
+        return await crawler.acrawl_all(engine, seen_urls)
+
+
+@job_type("crawl", period=3600, source=str, max_pages=Optional[int], full=Optional[bool], url=Optional[str])
+def crawl(context, source: str, max_pages: Optional[int] = None, full: Optional[bool] = None,
+          url: Optional[str] = None) -> Dict:
+    """
+    Crawl source (a key of SOURCES) into its file, newest posts first.
+    full crawls every page instead of stopping at the first saved post;
+    url replaces the source's url (a mirror, a test server).
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source {source!r}, expected one of {', '.join(SOURCES)}")
+    settings = pipeline_settings()
+    crawler_class, source_url, pages, file_name = SOURCES[source]
+    saver = crawler_class(url or source_url)
+    saver.data_dir = settings["data_dir"]
+    os.makedirs(saver.data_dir, exist_ok=True)
+
+    old = saver.load(file_name)
+    seen = {item["url"] for item in old if item.get("url")}
+    context.progress(0, message=f"crawling {source}")
+    items = asyncio.run(_acrawl(source, url or source_url, max_pages or pages, None if full else seen))
+    if crawler_class is DaoTaoCrawler:
+        # The program pages are few and change in place: replace them all.
+        new, data = items, items
+    else:
+        new = [item for item in items if item.get("url") not in seen]
+        found = {item.get("url") for item in items}
+        data = items + [item for item in old if item.get("url") not in found]
+    saver.save(data, file_name)
+    result = {"source": source, "crawled": len(items), "new": len(new), "saved": len(data), "ocr_jobs": []}
+    if not new and not full:
+        return result
+
+    links = _image_links(new)
+    batch = settings["ocr_batch"]
+    result["ocr_jobs"] = [context.submit("ocr", {"sources": links[start:start + batch]})["id"]
+                          for start in range(0, len(links), batch)]
+    result["chunk_job"] = context.submit("chunk", key=context.id, depends_on=result["ocr_jobs"])["id"]
+    return result
+
+
+@job_type("ocr", sources=list)
+def ocr(context, sources: List[str]) -> Dict:
+    """
+    OCR image links or paths into rag.ocr_dir, one at a time for progress
+    """
+    # Imported here so that only OCR workers load OpenCV and tesseract.
+    from app.services.image_processor import ocr_batch
+
+    ocr_dir = pipeline_settings()["ocr_dir"]
+    totals = {"images": 0, "ocr": 0, "skipped": 0, "failed": 0}
+    for done, source in enumerate(sources, 1):
+        # In this thread: the worker's threads are what runs OCR jobs in parallel.
+        stats = ocr_batch([source], ocr_dir, workers=0)
+        for key in totals:
+            totals[key] += stats[key]
+        context.progress(done, len(sources))
+    return totals
+
+
+def _safe_name(job_id: str) -> str:
+    return re.sub(r"[^\w.-]", "_", job_id)
+
+
+@job_type("chunk", full=Optional[bool])
+def chunk(context, full: Optional[bool] = None) -> Dict:
+    """
+    Shard the chunks missing from the index for embed jobs, then queue the index job
+    """
+    from app.services.indexing import content_hash, corpus, document_id, read_manifest
+
+    settings = pipeline_settings()
+    indexed = {} if full else (read_manifest(settings["index_dir"]) or {}).get("documents", {})
+    work_dir = os.path.join(settings["work_dir"], _safe_name(context.id))
+    os.makedirs(work_dir, exist_ok=True)
+
+    shards, texts, seen = [], [], set()
+
+    def write_shard():
+        path = os.path.join(work_dir, f"shard-{len(shards):05d}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(text, ensure_ascii=False) + "\n" for text in texts)
+        shards.append(path)
+        texts.clear()
+
+    for doc in corpus(settings["data_dir"], settings["ocr_dir"]):
+        doc_id = document_id(doc)
+        seen.add(doc_id)
+        if indexed.get(doc_id) != content_hash(doc):
+            texts.append(doc.page_content)
+            if len(texts) >= settings["embed_shard"]:
+                write_shard()
+    if texts:
+        write_shard()
+    removed = len(set(indexed) - seen)
+    result = {"chunks": len(seen), "shards": len(shards), "removed": removed}
+    if not shards and not removed and not full:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return result
+
+    embed_jobs = [context.submit("embed", {"path": path})["id"] for path in shards]
+    result["index_job"] = context.submit("index", {"work_dir": work_dir, "full": bool(full)}, key=context.id,
+                                         depends_on=embed_jobs)["id"]
+    return result
+
+
+@job_type("embed", path=str)
+def embed(context, path: str) -> Dict:
+    """
+    Embed the texts of a shard into the embedding cache
+    """
+    settings = pipeline_settings()
+    with open(path, encoding="utf-8") as f:
+        texts = [json.loads(line) for line in f]
+    embeddings = get_embeddings()
+    batch = settings["embed_batch_size"]
+    for start in range(0, len(texts), batch):
+        embeddings.embed_documents(texts[start:start + batch])
+        context.progress(min(start + batch, len(texts)), len(texts))
+    return {"texts": len(texts)}
+
+
+@contextmanager
+def index_lock(index_dir: str):
+    """
+    Hold the index directory for writing, across the threads and processes of this host
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with _index_lock, open(os.path.join(index_dir, ".lock"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+@job_type("index", work_dir=Optional[str], full=Optional[bool])
+def index(context, work_dir: Optional[str] = None, full: Optional[bool] = None) -> Dict:
+    """
+    Write a new index version from the corpus; the vectors come from the embedding cache
+    """
+    from app.services.indexing import corpus, update_index
+
+    settings = pipeline_settings()
+    context.progress(0, message="indexing")
+    with index_lock(settings["index_dir"]):
+        _, stats = update_index(corpus(settings["data_dir"], settings["ocr_dir"]), get_embeddings(),
+                                settings["index_dir"], full=bool(full), params=settings["index"],
+                                batch_size=settings["embed_batch_size"])
+    if work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return stats
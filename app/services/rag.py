@@ -1,67 +1,492 @@
-import os
+import asyncio
 import json
-import faiss
-from uuid import uuid4
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import openai
 from langchain_core.documents import Document
-from langchain_community.docstore.in_memory import InMemoryDocstore
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings  
-
-
-DATA_FOLDER = "C:\\Users\\Vu The Van\\OneDrive\\Documents\\virtual_personal_assistant\\data\\raw"
-
-documents = []
-for filename in os.listdir(DATA_FOLDER):
-    if filename.endswith(".json"):  
-        file_path = os.path.join(DATA_FOLDER, filename)
-        with open(file_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-
-            for item in data:
-                if any(keyword in filename.lower() for keyword in ["events", "news", "notices"]):
-                    
-                    page_content = item["content"].get("text", "") if isinstance(item["content"], dict) else item["content"]
-                    
-                    doc = Document(
-                        page_content=page_content,  
-                        metadata={"title": item.get("title", "No Title"), "category": "event", "url": item.get("url", "")}
-                    )
-                
-                elif "industries" in filename.lower():
-                    page_content = item.get("content", "")  
-                    doc = Document(
-                        page_content=page_content,  
-                        metadata={"title": item.get("program_name", "No title"), "category": "industry"}
-                    )
-
-                else:
-                    page_content = item["content"].get("text", "") if isinstance(item["content"], dict) else item["content"]
-                    
-                    doc = Document(
-                        page_content=page_content,  
-                        metadata={"category": "unknown"}
-                    )
-
-                documents.append(doc)
-
-print(f"📂 Đã load {len(documents)} tài liệu từ {DATA_FOLDER}")
-
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-index = faiss.IndexFlatL2(len(embeddings.embed_query("test")))
-vector_store = FAISS(
-    embedding_function=embeddings,
-    index=index,
-    docstore=InMemoryDocstore(),
-    index_to_docstore_id={},
+
+from app.services.answer_cache import AnswerCache
+from app.services.chunking import merge_chunks
+from app.services.embedders import LazyEmbeddings
+from app.services.filters import MetadataIndex, filter_key, normalize_filters, search_parameters
+from app.services.indexing import EMBEDDING_MODEL, INDEX_DIR, MANIFEST_FILE, current_index_dir, load_index, read_manifest
+from app.services.lexical import LexicalIndex, load_lexical_index, reciprocal_rank_fusion
+from app.utils import metrics
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+SYSTEM_PROMPT = (
+    "Bạn là trợ lý ảo của Học viện Công nghệ Bưu chính Viễn thông (PTIT). "
+    "Trả lời câu hỏi dựa trên các tài liệu được cung cấp, bằng ngôn ngữ của câu hỏi. "
+    "Nếu tài liệu không có thông tin, hãy nói rằng bạn không biết."
 )
 
-uuids = [str(uuid4()) for _ in range(len(documents))]
-vector_store.add_documents(documents=documents, ids=uuids)
+_vector_store = None
+
+
+def get_vector_store():
+    """
+    Return the process-wide vector store, opened read-only from the prebuilt index.
+    Build the index first with: python -m app.services.indexing build
+    The embedding model is loaded on the first question (or warm-up), not with the index.
+    """
+    global _vector_store
+    if _vector_store is None:
+        rag_config = load_config().get("rag", {})
+        index_dir = rag_config.get("index_dir", INDEX_DIR)
+        embeddings = LazyEmbeddings(rag_config.get("embedding_model", EMBEDDING_MODEL))
+        _vector_store = load_index(embeddings, index_dir, mmap=True, params=rag_config.get("index") or {})
+        logger.info(f"Loaded FAISS index with {_vector_store.index.ntotal} vectors from {index_dir}")
+    return _vector_store
+
+
+Hits = List[Tuple[Document, float]]
+# Per query: its hits, and its embedding (None if it was not embedded), which the answer cache reuses.
+SearchResults = List[Tuple[Hits, Optional[np.ndarray]]]
+
+BATCH_SIZES = metrics.histogram("vpa_rag_search_batch_size", "Questions searched together by the query batcher",
+                                buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class QueryBatcher:
+    """
+    Groups queries that arrive within max_wait seconds of each other into one
+    call of search(queries, k, filters) per distinct filter, which runs on
+    executor off the event loop. Each query gets its top k hits and its vector.
+    """
+
+    def __init__(self, search: Callable[[List[str], int, Optional[Dict]], SearchResults], executor: ThreadPoolExecutor,
+                 max_batch_size: int = 32, max_wait: float = 0.005):
+        self.search = search
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None
+        self._running = set()
+
+    async def submit(self, query: str, k: int, filters: Optional[Dict] = None) -> Tuple[Hits, Optional[np.ndarray]]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, filters, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        groups = {}
+        for item in batch:
+            groups.setdefault(filter_key(item[2]), []).append(item)
+        for group in groups.values():
+            # Keep a reference so the task is not garbage collected mid-flight.
+            task = asyncio.ensure_future(self._run(group))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        queries = [query for query, _, _, _ in batch]
+        k = max(k for _, k, _, _ in batch)
+        try:
+            results = await loop.run_in_executor(self.executor, self.search, queries, k, batch[0][2])
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, k, _, future), (hits, vector) in zip(batch, results):
+            if not future.done():
+                future.set_result((hits[:k], vector))
+
+
+class RAGService:
+    """
+    Answers questions from the indexed PTIT corpus.
+
+    Query embedding and FAISS search run in a bounded thread pool, and
+    concurrent questions are micro-batched into a single embed_documents call
+    and a single index.search call. Chunk hits are merged per parent document.
+    With rag.hybrid enabled, the chunks found by BM25 (app.services.lexical)
+    are fused with the FAISS hits by reciprocal rank before the merge.
+    Structured filters (app.services.filters) restrict both searches to the
+    matching chunks before ranking.
+    Answers are cached (app.services.answer_cache) per index version.
+    stream_question sends the sources, then the answer token by token.
+    A new index version written to index_dir is loaded in the background
+    and swapped in (reload_index); questions in flight finish on the old one.
+    """
+
+    def __init__(self, vector_store=None, top_k: Optional[int] = None, max_workers: Optional[int] = None,
+                 max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 model: Optional[str] = None, answer_cache: Optional[AnswerCache] = None,
+                 llm: Optional[openai.AsyncOpenAI] = None, lexical_index: Optional[LexicalIndex] = None):
+        config = load_config()
+        rag_config = config.get("rag", {})
+        self._vector_store = vector_store
+        # Manifest version of the loaded index; None for a store passed in.
+        self.index_version = None
+        self.top_k = top_k or rag_config.get("top_k", 4)
+        self.model = model or config.get("services", {}).get("openai", {}).get("model", "gpt-4")
+        # Several chunks of one document can rank high, so fetch more and merge per parent.
+        self.fetch_factor = (rag_config.get("chunking") or {}).get("fetch_factor", 4)
+        hybrid = rag_config.get("hybrid") or {}
+        self.hybrid = hybrid.get("enabled", True)
+        self.rrf_k = hybrid.get("rrf_k", 60)
+        self.lexical_index = lexical_index
+        self._metadata_index = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or rag_config.get("search_threads", 4),
+            thread_name_prefix="rag-search",
+        )
+        self.batcher = QueryBatcher(
+            self._search_batch,
+            self.executor,
+            max_batch_size=max_batch_size or rag_config.get("max_batch_size", 32),
+            max_wait=(max_wait_ms if max_wait_ms is not None else rag_config.get("max_batch_wait_ms", 5)) / 1000,
+        )
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache.from_config(self._embed_question)
+        self._llm = llm
+        self.index_dir = rag_config.get("index_dir", INDEX_DIR)
+        # Only an index loaded from index_dir is reloaded, not a store passed in.
+        self.reload_interval = rag_config.get("reload_interval_s", 10) if vector_store is None else 0
+        self._next_check = 0.0
+        self._manifest_mtime = None
+        self._reloading = threading.Lock()
+
+    @property
+    def llm(self) -> openai.AsyncOpenAI:
+        # One client per service, so its connections to the LLM API are kept alive between questions.
+        if self._llm is None:
+            self._llm = openai.AsyncOpenAI()
+        return self._llm
+
+    @property
+    def vector_store(self):
+        # Loaded on first use so that importing the router stays cheap.
+        if self._vector_store is None:
+            # A version switched to meanwhile is newer than the one recorded, and reloaded on the next check.
+            version_dir = current_index_dir(self.index_dir)
+            self._vector_store = get_vector_store()
+            self._manifest_mtime = self._manifest_stat(version_dir)
+            manifest = read_manifest(version_dir)
+            self.index_version = (manifest or {}).get("version")
+            if self.hybrid and self.lexical_index is None:
+                self.lexical_index = load_lexical_index(version_dir)
+                if self.lexical_index is None:
+                    logger.warning(f"No BM25 index in {self.index_dir}, retrieving by vectors only; rebuild the index to add it")
+        return self._vector_store
+
+    def _manifest_stat(self, version_dir: Optional[str] = None) -> Optional[int]:
+        # Every version has its own manifest, so this changes when CURRENT is switched.
+        try:
+            return os.stat(os.path.join(version_dir or current_index_dir(self.index_dir), MANIFEST_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload_index(self) -> bool:
+        """
+        Load the index of index_dir if its version differs from the loaded one,
+        then swap it in; True if it was. The embedding model is kept.
+        """
+        with self._reloading:
+            # All files are read from the directory of one version, which is never rewritten.
+            version_dir = current_index_dir(self.index_dir)
+            mtime = self._manifest_stat(version_dir)
+            manifest = read_manifest(version_dir)
+            version = (manifest or {}).get("version")
+            if version is None or version == self.index_version:
+                self._manifest_mtime = mtime
+                return False
+            current = self._vector_store
+            rag_config = load_config().get("rag", {})
+            embeddings = (current.embedding_function if current is not None
+                          else LazyEmbeddings(rag_config.get("embedding_model", EMBEDDING_MODEL)))
+            start = time.perf_counter()
+            vector_store = load_index(embeddings, version_dir, mmap=True, params=rag_config.get("index") or {})
+            lexical_index = load_lexical_index(version_dir) if self.hybrid else None
+            metadata_index = MetadataIndex.from_store(vector_store, lexical_index)
+            # A batch searching during the swap may pair the new store with the old BM25
+            # index; hits missing from the store it searched are dropped by _search_batch.
+            self.lexical_index = lexical_index
+            self._metadata_index = metadata_index
+            self._vector_store = vector_store
+            self.index_version = version
+            self._manifest_mtime = mtime
+            logger.info(f"Swapped in index version {version} with {vector_store.index.ntotal} vectors "
+                        f"({time.perf_counter() - start:.2f}s)")
+            return True
+
+    def _reload_in_background(self) -> None:
+        try:
+            self.reload_index()
+        except Exception:
+            logger.exception(f"Could not load the new index of {self.index_dir}, keeping version {self.index_version}")
+
+    def _check_index(self) -> None:
+        # A stat of the manifest at most every reload_interval; the reload itself runs off the event loop.
+        if not self.reload_interval or self._vector_store is None:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        mtime = self._manifest_stat()
+        if mtime is not None and mtime != self._manifest_mtime and not self._reloading.locked():
+            self.executor.submit(self._reload_in_background)
+
+    def preload(self) -> bool:
+        """
+        Load the index, the BM25 index and the metadata index, but not the
+        embedding model: what forked workers can share (app.serve).
+        False when there is no index to load.
+        """
+        try:
+            self.vector_store
+        except FileNotFoundError as e:
+            logger.warning(f"Nothing to warm up, questions are answered without retrieval: {e}")
+            return False
+        self.metadata_index  # built now rather than on the first filtered question
+        return True
+
+    def warm_up(self) -> None:
+        """
+        preload(), then load the embedding model and embed one question, so
+        that the first real question does not pay for them
+        """
+        if self.preload():
+            self.vector_store.embedding_function.embed_documents(["PTIT"])
+
+    def _embed_question(self, question: str) -> Optional[List[float]]:
+        try:
+            return self.vector_store.embedding_function.embed_query(question)
+        except FileNotFoundError:
+            return None
+
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        # Built on the first filtered search, and again when the store or BM25 index is replaced.
+        vector_store = self.vector_store
+        metadata_index = self._metadata_index
+        if (metadata_index is None or metadata_index.vector_store is not vector_store
+                or metadata_index.lexical_index is not self.lexical_index):
+            metadata_index = self._metadata_index = MetadataIndex.from_store(vector_store, self.lexical_index)
+        return metadata_index
+
+    def _search_batch(self, queries: List[str], k: int, filters: Optional[Dict] = None) -> SearchResults:
+        vector_store = self.vector_store
+        BATCH_SIZES.observe(len(queries))
+        n_chunks = k * self.fetch_factor
+        params = selection = None
+        if filters:
+            with metrics.timed("filter"):
+                selection = self.metadata_index.select(filters)
+            if not len(selection):
+                return [([], None) for _ in queries]
+            params = search_parameters(vector_store.index, selection.selector)
+        with metrics.timed("embed"):
+            vectors = np.asarray(vector_store.embedding_function.embed_documents(queries), dtype=np.float32)
+        with metrics.timed("vector_search"):
+            scores, ids = vector_store.index.search(vectors, n_chunks, params=params)
+        lexical_index = self.lexical_index if self.hybrid else None
+
+        results = []
+        for query, vector, row_scores, row_ids in zip(queries, vectors, scores, ids):
+            ranked = []
+            for score, i in zip(row_scores, row_ids):
+                # Skips the -1 padding, and ids missing from the mapping rather than failing the question.
+                doc_id = vector_store.index_to_docstore_id.get(i)
+                if doc_id is not None:
+                    ranked.append((doc_id, float(score)))
+            if lexical_index is not None:
+                with metrics.timed("lexical_search"):
+                    lexical = lexical_index.search(query, n_chunks, selection.lexical_slots if selection else None)
+                ranked = reciprocal_rank_fusion([[doc_id for doc_id, _ in ranked], [doc_id for doc_id, _ in lexical]],
+                                                self.rrf_k)[:n_chunks]
+            with metrics.timed("merge"):
+                hits = []
+                for doc_id, score in ranked:
+                    doc = vector_store.docstore.search(doc_id)
+                    if isinstance(doc, Document):
+                        hits.append((doc, score))
+                results.append((merge_chunks(hits, k), vector))
+        return results
+
+    async def retrieve(self, question: str, k: Optional[int] = None,
+                       filters: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """
+        Return the k best documents for question with the score of their best chunk:
+        the L2 distance (lower is better), or the fused rank score (higher is better) in hybrid mode.
+        Only documents matching filters (category, source, date_from, date_to) are searched.
+        """
+        return (await self._retrieve(question, k, filters))[0]
+
+    async def _retrieve(self, question: str, k: Optional[int] = None,
+                        filters: Optional[Dict] = None) -> Tuple[Hits, Optional[np.ndarray]]:
+        # retrieve(), with the question vector embedded in the batch.
+        self._check_index()
+        return await self.batcher.submit(question, k or self.top_k, normalize_filters(filters))
+
+    def build_messages(self, question: str, documents: List[Document], context: Optional[str] = None) -> List[dict]:
+        sources = "\n\n".join(
+            f"[{i + 1}] {doc.metadata.get('title', 'No Title')}\n{doc.page_content}"
+            for i, doc in enumerate(documents)
+        )
+        user_content = f"Tài liệu:\n{sources or '(không có)'}\n\n"
+        if context:
+            user_content += f"Ngữ cảnh thêm: {context}\n\n"
+        user_content += f"Câu hỏi: {question}"
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content},
+        ]
+
+    @staticmethod
+    def _cache_context(context: Optional[str], filters: Optional[Dict]) -> Optional[str]:
+        # Answers to the same question under different filters are cached apart.
+        if not filters:
+            return context
+        return f"{context or ''}\n{json.dumps(filters, sort_keys=True)}"
+
+    def _lookup_answer(self, question: str, context: Optional[str]):
+        try:
+            self.vector_store  # loads the index, and with it the index version
+        except FileNotFoundError:
+            pass
+        self.answer_cache.set_version(self.index_version)
+        return self.answer_cache.lookup_exact(question, context)
+
+    async def _cached_answer(self, question: str, context: Optional[str]) -> Optional[str]:
+        # The exact tier, before retrieval. A cache failure (redis down) must not fail the question.
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timed("answer_cache"):
+                return await loop.run_in_executor(self.executor, self._lookup_answer, question, context)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+
+    async def _similar_answer(self, question: str, context: Optional[str], vector: Optional[np.ndarray]):
+        # The semantic tier, with the vector retrieval embedded the question into: no second embedding.
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timed("answer_cache"):
+                return await loop.run_in_executor(self.executor, self.answer_cache.lookup_similar,
+                                                  question, context, vector)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None, None
+
+    async def _store_answer(self, question: str, context: Optional[str], answer: str, vector) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.answer_cache.store, question, context, answer, vector)
+        except Exception as e:
+            logger.warning(f"Could not cache the answer: {e}")
+
+    async def _retrieve_or_nothing(self, question: str,
+                                   filters: Optional[Dict] = None) -> Tuple[Hits, Optional[np.ndarray]]:
+        try:
+            # Includes the wait for the query batch, unlike the embed and search stages.
+            with metrics.timed("retrieve"):
+                return await self._retrieve(question, filters=filters)
+        except FileNotFoundError as e:
+            logger.warning(f"Answering without retrieval: {e}")
+            return [], None
+
+    async def process_question(self, question: str, context: Optional[str] = None,
+                               filters: Optional[Dict] = None) -> str:
+        """
+        Answer question from the answer cache, or retrieve documents for it and let the LLM answer from them
+        """
+        filters = normalize_filters(filters)
+        cache_context = self._cache_context(context, filters)
+        if self.answer_cache is not None:
+            answer = await self._cached_answer(question, cache_context)
+            if answer is not None:
+                return answer
+
+        hits, vector = await self._retrieve_or_nothing(question, filters)
+        if self.answer_cache is not None:
+            answer, vector = await self._similar_answer(question, cache_context, vector)
+            if answer is not None:
+                return answer
+        with metrics.timed("llm"):
+            response = await self.llm.chat.completions.create(
+                model=self.model,
+                messages=self.build_messages(question, [doc for doc, _ in hits], context),
+            )
+        answer = response.choices[0].message.content
+        if self.answer_cache is not None:
+            await self._store_answer(question, cache_context, answer, vector)
+        return answer
+
+    async def stream_question(self, question: str, context: Optional[str] = None,
+                              filters: Optional[Dict] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yield ("sources", [source, ...]) and then ("token", text) as the LLM generates the answer.
+        A cached answer comes as a single token, after no sources for a repeated question.
+        """
+        filters = normalize_filters(filters)
+        cache_context = self._cache_context(context, filters)
+        # The cache lookup and the retrieval run side by side: a miss, the common
+        # case for a new question, then costs no extra wait before the sources.
+        retrieval = asyncio.ensure_future(self._retrieve_or_nothing(question, filters))
+        if self.answer_cache is not None:
+            answer = await self._cached_answer(question, cache_context)
+            if answer is not None:
+                retrieval.cancel()
+                yield "sources", []
+                yield "token", answer
+                return
+
+        hits, vector = await retrieval
+        yield "sources", [source_of(doc, score) for doc, score in hits]
+        if self.answer_cache is not None:
+            answer, vector = await self._similar_answer(question, cache_context, vector)
+            if answer is not None:
+                yield "token", answer
+                return
+
+        start = time.perf_counter()
+        stream = await self.llm.chat.completions.create(
+            model=self.model,
+            messages=self.build_messages(question, [doc for doc, _ in hits], context),
+            stream=True,
+        )
+        parts = []
+        async for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                if not parts:
+                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                parts.append(text)
+                yield "token", text
+        metrics.observe("llm_stream", time.perf_counter() - start)
+        if self.answer_cache is not None:
+            await self._store_answer(question, cache_context, "".join(parts), vector)
 
-query = "Sự kiện về công nghệ tại PTIT"
-results = vector_store.similarity_search(query, k=2)
 
-print("\n🔍 Kết quả tìm kiếm:")
-for res in results:
-    print(f"{res.metadata.get('title', 'No Title')} ({res.metadata.get('date', 'No Date')})\n{res.page_content[:300]}...\n🔗 {res.metadata.get('url', 'No URL')}\n")
+def source_of(doc: Document, score: float) -> Dict:
+    """
+    What a client is shown of a retrieved document
+    """
+    return {
+        "title": doc.metadata.get("title", "No Title"),
+        "url": doc.metadata.get("url"),
+        "category": doc.metadata.get("category"),
+        "date": doc.metadata.get("date") or None,
+        "score": score,
+    }
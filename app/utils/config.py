@@ -0,0 +1,18 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+import yaml
+
+# APP_CONFIG points a process (a benchmark's server, a test) at another config file.
+CONFIG_PATH = Path(os.environ.get('APP_CONFIG', 'config/config.yaml'))
+
+
+@lru_cache(maxsize=None)
+def load_config(path: Path = CONFIG_PATH) -> Dict:
+    """
+    Load config/config.yaml (or $APP_CONFIG) once per process
+    """
+    with Path(path).open(encoding="utf-8") as f:
+        return yaml.safe_load(f)
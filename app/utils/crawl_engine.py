@@ -0,0 +1,136 @@
+"""
+Async HTTP engine shared by the PTIT crawlers.
+
+One pooled httpx.AsyncClient serves every request, with a concurrency limit
+and a politeness delay per host, timeouts, and retries with exponential
+backoff on connection errors and 429/5xx answers. With parse_workers > 0,
+HTML parsing runs in a process pool so that CPU-bound parsing of one page
+does not hold up the downloads of the others.
+
+    async with CrawlEngine.from_config() as engine:
+        notices = await PTITNoticeCrawler(THONG_BAO_URL, 4).acrawl_all(engine)
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.utils import metrics
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+USER_AGENT = "Mozilla/5.0 (compatible; VPA-PTIT-Crawler/1.0)"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+RETRIES = metrics.counter("vpa_crawl_retries_total", "Crawler requests retried after a transient failure")
+BYTES = metrics.counter("vpa_crawl_bytes_total", "Bytes of the pages downloaded by the crawlers")
+
+T = TypeVar("T")
+
+
+class CrawlEngine:
+    def __init__(self, max_connections: int = 20, per_host: int = 4, delay: float = 0.0,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 15.0, parse_workers: int = 0):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.delay = delay
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.parse_workers = parse_workers
+        self.client: Optional[httpx.AsyncClient] = None
+        self.parse_executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {"requests": 0, "retries": 0, "bytes": 0}
+        self._host_slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._host_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._next_start: Dict[str, float] = defaultdict(float)
+
+    @classmethod
+    def from_config(cls, **overrides) -> "CrawlEngine":
+        settings = dict(load_config().get("crawler") or {})
+        # crawler.cache configures the HTTPCache of the crawlers, not the engine.
+        settings.pop("cache", None)
+        settings.update(overrides)
+        return cls(**settings)
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            timeout=httpx.Timeout(self.timeout),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+        if self.parse_workers > 0:
+            self.parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        self.client = None
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown()
+            self.parse_executor = None
+
+    async def _wait_turn(self, host: str) -> None:
+        # Space out request starts to one host by at least self.delay seconds.
+        if not self.delay:
+            return
+        async with self._host_locks[host]:
+            now = time.monotonic()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        GET url, retrying transient failures; 4xx answers raise httpx.HTTPStatusError
+        """
+        host = urlsplit(url).netloc
+        async with self._host_slots[host]:
+            for attempt in range(self.retries + 1):
+                await self._wait_turn(host)
+                self.stats["requests"] += 1
+                try:
+                    with metrics.timed("crawl_fetch"):
+                        response = await self.client.get(url, headers=headers)
+                except httpx.TransportError as e:
+                    error, retry_after = e, None
+                else:
+                    if response.status_code not in RETRY_STATUS:
+                        # 304 answers to conditional requests are returned, not raised.
+                        if response.status_code >= 400:
+                            response.raise_for_status()
+                        self.stats["bytes"] += len(response.content)
+                        BYTES.inc(amount=len(response.content))
+                        return response
+                    error = httpx.HTTPStatusError(f"{response.status_code} for {url}", request=response.request,
+                                                  response=response)
+                    retry_after = response.headers.get("Retry-After")
+                if attempt == self.retries:
+                    raise error
+                self.stats["retries"] += 1
+                RETRIES.inc()
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+                logger.warning(f"Retrying {url} in {wait:.1f}s after {error!r}")
+                await asyncio.sleep(wait)
+
+    async def fetch(self, url: str) -> str:
+        return (await self.get(url)).text
+
+    async def parse(self, parse: Callable[..., T], html: str, *args) -> T:
+        """
+        Run parse(html, *args) in the parse pool, or inline without one;
+        parse must be a module-level function so that it can be pickled
+        """
+        with metrics.timed("crawl_parse"):
+            if self.parse_executor is None:
+                return parse(html, *args)
+            return await asyncio.get_running_loop().run_in_executor(self.parse_executor, parse, html, *args)
@@ -1,13 +1,150 @@
+import asyncio
 import json
 import os
-from bs4 import BeautifulSoup
 import requests
 
+from app.utils import metrics
+from app.utils.crawl_engine import USER_AGENT, CrawlEngine
+from app.utils.http_cache import HTTPCache
+from app.utils.parsers import (PARSER, parse_event, parse_event_list, parse_industry, parse_industry_links,
+                               parse_notice, parse_notice_list)
 
 
-class PTITNoticeCrawler:
-    def __init__(self, base_url, max_page=4):
+class BaseCrawler:
+    """
+    Mỗi crawler có hai cách chạy:
+        - đồng bộ: get_* / crawl_all, tải tuần tự qua một requests.Session
+        - bất đồng bộ: aget_* / acrawl_all(engine), tải song song qua CrawlEngine
+    Phần phân tích HTML (app/utils/parsers.py) dùng chung cho cả hai nên kết quả
+    giống hệt nhau; khi chạy bất đồng bộ, việc phân tích được đẩy sang process pool
+    của engine (nếu có) để không chặn event loop.
+
+    Nếu có cache (HTTPCache), các trang bài viết được gửi kèm If-None-Match /
+    If-Modified-Since; trang không đổi (304) lấy lại kết quả đã phân tích từ cache.
+    """
+    timeout = 15
+    # thư mục của load / save
+    data_dir = os.path.join('data', 'raw')
+
+    def __init__(self, base_url, cache=None, parser=PARSER):
         self.base_url = base_url
+        self.cache = cache
+        self.parser = parser
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+
+    def _get(self, url):
+        with metrics.timed("crawl_fetch"):
+            response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def _get_parsed(self, url, parse):
+        if self.cache is None:
+            return parse(self._get(url), self.parser)
+        entry = self.cache.get(url)
+        with metrics.timed("crawl_fetch"):
+            response = self.session.get(url, headers=HTTPCache.validators(entry), timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            return self.cache.not_modified(url, entry)
+        response.raise_for_status()
+        value = parse(response.text, self.parser)
+        self.cache.put(url, response.headers, value)
+        return value
+
+    async def _aget_parsed(self, engine, url, parse):
+        if self.cache is None:
+            return await engine.parse(parse, await engine.fetch(url), self.parser)
+        entry = self.cache.get(url)
+        response = await engine.get(url, headers=HTTPCache.validators(entry))
+        if response.status_code == 304 and entry is not None:
+            return self.cache.not_modified(url, entry)
+        if response.status_code != 200:
+            response.raise_for_status()
+        value = await engine.parse(parse, response.text, self.parser)
+        self.cache.put(url, response.headers, value)
+        return value
+
+    @staticmethod
+    def _until_seen(items, seen_urls):
+        '''
+        Giữ các (title, date, url) đứng trước url đầu tiên đã có trong seen_urls
+        '''
+        for i, (_, _, url) in enumerate(items):
+            if seen_urls and url in seen_urls:
+                return items[:i]
+        return items
+
+    def _get_page(self, page_url, parse_list, get_content, seen_urls=None):
+        '''
+        return: (list[dict] các bài mới của trang, True nếu đã gặp một url trong seen_urls)
+        '''
+        items = parse_list(self._get(page_url), self.parser)
+        new_items = self._until_seen(items, seen_urls)
+        data = [dict(title=title, date=date, url=url, content=get_content(url)) for title, date, url in new_items]
+        return data, len(new_items) < len(items)
+
+    async def _aget_page(self, engine, page_url, parse_list, aget_content, seen_urls=None):
+        items = await engine.parse(parse_list, await engine.fetch(page_url), self.parser)
+        new_items = self._until_seen(items, seen_urls)
+        contents = await asyncio.gather(*(aget_content(engine, url) for _, _, url in new_items))
+        data = [dict(title=title, date=date, url=url, content=content)
+                for (title, date, url), content in zip(new_items, contents)]
+        return data, len(new_items) < len(items)
+
+    def _crawl_pages(self, get_page, seen_urls, name):
+        data = []
+        for i in range(1, self.max_page + 1):
+            page, reached_seen = get_page(f"{self.base_url}/page/{i}", seen_urls)
+            data.extend(page)
+            print(f"Đã lấy toàn bộ các {name} từ trang {i}")
+            if reached_seen:
+                print(f"Trang {i} có {name} đã lấy trước đó, dừng lại")
+                break
+        return data
+
+    async def _acrawl_pages(self, engine, aget_page, seen_urls, name):
+        page_urls = [f"{self.base_url}/page/{i}" for i in range(1, self.max_page + 1)]
+        if not seen_urls:
+            # tải tất cả các trang song song, giữ nguyên thứ tự
+            pages = await asyncio.gather(*(aget_page(engine, page_url, None) for page_url in page_urls))
+            print(f"Đã lấy toàn bộ các {name} từ {len(pages)} trang")
+            return [item for page, _ in pages for item in page]
+        # chế độ cập nhật: lần lượt từng trang cho tới khi gặp bài đã lấy
+        data = []
+        for i, page_url in enumerate(page_urls, 1):
+            page, reached_seen = await aget_page(engine, page_url, seen_urls)
+            data.extend(page)
+            if reached_seen:
+                print(f"Trang {i} có {name} đã lấy trước đó, dừng lại")
+                break
+        return data
+
+    def load(self, file_name):
+        """
+        đọc dữ liệu đã lưu, trả về [] nếu chưa có file
+        """
+        path = os.path.join(self.data_dir, file_name)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, data, file_name):
+        """
+        lưu dữ liệu vào file json; ghi ra file tạm rồi đổi tên để bộ đánh chỉ mục
+        không bao giờ đọc phải file đang ghi dở
+        """
+        path = os.path.join(self.data_dir, file_name)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            s = json.dumps(data, ensure_ascii=False, indent=4)
+            f.write(s)
+        os.replace(f"{path}.tmp", path)
+
+
+class PTITNoticeCrawler(BaseCrawler):
+    def __init__(self, base_url, max_page=4, cache=None, parser=PARSER):
+        super().__init__(base_url, cache, parser)
         self.max_page = max_page
     def get_content_from_a_notice(self, notice_url):
         '''
@@ -21,22 +158,17 @@ class PTITNoticeCrawler:
                     "image_links": list[str]
                 }
         '''
-        response = requests.get(notice_url)
-        soup = BeautifulSoup(response.text, features="html.parser")
-        content = soup.find("div", class_="post-content")
-        # nếu không tìm thấy content thì trả về None
-        if not content:
-            return None
-        text = '' # văn bản
-        image_links = [] # các link ảnh
-        for p in content.find_all("p"):
-            # nếu có text thì thêm vào text
-            if p.text.strip() :
-                text += p.text.strip() + '\n'
-        # nếu có ảnh thì thêm vào image_links
-        for img in content.find_all("img", src=True):
-            image_links.append(img['src'])
-        return dict(text=text, image_links=image_links)
+        return self._get_parsed(notice_url, parse_notice)
+
+    async def aget_content_from_a_notice(self, engine, notice_url):
+        return await self._aget_parsed(engine, notice_url, parse_notice)
+
+    def parse_notice(self, html):
+        return parse_notice(html, self.parser)
+
+    def parse_notice_list(self, html):
+        return parse_notice_list(html, self.parser)
+
     def get_notices_from_a_page(self, page_url):
         '''
         Hàm này trả về toàn bộ thông báo từ trang thông báo của trường PTIT
@@ -51,26 +183,35 @@ class PTITNoticeCrawler:
                     }
                 ]
         '''
+        return self._notices_from_a_page(page_url)[0]
+
+    def _notices_from_a_page(self, page_url, seen_urls=None):
         try:
-            data = []
-            response = requests.get(page_url)
-            soup = BeautifulSoup(response.text, features="html.parser")
-            ul = soup.find("ul", class_="ova-blog column_4 version_1 default-post")
-            items = ul.find_all("li", class_="item")
-            # lấy thông tin từ từng item
-            for item in items:
-                content = item.find("div", class_="content")
-                # lấy title, url, date từ item
-                title = content.find("h2", class_= 'post-title').text.strip()
-                url = content.find("a" )['href'].strip()
-                date = content.find("span", class_="right date").text.strip()
-                data.append(dict(title=title, date=date, url=url, content=self.get_content_from_a_notice(url)))
-            return data
+            return self._get_page(page_url, parse_notice_list, self.get_content_from_a_notice, seen_urls)
         except Exception as e:
             print(f"Lỗi không thể lấy thông báo từ trang {page_url}")
-    def crawl_all(self):
+            return [], False
+
+    async def aget_notices_from_a_page(self, engine, page_url):
+        '''
+        Như get_notices_from_a_page nhưng tải nội dung các thông báo song song
+        '''
+        return (await self._anotices_from_a_page(engine, page_url))[0]
+
+    async def _anotices_from_a_page(self, engine, page_url, seen_urls=None):
+        try:
+            return await self._aget_page(engine, page_url, parse_notice_list, self.aget_content_from_a_notice,
+                                         seen_urls)
+        except Exception as e:
+            print(f"Lỗi không thể lấy thông báo từ trang {page_url}")
+            return [], False
+
+    def crawl_all(self, seen_urls=None):
         '''
         Hàm này trả về toàn bộ thông báo từ trang thông báo của trường PTIT
+        tham số:
+            seen_urls: url các thông báo đã lấy; nếu có thì dừng ở thông báo đầu tiên đã lấy
+                       (thông báo mới luôn nằm đầu trang 1 nên thường chỉ cần tải trang 1)
         return:
             list[dict]: 
                 [
@@ -82,12 +223,13 @@ class PTITNoticeCrawler:
                     }
                 ]
         '''
-        notices = []
-        for i in range(1, self.max_page + 1):
-            page_url = f"{self.base_url}/page/{i}"
-            notices.extend(self.get_notices_from_a_page(page_url))
-            print(f"Đã lấy toàn bộ các thông báo từ trang {i}")
-        return notices
+        return self._crawl_pages(self._notices_from_a_page, seen_urls, "thông báo")
+
+    async def acrawl_all(self, engine, seen_urls=None):
+        '''
+        Như crawl_all nhưng tải các trang và các thông báo song song, giữ nguyên thứ tự
+        '''
+        return await self._acrawl_pages(engine, self._anotices_from_a_page, seen_urls, "thông báo")
 
     def get_latest_notice(self):
         '''
@@ -102,31 +244,17 @@ class PTITNoticeCrawler:
         '''
         url = f"{self.base_url}/page/1"
         try:
-            response = requests.get(url)
-            soup = BeautifulSoup(response.text, features="html.parser")
-            ul = soup.find("ul", class_="ova-blog column_4 version_1 default-post")
-            item = ul.find("li", class_="item")
-            post = item.find("div", class_="content")
-            # lấy title, url, date từ item
-            title = post.find("h2", class_= 'post-title').text.strip()
-            url = post.find("a" )['href'].strip()
-            date = post.find("span", class_="right date").text.strip()
+            title, date, url = self.parse_notice_list(self._get(url))[0]
             return dict(title=title, date=date, url=url, content=self.get_content_from_a_notice(url))
         except Exception as e:
             print(f"Lỗi không thể lấy thông báo mới nhất từ trang {url}")
-    def save(self, data, file_name):
-        '''
-        '''
-        data_dir = os.path.join( 'data', 'raw')
-        with open(os.path.join(data_dir, file_name), 'w', encoding='utf-8') as f:
-            s = json.dumps(notices, ensure_ascii=False, indent=4)
-            f.write(s)
 
 
-class PTITEventCrawler:
-    def __init__(self, base_url, max_page = None):
-        self.base_url = base_url
-        self.max_page = max_page
+class PTITEventCrawler(BaseCrawler):
+    def __init__(self, base_url, max_page=None, cache=None, parser=PARSER):
+        super().__init__(base_url, cache, parser)
+        # crawl_all walks pages 1..max_page, so it needs a bound; MAX_PAGE_SK is defined below.
+        self.max_page = MAX_PAGE_SK if max_page is None else max_page
     def get_content_from_event(self,  event_url ):
         """
         return: dict:
@@ -135,18 +263,14 @@ class PTITEventCrawler:
                         "images": list[str]
                     }
         """
-        response = requests.get(event_url)
-        soup = BeautifulSoup(response.text, features="html.parser")
-        content = soup.find("div", class_="ovaev-event-content")
-        texts = ""
-        images = []
-        for p in content.find_all("p",  class_= lambda classes: classes is None or "wp-caption-text" not in classes) :
-            if p.text.strip():
-                texts += p.text.strip() + "\n"
-        for img in content.find_all("img", src=True):
-            images.append(img['src'].strip())
-        return dict(texts=texts, images=images)
-    
+        return self._get_parsed(event_url, parse_event)
+
+    async def aget_content_from_event(self, engine, event_url):
+        return await self._aget_parsed(engine, event_url, parse_event)
+
+    def parse_event(self, html):
+        return parse_event(html, self.parser)
+
     def get_events_from_a_page(self, page_url):
         """
         return: list[dict]:
@@ -159,51 +283,40 @@ class PTITEventCrawler:
                         }
                     ]
         """
-        data = []
-        response = requests.get(page_url)
-        soup = BeautifulSoup(response.text, features="html.parser")
-        ul = soup.find("div", class_="ovaev-search-ajax-container")
-        items = ul.find_all("div", class_="ovaev-content")
-        for item in items:
-            event = item.find("div", class_="event_post")
-            title = event.find("h2").text.strip()
-            date = event.find("div", class_="meta-event").find("div" , class_= "time equal-date").find("span" , class_= "time-date-child").text.strip()
-            url = event.find("a")['href'].strip()
-            data.append(dict(title=title, date=date, url=url, content=self.get_content_from_event(url)))
-        return data
-    
-    # def crawl_all(self):
-    #     """
-    #     return: list[dict]:
-    #                 [
-    #                     {
-    #                         "title": str,
-    #                         "date": str,
-    #                         "url": str,
-    #                         "content": dict
-    #                     }
-    #                 ]
-    #     """
-    #     events = []
-    #     for i in range(1, self.max_page + 1):
-    #         page_url = f"{self.base_url}/page/{i}"
-    #         events.extend(self.get_events_from_a_page(page_url))
-    #         print(f"Đã lấy toàn bộ các sự kiện từ trang {i}")
-    #     return events
-    def save(self, data, file_name):
+        return self._events_from_a_page(page_url)[0]
+
+    def _events_from_a_page(self, page_url, seen_urls=None):
+        return self._get_page(page_url, parse_event_list, self.get_content_from_event, seen_urls)
+
+    async def aget_events_from_a_page(self, engine, page_url):
+        return (await self._aevents_from_a_page(engine, page_url))[0]
+
+    async def _aevents_from_a_page(self, engine, page_url, seen_urls=None):
+        return await self._aget_page(engine, page_url, parse_event_list, self.aget_content_from_event, seen_urls)
+
+    def parse_event_list(self, html):
+        return parse_event_list(html, self.parser)
+
+    def crawl_all(self, seen_urls=None):
         """
-        lưu dữ liệu vào file json
+        seen_urls: url các sự kiện đã lấy; nếu có thì dừng ở sự kiện đầu tiên đã lấy
+        return: list[dict]:
+                    [
+                        {
+                            "title": str,
+                            "date": str,
+                            "url": str,
+                            "content": dict
+                        }
+                    ]
         """
-        data_dir = os.path.join( 'data', 'raw')
-        with open(os.path.join(data_dir, file_name), 'w', encoding='utf-8') as f:
-            s = json.dumps(data, ensure_ascii=False, indent=4)
-            f.write(s)
+        return self._crawl_pages(self._events_from_a_page, seen_urls, "sự kiện")
 
+    async def acrawl_all(self, engine, seen_urls=None):
+        return await self._acrawl_pages(engine, self._aevents_from_a_page, seen_urls, "sự kiện")
 
 
-class DaoTaoCrawler:
-    def __init__(self, base_url):
-        self.base_url = base_url
+class DaoTaoCrawler(BaseCrawler):
     def get_content_from_industry(self, industry_url):
         """
         return: dict:
@@ -223,76 +336,27 @@ class DaoTaoCrawler:
                                     }
                     }
         """
-        response = requests.get(industry_url)
-        soup = BeautifulSoup(response.text, features="html.parser")
-        #get program name
-        program_name = soup.find("h1", class_="breadcrumb-title").text.strip()
-        # get matadata
-        matadata_soup = soup.find("ul" , class_="column_4 mtop")
-        metadata_items = matadata_soup.find_all("li", class_="item")
-        metadata = dict()
-        for i, item in enumerate(metadata_items):
-            if i == 0:
-                metadata["id"] = item.find("strong").text.strip()
-            elif i == 1:
-                metadata[ "time"] = item.find("strong").text.strip()
-            elif i == 2:
-                metadata['admission period'] = item.find("strong").text.strip()
-            elif i == 3:
-                metadata[ 'location'] = item.find("strong").text.strip()
-
-        # get content
-        content_soup = soup.find("div", class_="ova_dir_content")
-        sections_soup = content_soup.find_all("section")
-        content = ""
-        for i, section in enumerate(sections_soup[: -2]):
-            if i == 2 : continue
-            else:
-                content += section.text.strip() + "\n"
-        # get chuyen nganh
-        chuyen_nganh_soup = sections_soup[2].find("ul", class_= "nav-tab").find_all("li")
-        cac_chuyen_nganh = [ li.text.strip() for li in chuyen_nganh_soup]
-        print(f"{program_name} co {len(cac_chuyen_nganh)} chuyen nganh")
-        # get program structure
-        program_structure = dict()
-        ky_hoc_soup = sections_soup[2].find("div").find_all("div", class_= "current-tab")
-        so_luong_ky = len(ky_hoc_soup) // len(cac_chuyen_nganh) # số lượng kỳ học của mỗi chuyên ngành
-        for i, chuyen_nganh in enumerate(cac_chuyen_nganh): # duyệt qua từng chuyên ngành
-            cac_ky_hoc = dict()
-            for j , ky in enumerate(ky_hoc_soup[ i * so_luong_ky: i * so_luong_ky + so_luong_ky]): # duyệt qua từng kỳ học của chuyên ngành
-                ky_hoc = []
-                for mon in ky.find_all("div", class_ = "card-mon-hoc"): # duyệt qua từng môn học của kỳ học
-                    subject = mon.find("div", class_= "title").text.strip()
-                    tin_chi = mon.find("div", class_= "tag").text.strip()
-                    ky_hoc.append(dict(subject=subject, tin_chi=tin_chi))
-                cac_ky_hoc[f"ky {j+1}"] = ky_hoc 
-                ky_hoc = []
-            program_structure[chuyen_nganh] = cac_ky_hoc
-        return dict( program_name= program_name , content=content, program_structure=program_structure, metadata=metadata)
+        return self._get_parsed(industry_url, parse_industry)
+
+    async def aget_content_from_industry(self, engine, industry_url):
+        return await self._aget_parsed(engine, industry_url, parse_industry)
+
+    def parse_industry(self, html):
+        return parse_industry(html, self.parser)
 
     def get_industries_from_a_page(self, page_url):
         """
         return: list[dict]:
         """
-        response = requests.get(page_url)
-        soup = BeautifulSoup(response.text, features="html.parser")
-        ul = soup.find("div", class_= "elementor-element elementor-element-0ea282a elementor-grid-3 elementor-grid-tablet-2 elementor-grid-mobile-1 elementor-widget elementor-widget-loop-grid").find("div", class_="elementor-widget-container").find("div", class_= "elementor-loop-container elementor-grid")
-        li = ul.find_all("div", recursive=False)
-        industries = []
-        for industry_soup in li:
-            industry_soup = industry_soup.find("div").find("div").find("div")
-            industry_url = industry_soup.find("div", class_= "elementor-element elementor-element-5781d80 text-hover-underline elementor-widget elementor-widget-theme-post-title elementor-page-title elementor-widget-heading").find("h2").find("a")['href']
-            industries.append(self.get_content_from_industry(industry_url))
-        return industries
-    
-    def save(self, data, file_name):
-        """
-        lưu dữ liệu vào file json
-        """
-        data_dir = os.path.join( 'data', 'raw')
-        with open(os.path.join(data_dir, file_name), 'w', encoding='utf-8') as f:
-            s = json.dumps(data, ensure_ascii=False, indent=4)
-            f.write(s)
+        return [self.get_content_from_industry(url) for url in self.parse_industry_links(self._get(page_url))]
+
+    async def aget_industries_from_a_page(self, engine, page_url):
+        urls = await engine.parse(parse_industry_links, await engine.fetch(page_url), self.parser)
+        return list(await asyncio.gather(*(self.aget_content_from_industry(engine, url) for url in urls)))
+
+    def parse_industry_links(self, html):
+        return parse_industry_links(html, self.parser)
+
 # các url cần thiết
 THONG_BAO_URL = 'https://ptit.edu.vn/tin-tuc-su-kien/thong-bao'
 MAX_PAGE_TB = 4
@@ -313,4 +377,16 @@ DAO_TAO_URL = "https://daotao.ptit.edu.vn/ctdt/dai-hoc/"
 
 # dao_tao_crawler = DaoTaoCrawler(DAO_TAO_URL)
 # industries = dao_tao_crawler.get_industries_from_a_page(DAO_TAO_URL)
-# dao_tao_crawler.save(industries, "industries.json")
\ No newline at end of file
+# dao_tao_crawler.save(industries, "industries.json")
+
+# chạy song song:
+# async def crawl_news():
+#     async with CrawlEngine.from_config() as engine:
+#         return await PTITNoticeCrawler(TIN_TUC_URL, MAX_PAGE_TT).acrawl_all(engine)
+# notice_crawler.save(asyncio.run(crawl_news()), "news.json")
+
+# cập nhật hằng giờ: chỉ tải các thông báo mới, trang không đổi lấy từ cache
+# notice_crawler = PTITNoticeCrawler(THONG_BAO_URL, MAX_PAGE_TB, cache=HTTPCache.from_config())
+# old_notices = notice_crawler.load("notices.json")
+# new_notices = notice_crawler.crawl_all(seen_urls={notice["url"] for notice in old_notices})
+# notice_crawler.save(new_notices + old_notices, "notices.json")
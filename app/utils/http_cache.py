@@ -0,0 +1,140 @@
+"""
+On-disk cache of parsed crawler pages, revalidated with conditional requests.
+
+Each article url maps to one JSON file holding its ETag / Last-Modified
+validators and the parsed result. The next crawl sends If-None-Match /
+If-Modified-Since; a 304 answer returns the stored result without
+downloading or parsing the page again. Entries not revalidated for max_age
+seconds are dropped, and the least recently used ones go once the cache
+grows past max_bytes.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from app.utils.config import load_config
+
+logger = logging.getLogger('app')
+
+CACHE_DIR = os.path.join("data", "cache", "http")
+
+
+class HTTPCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = 200 << 20, max_age: float = 30 * 86400):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = 0
+        self.evict()
+
+    @classmethod
+    def from_config(cls) -> "HTTPCache":
+        settings = (load_config().get("crawler") or {}).get("cache") or {}
+        return cls(
+            cache_dir=settings.get("dir", CACHE_DIR),
+            max_bytes=int(settings.get("max_mb", 200)) << 20,
+            max_age=settings.get("max_age_days", 30) * 86400,
+        )
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Optional[Dict]:
+        """
+        The stored entry of url, or None; an entry not revalidated for max_age is a miss
+        """
+        path = self._path(url)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.max_age:
+                return None
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    @staticmethod
+    def validators(entry: Optional[Dict]) -> Dict[str, str]:
+        """
+        Conditional request headers for a cached entry
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def not_modified(self, url: str, entry: Dict) -> Any:
+        """
+        Record a 304 for url and return its stored value
+        """
+        self.stats["hits"] += 1
+        try:
+            # mtime is the last revalidation, used for age and LRU eviction.
+            os.utime(self._path(url))
+        except OSError:
+            pass
+        return entry["value"]
+
+    def put(self, url: str, headers: Mapping[str, str], value: Any) -> None:
+        """
+        Store the parsed value of a 200 answer, if the server gave validators to revalidate it with
+        """
+        self.stats["misses"] += 1
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        path = self._path(url)
+        data = json.dumps({"url": url, "etag": etag, "last_modified": last_modified, "value": value},
+                          ensure_ascii=False).encode("utf-8")
+        try:
+            self._size -= os.path.getsize(path)
+        except OSError:
+            pass
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._size += len(data)
+        self.stats["stored"] += 1
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Drop entries older than max_age, then the least recently revalidated until under max_bytes
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".tmp") or now - stat.st_mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        self._size = sum(size for _, size, _ in entries)
+        # Shrink to 90% so that a full cache is not rescanned on every put.
+        entries.sort()
+        for _, size, path in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            self._remove(path)
+            self._size -= size
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+            self.stats["evicted"] += 1
+        except OSError as e:
+            logger.warning(f"Could not evict {path}: {e}")
@@ -0,0 +1,266 @@
+"""
+Process-wide counters, gauges and histograms, served as Prometheus text on /metrics.
+
+    with timed("embed"):
+        vectors = embeddings.embed_documents(queries)
+
+records the seconds spent in a stage of the QA path, the crawlers or the OCR
+pipeline into the vpa_stage_seconds histogram. An observation takes a
+perf_counter() pair and a short lock, about a microsecond, so the timers stay
+on in production; metrics.enabled: false in config.yaml turns them into
+no-ops. Values that other objects already keep (cache hit counters, index
+size, queue depths) are read when /metrics is scraped, by the collectors of
+register_collector().
+
+MetricsMiddleware counts the requests in flight and times each request, until
+its last byte for streamed responses, per handler and status.
+
+Each process keeps its own metrics: under app.serve a scrape reaches one
+worker, so the samples carry its pid.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from app.utils.config import load_config
+
+# Seconds, from a cached lookup to an LLM answer or an OCR page.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (labels, value) of one metric, as produced by collectors
+Samples = List[Tuple[Dict[str, str], float]]
+# (name, type, help, samples)
+Family = Tuple[str, str, str, Samples]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Samples:
+        with self._lock:
+            return [(self._labels(labels), value) for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Counts per bucket, made cumulative when rendered; the last slot is +Inf.
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][slot] += 1
+            counts[1] += value
+
+    def samples(self) -> Samples:
+        samples = []
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            labels = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(({**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append(({**labels, "__suffix__": "_sum"}, total))
+            samples.append(({**labels, "__suffix__": "_count"}, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self.metrics:
+                return self.metrics[metric.name]
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """
+        collector() returns (name, type, help, [(labels, value)]) families, read at every scrape
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format (version 0.0.4)
+        """
+        families = [(m.name, m.type, m.help, m.samples()) for m in list(self.metrics.values())]
+        for collector in list(self.collectors):
+            families.extend(collector())
+        pid = str(os.getpid())
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                suffix = labels.pop("__suffix__", "_bucket" if "le" in labels else "")
+                lines.append(f"{name}{suffix}{_format_labels({**labels, 'pid': pid})} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("vpa_stage_seconds", "Seconds spent per stage of the QA, crawl and OCR pipelines",
+                                   ["stage"])
+STAGE_ERRORS = REGISTRY.counter("vpa_stage_errors_total", "Stages that raised", ["stage"])
+REQUEST_SECONDS = REGISTRY.histogram("vpa_http_request_seconds", "HTTP request duration, to the last byte sent",
+                                     ["method", "handler", "status"])
+IN_FLIGHT = REGISTRY.gauge("vpa_http_requests_in_flight", "HTTP requests being served")
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+register_collector = REGISTRY.register_collector
+render = REGISTRY.render
+
+enabled = (load_config().get("metrics") or {}).get("enabled", True)
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(self.stage)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(stage: str):
+    """
+    Context manager adding the seconds spent in its block to vpa_stage_seconds{stage=...}
+    """
+    return _Timer(stage) if enabled else _NO_TIMER
+
+
+def observe(stage: str, seconds: float) -> None:
+    """
+    Record a stage timed by the caller, e.g. across callbacks
+    """
+    if enabled:
+        STAGE_SECONDS.observe(seconds, stage)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware keeping vpa_http_requests_in_flight and vpa_http_request_seconds
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled:
+            await self.app(scope, receive, send)
+            return
+        status = ["500"]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            IN_FLIGHT.dec()
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], _handler(scope), status[0])
+
+
+def _handler(scope) -> str:
+    # The route's path template, so that /items/1 and /items/2 share a series.
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    return "unmatched"
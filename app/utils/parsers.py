@@ -0,0 +1,173 @@
+"""
+Trích xuất dữ liệu từ các trang PTIT, dùng chung cho các crawler.
+
+Mỗi hàm chỉ dựng cây HTML cho phần trang cần dùng (SCOPES, qua SoupStrainer)
+thay vì cả trang với menu, footer, script. Mặc định dùng lxml nếu đã cài,
+nhanh hơn nhiều so với "html.parser". Các hàm là hàm cấp module, nhận và trả
+về dữ liệu thuần, để có thể chạy trong một ProcessPoolExecutor
+(xem CrawlEngine.parse).
+"""
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+
+def has_class(*names):
+    """
+    Bộ lọc class cho SoupStrainer: khớp thẻ có một trong các class names.
+    (SoupStrainer(class_="x") chỉ khớp khi cả thuộc tính class là "x".)
+    """
+    def match(value):
+        if value is None:
+            return False
+        classes = value.split() if isinstance(value, str) else value
+        return any(name in classes for name in names)
+    return match
+
+
+# Phần trang mà mỗi hàm cần; thẻ khớp được giữ cùng toàn bộ thẻ con.
+SCOPES = {
+    "parse_notice": SoupStrainer("div", class_=has_class("post-content")),
+    "parse_notice_list": SoupStrainer("ul", class_=has_class("ova-blog")),
+    "parse_event": SoupStrainer("div", class_=has_class("ovaev-event-content")),
+    "parse_event_list": SoupStrainer("div", class_=has_class("ovaev-search-ajax-container")),
+    "parse_industry": SoupStrainer(["h1", "ul", "div"], class_=has_class("breadcrumb-title", "mtop", "ova_dir_content")),
+    "parse_industry_links": SoupStrainer("div", class_=has_class("elementor-element-0ea282a")),
+}
+
+
+def make_soup(html, parser=PARSER, scope=None):
+    return BeautifulSoup(html, features=parser, parse_only=scope)
+
+
+def parse_notice(html, parser=PARSER):
+    soup = make_soup(html, parser, SCOPES["parse_notice"])
+    content = soup.find("div", class_="post-content")
+    # nếu không tìm thấy content thì trả về None
+    if not content:
+        return None
+    text = '' # văn bản
+    image_links = [] # các link ảnh
+    for p in content.find_all("p"):
+        # nếu có text thì thêm vào text
+        if p.text.strip() :
+            text += p.text.strip() + '\n'
+    # nếu có ảnh thì thêm vào image_links
+    for img in content.find_all("img", src=True):
+        image_links.append(img['src'])
+    return dict(text=text, image_links=image_links)
+
+
+def parse_notice_list(html, parser=PARSER):
+    '''
+    Hàm này trả về danh sách (title, date, url) các thông báo trong một trang
+    '''
+    soup = make_soup(html, parser, SCOPES["parse_notice_list"])
+    ul = soup.find("ul", class_="ova-blog column_4 version_1 default-post")
+    items = ul.find_all("li", class_="item")
+    notices = []
+    # lấy thông tin từ từng item
+    for item in items:
+        content = item.find("div", class_="content")
+        # lấy title, url, date từ item
+        title = content.find("h2", class_= 'post-title').text.strip()
+        url = content.find("a" )['href'].strip()
+        date = content.find("span", class_="right date").text.strip()
+        notices.append((title, date, url))
+    return notices
+
+
+def parse_event(html, parser=PARSER):
+    soup = make_soup(html, parser, SCOPES["parse_event"])
+    content = soup.find("div", class_="ovaev-event-content")
+    texts = ""
+    images = []
+    for p in content.find_all("p",  class_= lambda classes: classes is None or "wp-caption-text" not in classes) :
+        if p.text.strip():
+            texts += p.text.strip() + "\n"
+    for img in content.find_all("img", src=True):
+        images.append(img['src'].strip())
+    return dict(texts=texts, images=images)
+
+
+def parse_event_list(html, parser=PARSER):
+    """
+    return: list[(title, date, url)] các sự kiện trong một trang
+    """
+    soup = make_soup(html, parser, SCOPES["parse_event_list"])
+    ul = soup.find("div", class_="ovaev-search-ajax-container")
+    items = ul.find_all("div", class_="ovaev-content")
+    events = []
+    for item in items:
+        event = item.find("div", class_="event_post")
+        title = event.find("h2").text.strip()
+        date = event.find("div", class_="meta-event").find("div" , class_= "time equal-date").find("span" , class_= "time-date-child").text.strip()
+        url = event.find("a")['href'].strip()
+        events.append((title, date, url))
+    return events
+
+
+def parse_industry(html, parser=PARSER):
+    soup = make_soup(html, parser, SCOPES["parse_industry"])
+    #get program name
+    program_name = soup.find("h1", class_="breadcrumb-title").text.strip()
+    # get matadata
+    matadata_soup = soup.find("ul" , class_="column_4 mtop")
+    metadata_items = matadata_soup.find_all("li", class_="item")
+    metadata = dict()
+    for i, item in enumerate(metadata_items):
+        if i == 0:
+            metadata["id"] = item.find("strong").text.strip()
+        elif i == 1:
+            metadata[ "time"] = item.find("strong").text.strip()
+        elif i == 2:
+            metadata['admission period'] = item.find("strong").text.strip()
+        elif i == 3:
+            metadata[ 'location'] = item.find("strong").text.strip()
+
+    # get content
+    content_soup = soup.find("div", class_="ova_dir_content")
+    sections_soup = content_soup.find_all("section")
+    content = ""
+    for i, section in enumerate(sections_soup[: -2]):
+        if i == 2 : continue
+        else:
+            content += section.text.strip() + "\n"
+    # get chuyen nganh
+    chuyen_nganh_soup = sections_soup[2].find("ul", class_= "nav-tab").find_all("li")
+    cac_chuyen_nganh = [ li.text.strip() for li in chuyen_nganh_soup]
+    print(f"{program_name} co {len(cac_chuyen_nganh)} chuyen nganh")
+    # get program structure
+    program_structure = dict()
+    ky_hoc_soup = sections_soup[2].find("div").find_all("div", class_= "current-tab")
+    so_luong_ky = len(ky_hoc_soup) // len(cac_chuyen_nganh) # số lượng kỳ học của mỗi chuyên ngành
+    for i, chuyen_nganh in enumerate(cac_chuyen_nganh): # duyệt qua từng chuyên ngành
+        cac_ky_hoc = dict()
+        for j , ky in enumerate(ky_hoc_soup[ i * so_luong_ky: i * so_luong_ky + so_luong_ky]): # duyệt qua từng kỳ học của chuyên ngành
+            ky_hoc = []
+            for mon in ky.find_all("div", class_ = "card-mon-hoc"): # duyệt qua từng môn học của kỳ học
+                subject = mon.find("div", class_= "title").text.strip()
+                tin_chi = mon.find("div", class_= "tag").text.strip()
+                ky_hoc.append(dict(subject=subject, tin_chi=tin_chi))
+            cac_ky_hoc[f"ky {j+1}"] = ky_hoc 
+            ky_hoc = []
+        program_structure[chuyen_nganh] = cac_ky_hoc
+    return dict( program_name= program_name , content=content, program_structure=program_structure, metadata=metadata)
+
+
+def parse_industry_links(html, parser=PARSER):
+    """
+    return: list[str] url các ngành trong trang danh sách
+    """
+    soup = make_soup(html, parser, SCOPES["parse_industry_links"])
+    ul = soup.find("div", class_= "elementor-element elementor-element-0ea282a elementor-grid-3 elementor-grid-tablet-2 elementor-grid-mobile-1 elementor-widget elementor-widget-loop-grid").find("div", class_="elementor-widget-container").find("div", class_= "elementor-loop-container elementor-grid")
+    li = ul.find_all("div", recursive=False)
+    urls = []
+    for industry_soup in li:
+        industry_soup = industry_soup.find("div").find("div").find("div")
+        urls.append(industry_soup.find("div", class_= "elementor-element elementor-element-5781d80 text-hover-underline elementor-widget elementor-widget-theme-post-title elementor-page-title elementor-widget-heading").find("h2").find("a")['href'])
+    return urls
@@ -0,0 +1,95 @@
+"""
+Sampling profiler for hot stacks in a running server, served on /debug/profile.
+
+A daemon thread reads the stack of every other thread with
+sys._current_frames() each interval and counts the stacks it sees. The
+result is in the folded format of flamegraph.pl and speedscope:
+
+    app/main.py:ask_question;app/services/rag.py:_search_batch;... 42
+
+one line per distinct stack, root first, with the number of samples it was
+on top in. Nothing runs unless a profile is requested, and only one at a
+time; metrics.profiler.enabled in config.yaml switches the route on.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from app.utils.config import load_config
+
+MAX_SECONDS = 60
+_running = threading.Lock()
+
+
+def profiler_settings() -> Dict:
+    settings = (load_config().get("metrics") or {}).get("profiler") or {}
+    return {"enabled": settings.get("enabled", False), "interval_ms": settings.get("interval_ms", 5)}
+
+
+def _frame_name(frame) -> str:
+    path = frame.f_code.co_filename
+    try:
+        path = os.path.relpath(path)
+    except ValueError:
+        pass
+    if path.startswith(".."):
+        # Outside the app: the installed package is enough.
+        path = path.rsplit("site-packages" + os.sep, 1)[-1]
+    return f"{path}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        if not _running.acquire(blocking=False):
+            raise RuntimeError("A profile is already being taken")
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """
+        Stop sampling and return the folded stacks, most sampled first
+        """
+        self._stop.set()
+        self._thread.join()
+        _running.release()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile(seconds: float, interval: float = 0.005) -> str:
+    """
+    Folded stacks of every thread sampled for seconds (blocking)
+    """
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        time.sleep(min(seconds, MAX_SECONDS))
+    finally:
+        stacks = profiler.stop()
+    return stacks
@@ -1,32 +1,194 @@
-from typing import Dict
+"""
+Lexicon sentiment scorer for the answers of /qa/ask.
+
+Texts are lowercased and split into words, and the phrases of
+app/utils/sentiment_lexicon.py are matched longest first. The matches of a
+whole batch are then scored at once with NumPy: the weight of each polar
+phrase, flipped by a negation and scaled by intensifiers just before it, is
+summed per text into positive and negative evidence. The neutral evidence
+grows with the length of the text, so that one "tốt" in a long factual
+answer does not make it positive. The three are normalised to sum to 1.
+
+Scores are kept in an LRU cache keyed on a hash of the text (sentiment.cache_size
+in config.yaml): the answer cache hands out the same answers again.
+"""
+import hashlib
 import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.utils.config import load_config
+from app.utils.sentiment_lexicon import INTENSIFIERS, NEGATIONS, NEGATIVE, POSITIVE
 
 logger = logging.getLogger('app')
 
+LABELS = ("positive", "neutral", "negative")
+NEUTRAL = {"positive": 0.0, "neutral": 1.0, "negative": 0.0}
+WORD_RE = re.compile(r"\w+(?:'\w+)?")
+# Negated phrases count against their polarity, a little less than plainly.
+NEGATION_FACTOR = -0.75
+NEUTRAL_PRIOR = 1.0
+NEUTRAL_PER_WORD = 0.05
+# Modifier kinds
+POLAR, NEGATION, INTENSIFIER = 0, 1, 2
+
+
+class SentimentAnalyzer:
+    """
+    analyze_many(texts): {"positive", "neutral", "negative"} scores per text, cached per text hash
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        # Imported here so that importing the QA router does not pull in NumPy.
+        import numpy as np
+
+        entries = [(phrase, POLAR, weight) for phrase, weight in POSITIVE.items()]
+        entries += [(phrase, POLAR, -weight) for phrase, weight in NEGATIVE.items()]
+        entries += [(phrase, NEGATION, NEGATION_FACTOR) for phrase in NEGATIONS]
+        entries += [(phrase, INTENSIFIER, boost) for phrase, boost in INTENSIFIERS.items()]
+        self.vocabulary = {phrase: i for i, (phrase, _, _) in enumerate(entries)}
+        self.kinds = np.array([kind for _, kind, _ in entries], dtype=np.int8)
+        self.weights = np.array([weight for _, _, weight in entries], dtype=np.float32)
+        # Longest phrase starting with each word, to skip lookups that cannot match.
+        self.longest = {}
+        for phrase in self.vocabulary:
+            words = phrase.split()
+            self.longest[words[0]] = max(self.longest.get(words[0], 0), len(words))
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def from_config(cls) -> "SentimentAnalyzer":
+        settings = load_config().get("sentiment") or {}
+        return cls(cache_size=settings.get("cache_size", 10000))
+
+    def _match(self, text: str):
+        """
+        (entry, first word, word after the last) of the lexicon phrases in text, and its word count
+        """
+        words = WORD_RE.findall(text.lower())
+        matches = []
+        i = 0
+        while i < len(words):
+            size = min(self.longest.get(words[i], 0), len(words) - i)
+            while size:
+                entry = self.vocabulary.get(" ".join(words[i:i + size]) if size > 1 else words[i])
+                if entry is not None:
+                    matches.append((entry, i, i + size))
+                    break
+                size -= 1
+            i += size or 1
+        return matches, len(words)
+
+    def score(self, texts: List[str]):
+        """
+        Uncached (len(texts), 3) array of positive, neutral and negative scores
+        """
+        import numpy as np
+
+        entries, starts, ends, rows, n_words = [], [], [], [], []
+        for row, text in enumerate(texts):
+            matches, words = self._match(text)
+            for entry, start, end in matches:
+                entries.append(entry)
+                starts.append(start)
+                ends.append(end)
+                rows.append(row)
+            n_words.append(words)
+        entries = np.asarray(entries, dtype=np.int64)
+        starts, ends, rows = (np.asarray(a, dtype=np.int64) for a in (starts, ends, rows))
+
+        kinds = self.kinds[entries]
+        weights = self.weights[entries]
+        values = weights.copy()
+        # A modifier applies to the match right after it, at most one unknown word
+        # away; chained ones ("không quá", "không hề rất") apply together.
+        chain = np.ones(len(entries), dtype=bool)
+        following_start = starts
+        for back in (1, 2):
+            before = np.arange(len(entries)) - back
+            valid = before >= 0
+            before = np.maximum(before, 0)
+            chain &= (valid & (rows[before] == rows) & (kinds[before] != POLAR)
+                      & (following_start - ends[before] <= 1))
+            values = np.where(chain, values * weights[before], values)
+            following_start = starts[before]
+
+        polar = kinds == POLAR
+        positive = np.bincount(rows[polar], weights=np.maximum(values[polar], 0), minlength=len(texts))
+        negative = np.bincount(rows[polar], weights=np.maximum(-values[polar], 0), minlength=len(texts))
+        neutral = NEUTRAL_PRIOR + NEUTRAL_PER_WORD * np.asarray(n_words, dtype=np.float64)
+        scores = np.stack([positive, neutral, negative], axis=1)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def cached(self, text: str) -> Optional[Dict[str, float]]:
+        """
+        The scores of text if it was analysed before, without analysing it
+        """
+        with self._lock:
+            scores = self._cache.get(self._key(text))
+        return None if scores is None else dict(zip(LABELS, scores))
+
+    def analyze_many(self, texts: List[str]) -> List[Dict[str, float]]:
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+            missing = {key: text for key, text in zip(keys, texts) if key not in found}
+            # analyze_many runs on background threads too, so the counters change under the lock.
+            self.stats["hits"] += len(texts) - sum(key in missing for key in keys)
+            self.stats["misses"] += len(missing)
+        if missing:
+            scores = self.score(list(missing.values()))
+            found.update((key, tuple(round(float(s), 4) for s in row)) for key, row in zip(missing, scores))
+            if self.cache_size:
+                with self._lock:
+                    for key in missing:
+                        self._cache[key] = found[key]
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return [dict(zip(LABELS, found[key])) for key in keys]
+
+
+_analyzer = None
+
+
+def get_analyzer() -> SentimentAnalyzer:
+    """
+    The process-wide analyzer of the sentiment section of config.yaml, created on first use
+    """
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = SentimentAnalyzer.from_config()
+    return _analyzer
+
+
+def analyze_many(texts: List[str]) -> List[Dict[str, float]]:
+    """
+    Sentiment scores of a batch of texts, scored together
+    """
+    return get_analyzer().analyze_many(texts)
+
+
 def analyze_sentiment(text: str) -> Dict[str, float]:
     """
     Analyze the sentiment of given text
-    Returns sentiment scores (demo implementation)
+    Returns positive, neutral and negative scores summing to 1
     """
     try:
-        # Demo implementation - In practice, this would use:
-        # 1. Pre-trained sentiment model
-        # 2. More sophisticated analysis
-        
-        # Mock sentiment scores
-        sentiment_scores = {
-            "positive": 0.7,
-            "neutral": 0.2,
-            "negative": 0.1
-        }
-        
-        logger.debug(f"Sentiment analysis completed for text: {text[:50]}...")
-        return sentiment_scores
-        
+        return get_analyzer().analyze_many([text])[0]
     except Exception as e:
         logger.error(f"Error in sentiment analysis: {str(e)}")
-        return {
-            "positive": 0.0,
-            "neutral": 1.0,
-            "negative": 0.0
-        }
\ No newline at end of file
+        return dict(NEUTRAL)
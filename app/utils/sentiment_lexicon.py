@@ -0,0 +1,64 @@
+"""
+Vietnamese and English sentiment lexicon of app/utils/sentiment.py.
+
+Entries are lowercased words or phrases of up to three words (Vietnamese
+words are often two syllables: "hài lòng", "thất vọng") with a weight in
+(0, 2]. Phrases are matched longest first, so "không đạt" counts as one
+negative entry rather than a negated "đạt". NEGATIONS flip the polarity of
+the entry that follows them, INTENSIFIERS scale it; both may be phrases too.
+Words that are mostly neutral in PTIT documents ("hay" is also "or", "mất"
+also "takes") are left out.
+"""
+
+POSITIVE = {
+    # Vietnamese
+    "tốt": 1.0, "đẹp": 0.8, "giỏi": 1.0, "xuất sắc": 1.8, "tuyệt vời": 2.0, "tuyệt": 1.5,
+    "hài lòng": 1.5, "vui": 1.0, "vui mừng": 1.5, "vui vẻ": 1.2, "hạnh phúc": 1.8, "thích": 1.0, "yêu thích": 1.5,
+    "cảm ơn": 0.8, "chúc mừng": 1.5, "thành công": 1.5, "hiệu quả": 1.0, "thuận lợi": 1.0, "thuận tiện": 1.0,
+    "dễ dàng": 0.8, "nhanh chóng": 0.8, "rõ ràng": 0.6, "chính xác": 0.8, "hữu ích": 1.2, "bổ ích": 1.2,
+    "hấp dẫn": 1.0, "nổi bật": 1.0, "ưu tú": 1.5, "ưu đãi": 0.8, "ưu tiên": 0.5, "miễn phí": 0.8,
+    "hỗ trợ": 0.6, "khen thưởng": 1.5, "học bổng": 1.0, "đạt": 0.8, "đạt giải": 1.5, "trúng tuyển": 1.5,
+    "đỗ": 1.2, "chất lượng cao": 1.2, "uy tín": 1.0, "an toàn": 0.6, "ổn định": 0.6, "phát triển": 0.6,
+    "tiến bộ": 1.0, "sáng tạo": 1.0, "chuyên nghiệp": 1.0, "thân thiện": 1.0, "nhiệt tình": 1.2,
+    "tận tình": 1.2, "chu đáo": 1.2, "tiện lợi": 1.0, "hoàn thành": 0.8, "vinh dự": 1.5, "tự hào": 1.5,
+    "may mắn": 1.2, "đồng ý": 0.5, "ủng hộ": 0.8, "khuyến khích": 0.8, "cơ hội": 0.6, "lợi ích": 0.8,
+    # English
+    "good": 1.0, "great": 1.5, "excellent": 1.8, "amazing": 1.8, "wonderful": 1.8, "awesome": 1.8,
+    "best": 1.5, "better": 0.8, "nice": 0.8, "happy": 1.5, "glad": 1.0, "pleased": 1.2, "love": 1.5,
+    "thank": 0.8, "thanks": 0.8, "congratulations": 1.5, "success": 1.5, "successful": 1.5,
+    "helpful": 1.2, "useful": 1.0, "easy": 0.8, "fast": 0.6, "clear": 0.6, "correct": 0.8, "free": 0.5,
+    "scholarship": 1.0, "award": 1.2, "win": 1.2, "passed": 1.0, "admitted": 1.2, "recommend": 1.0,
+    "friendly": 1.0, "support": 0.5, "effective": 1.0, "convenient": 1.0, "improve": 0.6, "improved": 0.8,
+    "satisfied": 1.5, "proud": 1.2, "welcome": 0.8, "opportunity": 0.6, "benefit": 0.8,
+}
+
+NEGATIVE = {
+    # Vietnamese
+    "tệ": 1.5, "kém": 1.0, "xấu": 1.0, "dở": 1.0, "tồi": 1.5, "tồi tệ": 2.0, "thất vọng": 1.8,
+    "buồn": 1.0, "chán": 1.0, "ghét": 1.5, "tức giận": 1.8, "bực": 1.2, "bực mình": 1.5, "phàn nàn": 1.2,
+    "khó khăn": 1.0, "khó": 0.5, "phức tạp": 0.6, "chậm": 0.8, "chậm trễ": 1.2, "trễ": 0.8, "muộn": 0.6,
+    "lỗi": 1.0, "sai": 0.8, "sai sót": 1.2, "hỏng": 1.2, "thất bại": 1.8, "trượt": 1.2, "rớt": 1.2,
+    "không đạt": 1.2, "nợ môn": 1.2, "cảnh cáo": 1.5, "kỷ luật": 1.5, "đình chỉ": 1.8, "buộc thôi học": 2.0,
+    "xử lý vi phạm": 1.5, "vi phạm": 1.2, "phạt": 1.2, "cấm": 0.8, "hủy": 0.8, "hủy bỏ": 1.0, "từ chối": 1.0,
+    "nguy hiểm": 1.5, "rủi ro": 1.0, "lo lắng": 1.2, "lo ngại": 1.0, "căng thẳng": 1.0, "áp lực": 0.8,
+    "quá tải": 1.0, "thiếu": 0.6, "bất tiện": 1.0, "lừa đảo": 2.0, "đáng tiếc": 1.2,
+    "tiếc": 0.8, "xin lỗi": 0.6, "sự cố": 1.0, "gián đoạn": 1.0, "khiếu nại": 1.0, "tai nạn": 1.5,
+    # English
+    "bad": 1.2, "poor": 1.0, "terrible": 1.8, "awful": 1.8, "horrible": 1.8, "worst": 1.8, "worse": 1.0,
+    "sad": 1.0, "angry": 1.5, "hate": 1.5, "disappointed": 1.5, "disappointing": 1.5, "problem": 0.8,
+    "issue": 0.5, "error": 1.0, "wrong": 0.8, "fail": 1.5, "failed": 1.5, "failure": 1.5, "slow": 0.8,
+    "late": 0.6, "difficult": 0.8, "hard": 0.5, "broken": 1.2, "cancel": 0.8, "cancelled": 0.8,
+    "reject": 1.0, "rejected": 1.2, "denied": 1.0, "penalty": 1.2, "warning": 0.8, "expelled": 2.0,
+    "suspended": 1.5, "complaint": 1.0, "unfortunately": 1.0, "sorry": 0.6, "risk": 0.8, "danger": 1.5,
+    "dangerous": 1.5, "worried": 1.0, "stress": 1.0, "confusing": 0.8, "unable": 0.8,
+}
+
+NEGATIONS = {
+    "không", "chẳng", "chả", "chưa", "đừng", "không hề", "chưa từng", "chẳng hề",
+    "not", "no", "never", "don't", "doesn't", "didn't", "isn't", "wasn't", "aren't", "cannot", "without",
+}
+
+INTENSIFIERS = {
+    "rất": 1.5, "cực kỳ": 2.0, "vô cùng": 2.0, "hết sức": 1.8, "quá": 1.5, "khá": 1.2, "hơi": 0.6,
+    "very": 1.5, "extremely": 2.0, "really": 1.3, "quite": 1.2, "slightly": 0.6,
+}
@@ -0,0 +1,108 @@
+"""
+Recall@k against latency for the index types of rag.index in config.yaml.
+
+Exact search over a flat index is the ground truth; every other index type is
+built with the same code as the indexer (create_index) and swept over its
+query-time knob (nprobe for IVF, ef_search for HNSW). Vectors are either
+synthetic clustered embeddings or the vectors of an index built by
+`python -m app.services.indexing build`.
+
+    python -m benchmarks.bench_ann --docs 100000
+    python -m benchmarks.bench_ann --from-index data/processed/faiss_index
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from app.services.indexing import create_index, index_params, set_search_params
+
+SWEEPS = {
+    "flat": [{}],
+    "sqfp16": [{}],
+    "sq8": [{}],
+    "ivf_flat": [{"nprobe": n} for n in (1, 4, 8, 16, 32)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128)],
+    "ivf_pq": [{"nprobe": n} for n in (1, 4, 8, 16, 32)],
+}
+
+
+def synthetic_vectors(n, dim, n_clusters=200, seed=0):
+    # Sentence embeddings are clustered by topic, uniform noise would flatter IVF.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n)] + 1.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def vectors_from_index(index_dir):
+    from app.services.indexing import load_index
+    vector_store = load_index(None, index_dir, mmap=False)
+    ids = np.array(list(vector_store.index_to_docstore_id), dtype=np.int64)
+    return vector_store.index.reconstruct_batch(ids)
+
+
+def _query_latencies(index, queries, k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def run(vectors, n_queries=500, k=10, params=None, seed=1):
+    rng = np.random.default_rng(seed)
+    base = index_params(params)
+    ids = np.arange(len(vectors), dtype=np.int64)
+    queries = vectors[rng.choice(len(vectors), n_queries)] + 0.05 * rng.standard_normal((n_queries, vectors.shape[1])).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    results = {"docs": len(vectors), "dim": vectors.shape[1], "queries": n_queries, "k": k, "runs": []}
+    for index_type, sweep in SWEEPS.items():
+        params = {**base, "type": index_type}
+        start = time.perf_counter()
+        index = create_index(params, vectors)
+        index.add_with_ids(vectors, ids)
+        build_s = time.perf_counter() - start
+        size = len(faiss.serialize_index(index))
+
+        for knobs in sweep:
+            params.update(knobs)
+            set_search_params(index, params)
+            _, found = index.search(queries, k)
+            recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+            latencies = _query_latencies(index, queries, k)
+            results["runs"].append({
+                "type": index_type,
+                **knobs,
+                f"recall@{k}": float(recall),
+                "mean_ms": float(latencies.mean()),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "build_s": build_s,
+                "bytes": size,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--from-index", help="use the vectors of a built index instead of synthetic ones")
+    args = parser.parse_args()
+
+    vectors = vectors_from_index(args.from_index) if args.from_index else synthetic_vectors(args.docs, args.dim)
+    print(json.dumps(run(vectors, args.queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Index size, build time and hit quality with and without chunking.
+
+Probes are sentences taken from the long documents of data/raw, mostly from
+beyond the first 256 tokens the embedding model reads. A probe is a hit when
+its source document is among the top k retrieved parents.
+
+    python -m benchmarks.bench_chunking --probes 200
+    python -m benchmarks.bench_chunking --fake   # no model download, timings only
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.chunking import CHUNK_OVERLAP, CHUNK_SIZE, SENTENCE_END, chunk_documents
+from app.services.indexing import DATA_FOLDER, build_index, current_index_dir, document_id, get_embeddings, load_documents
+
+
+def _parent(doc):
+    metadata = {key: value for key, value in doc.metadata.items() if key != "program_structure"}
+    return Document(page_content=doc.page_content, metadata=metadata)
+
+
+def make_probes(parents, n_probes, seed=0):
+    rng = random.Random(seed)
+    candidates = []
+    for doc in parents:
+        sentences = [s.strip() for s in SENTENCE_END.split(doc.page_content.replace("\n", " ")) if 40 <= len(s.strip()) <= 300]
+        candidates.extend((sentence, document_id(doc)) for sentence in sentences)
+    return rng.sample(candidates, min(n_probes, len(candidates)))
+
+
+def _hit_rate(vector_store, probes, k, fetch_k):
+    vectors = np.asarray(vector_store.embedding_function.embed_documents([q for q, _ in probes]), dtype=np.float32)
+    _, ids = vector_store.index.search(vectors, fetch_k)
+    hits = 0
+    for (_, expected), row in zip(probes, ids):
+        found = []
+        for i in row:
+            if i == -1:
+                continue
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            parent = doc.metadata.get("parent_id") or document_id(doc)
+            if parent not in found:
+                found.append(parent)
+        hits += expected in found[:k]
+    return hits / len(probes)
+
+
+def run(data_dir=DATA_FOLDER, n_probes=200, k=5, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, fake=False):
+    if fake:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        embeddings = DeterministicFakeEmbedding(size=384)
+    else:
+        embeddings = get_embeddings()
+
+    raw = load_documents(data_dir)
+    parents = [_parent(doc) for doc in raw]
+    probes = make_probes(parents, n_probes)
+    modes = {
+        "whole": parents,
+        "chunked": list(chunk_documents(raw, chunk_size, chunk_overlap)),
+    }
+
+    results = {"parents": len(parents), "probes": len(probes), "k": k,
+               "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+    for name, documents in modes.items():
+        with tempfile.TemporaryDirectory() as index_dir:
+            start = time.perf_counter()
+            vector_store = build_index(documents, embeddings, index_dir)
+            build_s = time.perf_counter() - start
+            version_dir = current_index_dir(index_dir)
+            results[name] = {
+                "vectors": vector_store.index.ntotal,
+                "index_bytes": sum(os.path.getsize(os.path.join(version_dir, f)) for f in os.listdir(version_dir)),
+                "build_s": build_s,
+                f"hit@{k}": _hit_rate(vector_store, probes, k, fetch_k=k * 4),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_FOLDER)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--fake", action="store_true", help="deterministic fake embeddings instead of the model")
+    args = parser.parse_args()
+    print(json.dumps(run(args.data_dir, args.probes, args.k, args.chunk_size, args.chunk_overlap, args.fake), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Pages/sec of the PTIT notice crawler, sequential requests vs the async engine.
+
+Pages come from the local fixture server (tests/fixture_server.py) with
+--latency seconds of simulated server time per request; one list page links
+3 notices, so --pages list pages are 4 * --pages requests.
+
+"revalidate" re-crawls everything through a warm HTTPCache (article pages
+answer 304 and are not parsed); "refresh" is the hourly update that stops at
+the first notice already saved, with one new notice on page 1.
+
+    python -m benchmarks.bench_crawler --pages 10 --latency 0.1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import tempfile
+import time
+
+from app.utils.crawl_engine import CrawlEngine
+from app.utils.crawler import PTITNoticeCrawler
+from app.utils.http_cache import HTTPCache
+from tests.fixture_server import FixtureServer
+
+
+def _result(notices, requests, elapsed):
+    return {"notices": len(notices), "requests": requests, "seconds": elapsed, "pages_per_s": requests / elapsed}
+
+
+def _timed_async_crawl(server, crawler, per_host, seen_urls=None):
+    async def crawl():
+        async with CrawlEngine(per_host=per_host) as engine:
+            return await crawler.acrawl_all(engine, seen_urls)
+
+    server.requests.clear()
+    start = time.perf_counter()
+    notices = asyncio.run(crawl())
+    return notices, _result(notices, sum(server.requests.values()), time.perf_counter() - start)
+
+
+def run(pages=10, latency=0.1, per_host=8):
+    results = {"pages": pages, "latency_s": latency, "per_host": per_host}
+    # The crawlers print progress; keep stdout for the JSON report.
+    with FixtureServer(latency=latency) as server, contextlib.redirect_stdout(io.StringIO()), \
+            tempfile.TemporaryDirectory() as cache_dir:
+        crawler = PTITNoticeCrawler(f"{server.base_url}/thong-bao", max_page=pages)
+
+        start = time.perf_counter()
+        notices = crawler.crawl_all()
+        results["sync"] = _result(notices, sum(server.requests.values()), time.perf_counter() - start)
+
+        _, results["async"] = _timed_async_crawl(server, crawler, per_host)
+        results["max_in_flight"] = server.max_in_flight
+
+        crawler.cache = HTTPCache(cache_dir)
+        notices, _ = _timed_async_crawl(server, crawler, per_host)
+        _, results["revalidate"] = _timed_async_crawl(server, crawler, per_host)
+        results["revalidate"]["not_modified"] = crawler.cache.stats["hits"]
+        seen_urls = {notice["url"] for notice in notices[1:]}
+        _, results["refresh"] = _timed_async_crawl(server, crawler, per_host, seen_urls)
+    results["speedup"] = results["sync"]["seconds"] / results["async"]["seconds"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--per-host", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.pages, args.latency, args.per_host), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput and latency of the embedding backends of rag.embedder.
+
+For huggingface (sentence-transformers on torch), onnx and onnx int8: the
+cold start of a fresh process (imports, model load, first query), documents
+per second over the chunked data/raw corpus, and single-query latency. The
+last row re-embeds the corpus through the on-disk cache (CachedEmbeddings),
+as an unchanged re-index does.
+
+--model-dir is a local Hugging Face copy of the model; without it a randomly
+initialised model of the shape of all-MiniLM-L6-v2 (tests.random_model) is
+timed instead, which costs the same but embeds nonsense.
+
+    python -m benchmarks.bench_embedders --docs 512 --threads 4
+    python -m benchmarks.bench_embedders --model-dir models/all-MiniLM-L6-v2
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import islice
+
+import numpy as np
+
+from app.services.chunking import chunk_documents
+from app.services.embedders import CachedEmbeddings, create_embeddings, export_onnx
+from app.services.indexing import DATA_FOLDER
+from app.services.loaders import iter_documents
+
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+from app.services.embedders import create_embeddings
+embeddings = create_embeddings(sys.argv[1], json.loads(sys.argv[2]))
+embeddings.embed_query("Lịch thi học kỳ 1")
+print(time.perf_counter() - start)
+"""
+
+
+def _cold_start(model, settings):
+    output = subprocess.run([sys.executable, "-c", COLD_START, model, json.dumps(settings)],
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _measure(embeddings, texts, queries):
+    embeddings.embed_documents(texts[:8])  # warm-up
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    docs_per_s = len(texts) / (time.perf_counter() - start)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {"docs_per_s": docs_per_s, "query_ms_p50": float(np.percentile(latencies, 50)),
+            "query_ms_p99": float(np.percentile(latencies, 99))}
+
+
+def run(docs=512, threads=0, batch_size=32, model_dir=None, data_dir=DATA_FOLDER, n_queries=50):
+    texts = [doc.page_content for doc in islice(chunk_documents(iter_documents(data_dir)), docs)]
+    with open("benchmarks/ptit_questions.json", encoding="utf-8") as f:
+        queries = [q["question"] for q in json.load(f)][:n_queries]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if model_dir is None:
+            from tests.random_model import save_random_bert
+            model_dir = save_random_bert(f"{work_dir}/model", texts)
+        onnx_dir = f"{work_dir}/onnx"
+        export_onnx(model_dir, onnx_dir, int8=True)
+
+        backends = {
+            "huggingface": {"backend": "huggingface"},
+            "onnx": {"backend": "onnx", "model_dir": onnx_dir},
+            "onnx_int8": {"backend": "onnx", "model_dir": onnx_dir, "int8": True},
+        }
+        results = {"docs": len(texts), "threads": threads, "batch_size": batch_size}
+        for name, settings in backends.items():
+            settings = {**settings, "threads": threads, "batch_size": batch_size}
+            embeddings = create_embeddings(model_dir, settings)
+            results[name] = {"cold_start_s": _cold_start(model_dir, settings), **_measure(embeddings, texts, queries)}
+
+        cached = CachedEmbeddings(embeddings, f"{work_dir}/cache")
+        cached.embed_documents(texts)
+        start = time.perf_counter()
+        cached.embed_documents(texts)
+        results["onnx_int8_cached"] = {"docs_per_s": len(texts) / (time.perf_counter() - start)}
+        cached.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=0, help="0 for the runtime's default")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--model-dir", help="local Hugging Face model directory")
+    parser.add_argument("--data-dir", default=DATA_FOLDER)
+    args = parser.parse_args()
+    print(json.dumps(run(args.docs, args.threads, args.batch_size, args.model_dir, args.data_dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Recall and latency of lexical (BM25), vector and hybrid retrieval over data/raw.
+
+The corpus is chunked and indexed as by `python -m app.services.indexing
+build`. benchmarks/ptit_questions.json holds PTIT questions, some written
+without diacritics, each labelled with the title of the document that
+answers it. Recall@k is the share of questions whose document is among the
+k retrieved; lexical-only search is timed per query.
+
+--fake-embeddings replaces the embedding model by random vectors (for
+machines without the model): the vector and hybrid rows then only show
+what BM25 adds on its own.
+
+    python -m benchmarks.bench_hybrid --k 4
+    python -m benchmarks.bench_hybrid --fake-embeddings
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.chunking import chunk_documents
+from app.services.indexing import DATA_FOLDER, EMBEDDING_MODEL, current_index_dir, get_embeddings, update_index
+from app.services.lexical import LEXICAL_FILE, load_lexical_index
+from app.services.loaders import iter_documents
+from app.services.rag import RAGService
+from app.utils.config import load_config
+
+QUESTIONS = os.path.join(os.path.dirname(__file__), "ptit_questions.json")
+
+
+def _recall(service, questions, k):
+    async def retrieve_all():
+        return await asyncio.gather(*(service.retrieve(q["question"], k) for q in questions))
+
+    results = asyncio.run(retrieve_all())
+    found = [any(doc.metadata.get("title") == q["title"] for doc, _ in hits) for q, hits in zip(questions, results)]
+    return sum(found) / len(questions)
+
+
+def run(k=4, data_dir=DATA_FOLDER, fake_embeddings=False, rounds=20):
+    with open(QUESTIONS, encoding="utf-8") as f:
+        questions = json.load(f)
+    if fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        embeddings, model = DeterministicFakeEmbedding(size=384), "fake"
+    else:
+        model = (load_config().get("rag") or {}).get("embedding_model", EMBEDDING_MODEL)
+        embeddings = get_embeddings(model)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        store, stats = update_index(chunk_documents(iter_documents(data_dir)), embeddings, index_dir)
+        build_seconds = time.perf_counter() - start
+        lexical = load_lexical_index(index_dir)
+        results = {
+            "model": model, "questions": len(questions), "k": k, "chunks": stats["added"],
+            "build_seconds": build_seconds, "bm25_kb": os.path.getsize(os.path.join(current_index_dir(index_dir), LEXICAL_FILE)) // 1024,
+            "terms": len(lexical.terms),
+        }
+
+        latencies = []
+        for _ in range(rounds):
+            for q in questions:
+                begin = time.perf_counter()
+                lexical.search(q["question"], k * 4)
+                latencies.append(time.perf_counter() - begin)
+        latencies = np.array(latencies) * 1000
+        results["lexical_ms"] = {"mean": latencies.mean(), "p50": np.percentile(latencies, 50),
+                                 "p99": np.percentile(latencies, 99)}
+
+        # Lexical-only recall: BM25 chunks folded per parent as the service does.
+        found = 0
+        for q in questions:
+            hits = lexical.search(q["question"], k * 4)
+            titles = []
+            for doc_id, _ in hits:
+                title = store.docstore.search(doc_id).metadata.get("title")
+                if title not in titles:
+                    titles.append(title)
+            found += q["title"] in titles[:k]
+        results["recall"] = {"lexical": found / len(questions)}
+
+        for name, hybrid in (("vector", False), ("hybrid", True)):
+            service = RAGService(vector_store=store, lexical_index=lexical)
+            service.hybrid, service.answer_cache = hybrid, None
+            results["recall"][name] = _recall(service, questions, k)
+            service.executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--data-dir", default=DATA_FOLDER)
+    parser.add_argument("--fake-embeddings", action="store_true", help="random vectors instead of the embedding model")
+    args = parser.parse_args()
+    print(json.dumps(run(args.k, args.data_dir, args.fake_embeddings), indent=2))
+
+
+if __name__ == "__main__":
+    main()
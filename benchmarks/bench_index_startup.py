@@ -0,0 +1,111 @@
+"""
+Cold-start time and memory per worker when opening the prebuilt FAISS index.
+
+Builds a synthetic index (random vectors, no embedding model needed), then
+starts several worker processes at once that each load it, either fully into
+memory or memory-mapped, and run one query. RssAnon is the private memory a worker
+adds; with mmap the vectors move to RssFile, i.e. the page cache that all
+workers share.
+
+    python -m benchmarks.bench_index_startup --docs 50000 --workers 4
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def _memory_kb():
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            text = f.read()
+    except OSError:
+        return usage
+    for key in ("VmRSS", "RssAnon", "RssFile"):
+        match = re.search(rf"^{key}:\s+(\d+) kB", text, re.MULTILINE)
+        if match:
+            usage[key.lower()] = int(match.group(1))
+    return usage
+
+
+def _child(index_dir, mmap):
+    start = time.perf_counter()
+    from app.services.indexing import load_index
+    imported = time.perf_counter()
+    vector_store = load_index(None, index_dir, mmap=mmap)
+    loaded = time.perf_counter()
+    query = np.random.default_rng(0).random((1, vector_store.index.d), dtype=np.float32)
+    vector_store.index.search(query, 4)
+    result = {
+        "import_s": imported - start,
+        "load_s": loaded - imported,
+        "first_query_s": time.perf_counter() - loaded,
+    }
+    result.update(_memory_kb())
+    print(json.dumps(result))
+
+
+def build_synthetic_index(index_dir, n_docs, dim):
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from app.services.indexing import save_index
+
+    vectors = np.random.default_rng(42).random((n_docs, dim), dtype=np.float32)
+    index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    ids = [str(i) for i in range(n_docs)]
+    docstore = InMemoryDocstore({i: Document(page_content=f"document {i}", metadata={"category": "event"}) for i in ids})
+    save_index(FAISS(None, index, docstore, dict(enumerate(ids))), index_dir)
+
+
+def run(n_docs=50000, dim=384, workers=4):
+    results = {"n_docs": n_docs, "dim": dim, "workers": workers}
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        build_synthetic_index(index_dir, n_docs, dim)
+        results["build_s"] = time.perf_counter() - start
+        results["index_bytes"] = os.path.getsize(os.path.join(index_dir, "index.faiss"))
+
+        for mode in ("in_memory", "mmap"):
+            cmd = [sys.executable, "-m", "benchmarks.bench_index_startup", "--child", index_dir]
+            if mode == "mmap":
+                cmd.append("--mmap")
+            start = time.perf_counter()
+            procs = [subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+            per_worker = [json.loads(p.communicate()[0]) for p in procs]
+            results[mode] = {
+                "wall_s": time.perf_counter() - start,
+                "workers": per_worker,
+                "mean_load_s": sum(w["load_s"] for w in per_worker) / workers,
+                "mean_rss_kb": sum(w.get("vmrss", 0) for w in per_worker) / workers,
+                "mean_rss_anon_kb": sum(w.get("rssanon", 0) for w in per_worker) / workers,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mmap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.mmap)
+        return
+    print(json.dumps(run(args.docs, args.dim, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Latency of /qa/ask and /qa/feedback as the database gets slower.
+
+The QA router runs in-process (httpx ASGI transport) over a RAG service that
+answers at once, so the request latency is the router's own plus the cost of
+storing the record. Every SQL statement on the SQLite database is delayed by
+each of --db-latency-ms. Two ways of storing:
+
+    inline        one INSERT per request, in the request (what write-behind avoids)
+    write_behind  app.services.interaction_log.WriteBehindLog
+
+--concurrency clients send --requests requests, alternating ask and feedback.
+
+    python -m benchmarks.bench_interaction_log --db-latency-ms 0 5 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event
+
+from app.routers import qa
+from app.services.interaction_log import TABLES, WriteBehindLog, metadata
+
+
+class InlineLog:
+    """
+    The naive alternative: the request inserts its record itself
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        metadata.create_all(engine)
+
+    async def record(self, table, row):
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        with self.engine.begin() as connection:
+            connection.execute(TABLES[table].insert(), [row])
+        return True
+
+    async def close(self):
+        self.engine.dispose()
+
+
+class Service:
+    async def process_question(self, question, context=None, filters=None):
+        return "Lịch thi học kỳ 1 được đăng trên cổng thông tin đào tạo."
+
+
+def _engine(path, latency):
+    engine = create_engine(f"sqlite:///{path}")
+    if latency:
+        @event.listens_for(engine, "before_cursor_execute")
+        def slow(*args):
+            time.sleep(latency)
+    return engine
+
+
+async def _load(log, requests, concurrency):
+    app = FastAPI()
+    app.include_router(qa.router, prefix="/qa")
+    latencies = []
+    pending = iter(range(requests))
+
+    async def client_loop(client):
+        for i in pending:
+            start = time.perf_counter()
+            if i % 2:
+                response = await client.post("/qa/feedback", params={"question_id": f"q{i}", "feedback": "Hữu ích",
+                                                                     "rating": 5})
+            else:
+                response = await client.post("/qa/ask", params={"question": f"Lịch thi {i}?"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    with patch.object(qa, "get_rag_service", Service), patch.object(qa, "get_interaction_log", lambda: log):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+        close_start = time.perf_counter()
+        await log.close()
+    latencies.sort()
+    return {
+        "requests_per_s": requests / elapsed,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p99": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+        "close_ms": (time.perf_counter() - close_start) * 1000,
+    }
+
+
+def run(db_latencies_ms=(0, 5, 20), requests=400, concurrency=16, batch_size=100, flush_interval=0.5):
+    results = {"requests": requests, "concurrency": concurrency, "batch_size": batch_size}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for latency_ms in db_latencies_ms:
+            latency = latency_ms / 1000
+            inline = InlineLog(_engine(f"{work_dir}/inline_{latency_ms}.sqlite", latency))
+            behind = WriteBehindLog(_engine(f"{work_dir}/behind_{latency_ms}.sqlite", latency),
+                                    batch_size=batch_size, flush_interval=flush_interval)
+            results[f"db_{latency_ms}ms"] = {
+                "inline": asyncio.run(_load(inline, requests, concurrency)),
+                "write_behind": {**asyncio.run(_load(behind, requests, concurrency)),
+                                 "batches": behind.stats["batches"], "dropped": behind.stats["dropped"]},
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db-latency-ms", type=float, nargs="+", default=[0, 5, 20])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.db_latency_ms, args.requests, args.concurrency, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
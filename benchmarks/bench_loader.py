@@ -0,0 +1,89 @@
+"""
+Time and peak Python memory of loading data/raw into Documents.
+
+The corpus is replicated --scale times into a temporary directory to mimic a
+grown archive, once as JSON arrays and once as JSONL. "eager" is json.load of
+every file into one list of Documents (the pre-streaming loader);
+"streaming" walks app.services.loaders.iter_documents without keeping the
+Documents, as the indexer does.
+
+    python -m benchmarks.bench_loader --scale 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.services.indexing import DATA_FOLDER
+from app.services.loaders import adapter_for, iter_documents
+
+
+def write_scaled_corpus(data_dir, out_dir, scale, jsonl=False):
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(data_dir, filename), encoding="utf-8") as f:
+            items = json.load(f)
+        stem = filename[:-len(".json")]
+        with open(os.path.join(out_dir, f"{stem}.jsonl" if jsonl else filename), "w", encoding="utf-8") as f:
+            if jsonl:
+                for _ in range(scale):
+                    for item in items:
+                        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            else:
+                f.write("[")
+                for copy in range(scale):
+                    for i, item in enumerate(items):
+                        f.write(("," if copy or i else "") + json.dumps(item, ensure_ascii=False, indent=4))
+                f.write("]")
+
+
+def load_eager(data_dir):
+    documents = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), encoding="utf-8") as f:
+                data = json.load(f)
+            adapter = adapter_for(filename)
+            documents.extend(adapter(item, filename[:-len(".json")]) for item in data)
+    return len(documents)
+
+
+def load_streaming(data_dir):
+    return sum(1 for _ in iter_documents(data_dir))
+
+
+def _measure(load, data_dir):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = load(data_dir)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"documents": count, "seconds": elapsed, "docs_per_s": count / elapsed, "peak_bytes": peak}
+
+
+def run(data_dir=DATA_FOLDER, scale=20):
+    results = {"scale": scale}
+    with tempfile.TemporaryDirectory() as json_dir, tempfile.TemporaryDirectory() as jsonl_dir:
+        write_scaled_corpus(data_dir, json_dir, scale)
+        write_scaled_corpus(data_dir, jsonl_dir, scale, jsonl=True)
+        results["corpus_bytes"] = sum(os.path.getsize(os.path.join(json_dir, f)) for f in os.listdir(json_dir))
+        results["eager"] = _measure(load_eager, json_dir)
+        results["streaming_json"] = _measure(load_streaming, json_dir)
+        results["streaming_jsonl"] = _measure(load_streaming, jsonl_dir)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default=DATA_FOLDER)
+    parser.add_argument("--scale", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.data_dir, args.scale), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Overhead of the stage timers and of a /metrics scrape (app/utils/metrics.py).
+
+Times --iterations empty `with timed(stage)` blocks with metrics enabled and
+disabled, on one thread and then on --threads threads at once, and renders
+the registry once every stage has --stages series.
+
+    python -m benchmarks.bench_metrics --iterations 200000 --threads 4
+"""
+import argparse
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from app.utils import metrics
+
+
+def _ns_per_block(iterations, threads):
+    def loop():
+        for _ in range(iterations):
+            with metrics.timed("bench"):
+                pass
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (iterations * threads) * 1e9
+
+
+def run(iterations=200000, threads=4, stages=20):
+    results = {}
+    for enabled in (True, False):
+        with patch.object(metrics, "enabled", enabled):
+            state = "on" if enabled else "off"
+            results[f"timer_{state}_ns"] = _ns_per_block(iterations, 1)
+            results[f"timer_{state}_{threads}_threads_ns"] = _ns_per_block(iterations // threads, threads)
+
+    for i in range(stages):
+        metrics.observe(f"bench_{i}", 0.01)
+    start = time.perf_counter()
+    text = metrics.render()
+    results["render_ms"] = (time.perf_counter() - start) * 1000
+    results["render_bytes"] = len(text)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--stages", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations, args.threads, args.stages), indent=2))
+
+
+if __name__ == "__main__":
+    main()
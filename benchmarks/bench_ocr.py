@@ -0,0 +1,202 @@
+"""
+Images/sec of batch OCR (app.services.image_processor.ocr_batch).
+
+--count synthetic notice-like scans (lines of text on an A5-sized page) are
+OCR'd once in-process and once on a pool of --workers processes, each run
+into an empty output directory. A second pooled run over the same images
+measures the hash-based skip. Needs tesseract with the configured languages.
+
+--latency times single small images (a 480x120 text strip, as cut from a
+post) through each available OCR backend from encoded bytes, against the
+old path: write the file, cv2.imread it, pytesseract through temp files.
+
+--adaptive compares whole-frame OCR with ocr_adaptive (text line detection,
+crops rescaled to the target line height) on phone-photo sized pages: the
+texts stored in data/text_from_image re-rendered at 4000x3000 on a darker
+background with sensor noise, plus text-less photos. The source images of
+those texts are not kept, and cv2 fonts have no Vietnamese diacritics, so
+the texts are folded to ASCII. Accuracy is 1 - normalised edit distance
+(difflib ratio) against the rendered text, whitespace collapsed.
+
+    python -m benchmarks.bench_ocr --count 24 --workers 4
+    python -m benchmarks.bench_ocr --latency --lang eng
+    python -m benchmarks.bench_ocr --adaptive --lang eng
+"""
+import argparse
+import contextlib
+import difflib
+import glob
+import io
+import json
+import os
+import shutil
+import tempfile
+import textwrap
+import time
+import unicodedata
+
+import cv2
+import numpy as np
+
+from app.services import image_processor
+from app.services.image_processor import ocr_batch
+
+LINES = [
+    "HOC VIEN CONG NGHE BUU CHINH VIEN THONG",
+    "THONG BAO",
+    "Ve viec to chuc thi hoc ky 1 nam hoc 2024-2025",
+    "Sinh vien theo doi lich thi tren cong thong tin dao tao.",
+    "Moi thac mac xin lien he Phong Giao vu.",
+]
+
+
+def write_scans(directory, count):
+    for i in range(count):
+        img = np.full((1748, 1240, 3), 255, dtype=np.uint8)
+        for row, line in enumerate(LINES * 4):
+            cv2.putText(img, f"{line} ({i})" if row == 2 else line, (60, 120 + row * 75),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+        cv2.imwrite(os.path.join(directory, f"scan-{i}.png"), img)
+
+
+def run(count=24, workers=None):
+    workers = workers or os.cpu_count() or 1
+    results = {"count": count, "workers": workers}
+    # save_to_json prints every saved file; keep stdout for the JSON report.
+    with tempfile.TemporaryDirectory() as image_dir, contextlib.redirect_stdout(io.StringIO()):
+        write_scans(image_dir, count)
+        for name, pool_size in (("inline", 0), ("pool", workers)):
+            with tempfile.TemporaryDirectory() as json_dir:
+                results[name] = ocr_batch(image_dir, json_dir, workers=pool_size)
+                if name == "pool":
+                    results["pool_rerun"] = ocr_batch(image_dir, json_dir, workers=pool_size)
+    results["speedup"] = results["inline"]["seconds"] / results["pool"]["seconds"]
+    return results
+
+
+def available_backends():
+    backends = ["stdin", "pytesseract"] if shutil.which("tesseract") else []
+    try:
+        import tesserocr  # noqa: F401
+        backends.insert(0, "tesserocr")
+    except ImportError:
+        pass
+    return backends
+
+
+def run_latency(count=50, lang=None):
+    img = np.full((120, 480, 3), 255, dtype=np.uint8)
+    cv2.putText(img, "Lich thi HK1 2024", (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    data = cv2.imencode(".png", img)[1].tobytes()
+    results = {"count": count, "image_bytes": len(data)}
+    for backend in available_backends():
+        image_processor.ocr_array(image_processor.preprocess(img), lang, backend)  # load the model once
+        start = time.perf_counter()
+        for _ in range(count):
+            text = image_processor.ocr_array(image_processor.preprocess(image_processor.decode_image(data)),
+                                             lang, backend)
+        results[backend] = {"ms_per_image": (time.perf_counter() - start) / count * 1000, "text": text.strip()}
+    if shutil.which("tesseract"):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "upload.png")
+            start = time.perf_counter()
+            for _ in range(count):
+                with open(path, "wb") as f:
+                    f.write(data)
+                image_processor.pytesseract.image_to_string(image_processor.preprocess(cv2.imread(path)),
+                                                            lang=lang or image_processor.LANG)
+            results["file+pytesseract"] = {"ms_per_image": (time.perf_counter() - start) / count * 1000}
+    return results
+
+
+def fold(text):
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def render_page(text, seed=0, width=4000, height=3000):
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = (90, 110, 130)
+    img[200:height - 200, 500:width - 500] = (238, 240, 242)
+    lines = []
+    for row, line in enumerate(textwrap.wrap(fold(" ".join(text.split())), 48)):
+        y = 320 + row * 88
+        if y > height - 260:
+            break
+        cv2.putText(img, line, (600, y), cv2.FONT_HERSHEY_SIMPLEX, 2.2, (30, 30, 30), 4, cv2.LINE_AA)
+        lines.append(line)
+    img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+    return img, "\n".join(lines)
+
+
+def render_photo(seed=0, width=4000, height=3000):
+    rng = np.random.default_rng(seed)
+    img = cv2.resize(rng.integers(0, 255, (12, 16, 3)).astype(np.uint8), (width, height),
+                     interpolation=cv2.INTER_CUBIC)
+    for _ in range(6):
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        cv2.circle(img, (int(rng.integers(0, width)), int(rng.integers(0, height))),
+                   int(rng.integers(100, 600)), color, -1)
+    img = cv2.GaussianBlur(img, (31, 31), 0)
+    return np.clip(img + rng.normal(0, 4, img.shape), 0, 255).astype(np.uint8)
+
+
+def accuracy(text, truth):
+    text, truth = " ".join(text.split()), " ".join(truth.split())
+    return difflib.SequenceMatcher(None, text, truth, autojunk=False).ratio()
+
+
+def run_adaptive(text_dir=image_processor.TEXT_DIR, photos=2, lang=None):
+    pages = []
+    for i, path in enumerate(sorted(glob.glob(os.path.join(text_dir, "*.json")))):
+        with open(path, encoding="utf-8") as f:
+            pages.append((os.path.basename(path),) + render_page(json.load(f)["extracted_text"], seed=i))
+    pages += [(f"photo-{i}", render_photo(seed=i), "") for i in range(photos)]
+    image_processor.ocr_array(image_processor.preprocess(pages[0][1][:200, :200]), lang)  # load the model once
+    methods = {
+        "full_frame": lambda img: image_processor.ocr_array(image_processor.preprocess(img), lang),
+        "adaptive": lambda img: image_processor.ocr_adaptive(img, lang),
+    }
+    settings = dict(image_processor.ocr_settings(), lang=lang or image_processor.ocr_settings()["lang"])
+    settings.pop("adaptive")
+    results = {"images": len(pages), "settings": settings}
+    for method, ocr in methods.items():
+        per_image = {}
+        for name, img, truth in pages:
+            start = time.perf_counter()
+            text = ocr(img)
+            per_image[name] = {"ms": (time.perf_counter() - start) * 1000}
+            if truth:
+                per_image[name]["accuracy"] = accuracy(text, truth)
+            else:
+                per_image[name]["chars"] = len(text.strip())
+        scored = [item["accuracy"] for item in per_image.values() if "accuracy" in item]
+        results[method] = {
+            "ms_per_image": sum(item["ms"] for item in per_image.values()) / len(per_image),
+            "accuracy": sum(scored) / len(scored) if scored else None,
+            "images": per_image,
+        }
+    results["speedup"] = results["full_frame"]["ms_per_image"] / results["adaptive"]["ms_per_image"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=24)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--latency", action="store_true", help="time single small images per backend instead")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="compare whole-frame and adaptive OCR on large rendered pages instead")
+    parser.add_argument("--lang", help="tesseract languages, default from config (vie+eng)")
+    args = parser.parse_args()
+    if args.adaptive:
+        print(json.dumps(run_adaptive(lang=args.lang), indent=2))
+    elif args.latency:
+        print(json.dumps(run_latency(lang=args.lang), indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(run(args.count, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Parse throughput of the PTIT page parsers over the saved HTML fixtures.
+
+Each fixture page is padded with --pad-kb of menu/sidebar/script markup
+outside the extracted subtree, as live PTIT pages are ~100-200 KB around a
+few KB of content. Every parser backend is timed on the whole page
+("full", the pre-scoping behaviour) and on the SoupStrainer scope, and the
+fastest setting also through a process pool of --workers processes.
+"page_ms" times each page on its own with the default backend: the notice,
+event and industry pages of PTITNoticeCrawler, PTITEventCrawler and
+DaoTaoCrawler.
+
+    python -m benchmarks.bench_parsers --pad-kb 120 --rounds 20
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils import parsers
+from tests.fixture_server import FIXTURE_DIR
+
+PAGES = {
+    "notice.html": "parse_notice",
+    "notice_list.html": "parse_notice_list",
+    "event.html": "parse_event",
+    "event_list.html": "parse_event_list",
+    "industry.html": "parse_industry",
+    "industry_list.html": "parse_industry_links",
+}
+
+FILLER = (
+    '<div class="widget"><ul class="menu">{items}</ul>'
+    '<script>var wp_data = {{"nonce": "a1b2c3", "ajax": "/wp-admin/admin-ajax.php"}};</script></div>\n'
+)
+ITEM = '<li class="menu-item"><a href="https://ptit.edu.vn/muc-{i}"><span>Mục số {i}</span></a></li>'
+
+
+def padded_page(filename, pad_kb):
+    with open(os.path.join(FIXTURE_DIR, filename), encoding="utf-8") as f:
+        html = f.read().replace("{base}", "https://ptit.edu.vn").replace("{page}", "1").replace("{slug}", "ctdt")
+    filler, i = [], 0
+    while sum(map(len, filler)) < pad_kb * 1024:
+        filler.append(FILLER.format(items="".join(ITEM.format(i=i + j) for j in range(20))))
+        i += 20
+    half = len(filler) // 2
+    body = html.index("<body")
+    body = html.index(">", body) + 1
+    end = html.rindex("</body>")
+    return html[:body] + "".join(filler[:half]) + html[body:end] + "".join(filler[half:]) + html[end:]
+
+
+def _parse_all(pages, parser, scoped):
+    # Runs in pool workers too, so it takes names rather than functions.
+    if not scoped:
+        parsers.SCOPES = dict.fromkeys(parsers.SCOPES)
+    for name, html in pages:
+        getattr(parsers, name)(html, parser)
+    return len(pages)
+
+
+def _measure(pages, rounds, parser, scoped, workers=0):
+    total_bytes = sum(len(html.encode("utf-8")) for _, html in pages) * rounds
+    scopes = parsers.SCOPES
+    start = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(workers) as pool:
+            count = sum(pool.map(_parse_all, [pages] * rounds, [parser] * rounds, [scoped] * rounds))
+    else:
+        count = sum(_parse_all(pages, parser, scoped) for _ in range(rounds))
+        parsers.SCOPES = scopes
+    elapsed = time.perf_counter() - start
+    return {"pages": count, "seconds": elapsed, "pages_per_s": count / elapsed,
+            "mb_per_s": total_bytes / elapsed / 1e6}
+
+
+def _page_ms(pages, rounds, parser):
+    times = {}
+    for name, html in pages:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            getattr(parsers, name)(html, parser)
+        times[name] = (time.perf_counter() - start) / rounds * 1000
+    return times
+
+
+def run(pad_kb=120, rounds=20, workers=2):
+    pages = [(name, padded_page(filename, pad_kb)) for filename, name in PAGES.items()]
+    results = {"pad_kb": pad_kb, "rounds": rounds, "page_kb": [len(html) // 1024 for _, html in pages]}
+    backends = ["html.parser"] + (["lxml"] if parsers.PARSER == "lxml" else [])
+    for parser in backends:
+        for scoped in (False, True):
+            results[f"{parser}/{'scoped' if scoped else 'full'}"] = _measure(pages, rounds, parser, scoped)
+    baseline = results["html.parser/full"]["seconds"]
+    results[f"{parsers.PARSER}/scoped/pool"] = _measure(pages, rounds, parsers.PARSER, True, workers)
+    results["workers"] = workers
+    results["page_ms"] = _page_ms(pages, rounds, parsers.PARSER)
+    results["speedup"] = {key: baseline / value["seconds"]
+                          for key, value in results.items() if isinstance(value, dict) and "seconds" in value}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pad-kb", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    print(json.dumps(run(args.pad_kb, args.rounds, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
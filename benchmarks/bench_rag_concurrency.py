@@ -0,0 +1,73 @@
+"""
+Latency of concurrent RAGService.retrieve calls with and without micro-batching.
+
+The embedder is simulated with a fixed per-call cost plus a per-text cost, the
+usual shape of transformer inference on CPU, so the numbers show how p99
+latency follows the number of batches rather than the number of requests.
+
+    python -m benchmarks.bench_rag_concurrency --requests 50
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.indexing import update_index
+from app.services.rag import RAGService
+
+
+class SlowEmbedding(DeterministicFakeEmbedding):
+    call_cost: float = 0.02
+    text_cost: float = 0.001
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.call_cost + self.text_cost * len(texts))
+        return super().embed_documents(texts)
+
+
+async def _measure(service, n_requests):
+    async def timed(i):
+        start = time.perf_counter()
+        await service.retrieve(f"câu hỏi {i}", k=4)
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(timed(i) for i in range(n_requests)))
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "embed_calls": service.vector_store.embedding_function.calls,
+    }
+
+
+def run(n_requests=50, n_docs=2000, threads=4):
+    documents = [Document(page_content=f"tài liệu {i}", metadata={"title": str(i), "category": "event"})
+                 for i in range(n_docs)]
+    results = {"requests": n_requests, "docs": n_docs, "threads": threads}
+    with tempfile.TemporaryDirectory() as index_dir:
+        vector_store, _ = update_index(documents, DeterministicFakeEmbedding(size=384), index_dir)
+        for name, batch_size in (("unbatched", 1), ("batched", 64)):
+            vector_store.embedding_function = SlowEmbedding(size=384)
+            service = RAGService(vector_store=vector_store, max_workers=threads, max_batch_size=batch_size, max_wait_ms=2)
+            results[name] = asyncio.run(_measure(service, n_requests))
+            service.executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.docs, args.threads), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Throughput of the lexicon sentiment scorer (app/utils/sentiment.py).
+
+Scores --texts chunks of the data/raw corpus, which are about as long as the
+answers of /qa/ask: one text per call as /qa/ask does, then analyze_many
+batches of each --batch-size, both with the cache off, then the same texts
+again through the LRU cache.
+
+    python -m benchmarks.bench_sentiment --texts 2000 --batch-size 1 32 256
+"""
+import argparse
+import json
+import time
+from itertools import islice
+
+from app.services.chunking import chunk_documents
+from app.services.indexing import DATA_FOLDER
+from app.services.loaders import iter_documents
+from app.utils.sentiment import SentimentAnalyzer
+
+
+def _texts_per_s(analyze, texts, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        analyze(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+
+def run(n_texts=2000, batch_sizes=(1, 32, 256), data_dir=DATA_FOLDER):
+    texts = [doc.page_content for doc in islice(chunk_documents(iter_documents(data_dir)), n_texts)]
+    start = time.perf_counter()
+    uncached = SentimentAnalyzer(cache_size=0)
+    results = {"texts": len(texts), "mean_chars": sum(map(len, texts)) / len(texts),
+               "load_ms": (time.perf_counter() - start) * 1000}
+    for batch_size in batch_sizes:
+        results[f"batch_{batch_size}_texts_per_s"] = _texts_per_s(uncached.analyze_many, texts, batch_size)
+
+    cached = SentimentAnalyzer(cache_size=len(texts))
+    cached.analyze_many(texts)
+    results["cached_texts_per_s"] = _texts_per_s(cached.analyze_many, texts, 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 32, 256])
+    parser.add_argument("--data-dir", default=DATA_FOLDER)
+    args = parser.parse_args()
+    print(json.dumps(run(args.texts, args.batch_size, args.data_dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
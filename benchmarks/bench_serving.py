@@ -0,0 +1,192 @@
+"""
+Throughput of POST /qa/ask served by app.serve with 1, 2, ... pre-forked workers.
+
+A temporary config (APP_CONFIG) points the server at an index of --docs
+synthetic notices embedded with a randomly initialised model of the shape of
+all-MiniLM-L6-v2 exported to ONNX int8 (tests.random_model), so that each
+question costs a real embedding and a real search. The LLM is tests.mock_llm,
+answering at once by default, and the answer cache is off: the CPU work of
+the workers is what is measured. --concurrency clients send distinct questions
+for --duration seconds per worker count.
+
+Per worker count: requests per second, its speedup over one worker, latency
+percentiles, and the memory of the workers from /proc/<pid>/smaps_rollup:
+private (USS), what a worker adds, against proportional (PSS), which splits
+the pages the workers share (the index, copy-on-write objects) between them.
+The speedup cannot exceed the cores left after the load generator and the
+mock LLM, which run on the same machine.
+
+    python -m benchmarks.bench_serving --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import yaml
+from langchain_core.documents import Document
+
+from app.services.embedders import OnnxEmbeddings, export_onnx
+from app.services.indexing import update_index
+from app.utils.config import load_config
+from tests.mock_llm import MockLLMServer
+from tests.random_model import save_random_bert
+
+TOPICS = ["lịch thi", "học phí", "học bổng", "tuyển sinh", "thực tập", "nghiên cứu khoa học", "ký túc xá"]
+
+
+def _documents(n_docs):
+    return [
+        Document(page_content=f"Thông báo số {i} về {TOPICS[i % len(TOPICS)]} của khoa {i % 13} "
+                              f"dành cho sinh viên khóa {2018 + i % 7} tại cơ sở {'Hà Đông' if i % 2 else 'Hồ Chí Minh'}",
+                 metadata={"title": f"Thông báo {i}", "category": "notice", "url": f"https://ptit.edu.vn/{i}"})
+        for i in range(n_docs)
+    ]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _write_config(work_dir, model_dir, index_dir):
+    config = json.loads(json.dumps(load_config()))
+    config["api"].update(host="127.0.0.1", warmup=True)
+    rag = config["rag"]
+    rag["index_dir"] = index_dir
+    rag["embedder"] = {"backend": "onnx", "model_dir": model_dir, "int8": True, "threads": 0, "batch_size": 32,
+                       "cache": {"enabled": False}}
+    rag["answer_cache"] = {"enabled": False}
+    path = os.path.join(work_dir, "config.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def _workers_of(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _memory_mb(pid):
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                usage[key] = int(value.split()[0]) / 1024
+    return {"uss": usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0), "pss": usage.get("Pss", 0)}
+
+
+def _wait_ready(base_url, workers, timeout=120.0):
+    # Connections land on any worker: ready once many requests in a row find its
+    # QA warm; OCR is not benchmarked, and may lack its language data here.
+    deadline = time.monotonic() + timeout
+    in_a_row = 0
+    while in_a_row < 4 * workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{base_url} not ready after {timeout} s")
+        try:
+            ready = httpx.get(f"{base_url}/ready", timeout=5).json()["subsystems"]["qa"] == "ready"
+        except (httpx.TransportError, ValueError):
+            ready = False
+        in_a_row = in_a_row + 1 if ready else 0
+        if not ready:
+            time.sleep(0.2)
+
+
+async def _load(base_url, concurrency, duration):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client, worker):
+        nonlocal errors
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}/qa/ask",
+                                         params={"question": f"{TOPICS[i % len(TOPICS)]} của khoa {worker}-{i}"})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, worker) for worker in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": len(latencies) / elapsed,
+        "latency_ms_p50": statistics.median(latencies) * 1000,
+        "latency_ms_p99": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def _serve(config_path, llm_url, workers, concurrency, duration):
+    port = _free_port()
+    env = {**os.environ, "APP_CONFIG": config_path, "OPENAI_BASE_URL": llm_url, "OPENAI_API_KEY": "test"}
+    server = subprocess.Popen([sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        start = time.perf_counter()
+        _wait_ready(base_url, workers)
+        result = {"ready_s": time.perf_counter() - start}
+        result.update(asyncio.run(_load(base_url, concurrency, duration)))
+        memory = [_memory_mb(pid) for pid in _workers_of(server.pid)]
+        result["worker_uss_mb"] = statistics.mean(m["uss"] for m in memory)
+        result["worker_pss_mb"] = statistics.mean(m["pss"] for m in memory)
+        result["master_uss_mb"] = _memory_mb(server.pid)["uss"]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(60)
+    return result
+
+
+def run(workers=(1, 2, 4), docs=5000, concurrency=16, duration=10.0, first_token_delay=0.0):
+    results = {"cpus": os.cpu_count(), "docs": docs, "concurrency": concurrency, "duration_s": duration}
+    documents = _documents(docs)
+    with tempfile.TemporaryDirectory() as work_dir, \
+            MockLLMServer(tokens_per_s=1e6, first_token_delay=first_token_delay) as llm_server:
+        model_dir = save_random_bert(os.path.join(work_dir, "bert"), [doc.page_content for doc in documents])
+        onnx_dir = os.path.join(work_dir, "onnx")
+        export_onnx(model_dir, onnx_dir, int8=True)
+        index_dir = os.path.join(work_dir, "index")
+        update_index(documents, OnnxEmbeddings(onnx_dir, int8=True), index_dir)
+        config_path = _write_config(work_dir, onnx_dir, index_dir)
+
+        for n in workers:
+            results[f"workers_{n}"] = _serve(config_path, llm_server.base_url, n, concurrency, duration)
+    baseline = results[f"workers_{workers[0]}"]["requests_per_s"]
+    for n in workers:
+        results[f"workers_{n}"]["speedup"] = results[f"workers_{n}"]["requests_per_s"] / baseline
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--first-token-delay", type=float, default=0.0, help="seconds the mock LLM waits")
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.docs, args.concurrency, args.duration, args.first_token_delay), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Bytes per document and recall loss of the compact storage modes of rag.index.
+
+Vectors: flat (float32), sqfp16 and sq8 indexes are built with the indexer's
+create_index over synthetic clustered embeddings; recall@k is measured
+against exact float32 search. Texts: the chunked data/raw corpus, copied
+--copies times, is saved with docstore "memory" (Documents pickled in
+index.pkl) and "blob" (memory-mapped docs.*.bin); for each, the bytes on
+disk, the Python heap a worker allocates to load the store, and the time to
+fetch the documents of one query's hits.
+
+    python -m benchmarks.bench_storage --docs 100000 --copies 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.chunking import chunk_documents
+from app.services.indexing import DATA_FOLDER, create_index, current_index_dir, index_params, load_index, update_index
+from app.services.loaders import iter_documents
+from benchmarks.bench_ann import synthetic_vectors
+
+
+def run_vectors(n_docs=50000, dim=384, n_queries=500, k=10, seed=1):
+    vectors = synthetic_vectors(n_docs, dim)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n_docs, n_queries)] + 0.05 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    ids = np.arange(n_docs, dtype=np.int64)
+    truth = None
+    results = {}
+    for index_type in ("flat", "sqfp16", "sq8"):
+        index = create_index(index_params({"type": index_type}), vectors)
+        index.add_with_ids(vectors, ids)
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        search_ms = (time.perf_counter() - start) * 1000 / n_queries
+        if truth is None:
+            truth = found
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        results[index_type] = {"bytes_per_doc": len(faiss.serialize_index(index)) / n_docs,
+                               f"recall@{k}": float(recall), "search_ms": search_ms}
+    return {"docs": n_docs, "dim": dim, "queries": n_queries, **results}
+
+
+def _corpus(data_dir, copies):
+    chunks = list(chunk_documents(iter_documents(data_dir)))
+    for copy in range(copies):
+        for doc in chunks:
+            metadata = dict(doc.metadata)
+            if copy:
+                # A new parent id, hence new chunk ids, for every copy.
+                metadata["parent_id"] = f"{metadata['parent_id']}-{copy}"
+            yield Document(page_content=doc.page_content, metadata=metadata)
+
+
+def run_texts(data_dir=DATA_FOLDER, copies=10, k=16, rounds=200):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    results = {}
+    for docstore in ("memory", "blob"):
+        with tempfile.TemporaryDirectory() as index_dir:
+            update_index(_corpus(data_dir, copies), embeddings, index_dir, params={"docstore": docstore})
+            version_dir = current_index_dir(index_dir)
+            disk = sum(os.path.getsize(os.path.join(version_dir, name)) for name in os.listdir(version_dir)
+                       if name == "index.pkl" or name.startswith("docs."))
+            tracemalloc.start()
+            store = load_index(embeddings, index_dir)
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            doc_ids = list(store.index_to_docstore_id.values())
+            rng = np.random.default_rng(0)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for i in rng.choice(len(doc_ids), k):
+                    store.docstore.search(doc_ids[i])
+            fetch_ms = (time.perf_counter() - start) * 1000 / rounds
+        results[docstore] = {"disk_bytes_per_doc": disk / len(doc_ids), "heap_bytes_per_doc": heap / len(doc_ids),
+                             f"fetch_{k}_ms": fetch_ms}
+    return {"docs": len(doc_ids), **results}
+
+
+def run(n_docs=50000, copies=10, k=10, data_dir=DATA_FOLDER):
+    return {"vectors": run_vectors(n_docs, k=k), "texts": run_texts(data_dir, copies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000, help="synthetic vectors")
+    parser.add_argument("--copies", type=int, default=10, help="copies of the data/raw chunks")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--data-dir", default=DATA_FOLDER)
+    args = parser.parse_args()
+    print(json.dumps(run(args.docs, args.copies, args.k, args.data_dir), indent=2))
+
+
+if __name__ == "__main__":
+    main()
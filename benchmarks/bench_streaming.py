@@ -0,0 +1,103 @@
+"""
+Time to first byte of POST /qa/ask against the streaming POST /qa/ask/stream.
+
+The QA router is served by uvicorn on a local port, over a small fake-embedded
+index, with the LLM replaced by tests.mock_llm: an OpenAI-compatible server
+that waits --first-token-delay seconds, then emits --tokens-per-s tokens.
+The answer cache is off so that every request reaches the LLM. For each
+endpoint: time to the first response byte, to the first answer token (the
+streaming one sends the sources before it) and to the end of the response.
+
+    python -m benchmarks.bench_streaming --requests 10 --tokens-per-s 30
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import openai
+import uvicorn
+from fastapi import FastAPI
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.routers import qa
+from app.services.indexing import update_index
+from app.services.rag import RAGService
+from tests.mock_llm import MockLLMServer
+
+
+def _serve(app):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def _time(client, url, question):
+    start = time.perf_counter()
+    first_byte = first_token = None
+    with client.stream("POST", url, params={"question": question}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            now = time.perf_counter() - start
+            if first_byte is None:
+                first_byte = now
+            # The blocking endpoint's only line holds the whole answer.
+            if first_token is None and (line.startswith("event: token") or line.startswith("{")):
+                first_token = now
+    return {"ttfb": first_byte, "first_token": first_token, "total": time.perf_counter() - start}
+
+
+def _summary(samples):
+    return {key: statistics.median(sample[key] for sample in samples) * 1000 for key in samples[0]}
+
+
+def run(requests=10, tokens_per_s=30.0, first_token_delay=0.3):
+    documents = [
+        Document(page_content=f"Thông báo số {i} về lịch thi và học phí",
+                 metadata={"title": f"Thông báo {i}", "category": "notice", "url": f"https://ptit.edu.vn/{i}"})
+        for i in range(200)
+    ]
+    with tempfile.TemporaryDirectory() as index_dir, \
+            MockLLMServer(tokens_per_s=tokens_per_s, first_token_delay=first_token_delay) as llm_server:
+        store, _ = update_index(documents, DeterministicFakeEmbedding(size=384), index_dir)
+        service = RAGService(vector_store=store, llm=openai.AsyncOpenAI(base_url=llm_server.base_url, api_key="test"))
+        service.answer_cache = None
+        qa.rag_service = service
+        app = FastAPI()
+        app.include_router(qa.router, prefix="/qa")
+        server, thread, base_url = _serve(app)
+        try:
+            with httpx.Client(timeout=60) as client:
+                _time(client, f"{base_url}/qa/ask/stream", "warm-up")
+                results = {"requests": requests, "tokens": len(llm_server.tokens), "tokens_per_s": tokens_per_s,
+                           "first_token_delay_ms": first_token_delay * 1000}
+                for name, path in (("blocking", "/qa/ask"), ("stream", "/qa/ask/stream")):
+                    samples = [_time(client, base_url + path, f"câu hỏi {i}") for i in range(requests)]
+                    results[name] = _summary(samples)
+        finally:
+            server.should_exit = True
+            thread.join()
+    results["ttfb_speedup"] = results["blocking"]["ttfb"] / results["stream"]["ttfb"]
+    results["first_token_speedup"] = results["blocking"]["first_token"] / results["stream"]["first_token"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--tokens-per-s", type=float, default=30.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the LLM's first token")
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.tokens_per_s, args.first_token_delay), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Run the benchmarks of this directory as one suite, and compare against a baseline.
+
+Every benchmark runs its run() in a fresh Python process, so that imports,
+caches and peak memory of one do not leak into the next, with the parameters
+of the --profile: "quick" (a few minutes, for a change under review) or
+"full" (the defaults of each script, plus the 100x corpus ANN sweep and
+multi-worker serving). Everything runs offline: synthetic vectors and a
+random model stand in for the embedding model, the fixture server for
+ptit.edu.vn and tests.mock_llm for the LLM. A benchmark that fails, e.g. OCR
+without the tesseract languages, is reported as such and the rest still run.
+
+The report is JSON: the environment (commit, Python, CPUs), the parameters
+and the results of each benchmark; with --repeat, the median of every number
+over that many runs, which keeps sub-millisecond timings from flapping. With
+--baseline, every timing and throughput is compared with the same value in an
+earlier report, and those worse by more than --tolerance are listed as
+regressions; the exit status is then 1. Only reports of the same profile on
+the same machine are comparable.
+
+    python -m benchmarks.suite --profile quick --repeat 3 --output baseline.json
+    python -m benchmarks.suite --profile quick --baseline baseline.json --output current.json
+    python -m benchmarks.suite --results current.json --baseline baseline.json
+    python -m benchmarks.suite --only ann_1x parsers --param parsers.rounds=50
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# The chunks of data/raw, the 1x scale of the synthetic ANN corpus.
+CORPUS_CHUNKS = 2228
+
+# name: (module:function, quick parameters, full parameters); None leaves a benchmark out of a profile.
+BENCHMARKS = {
+    "loader": ("benchmarks.bench_loader:run", {"scale": 2}, {"scale": 20}),
+    "chunking": ("benchmarks.bench_chunking:run", {"n_probes": 50, "fake": True}, {"fake": True}),
+    "embedders": ("benchmarks.bench_embedders:run", {"docs": 128, "n_queries": 20}, {}),
+    "ann_1x": ("benchmarks.suite:ann_at_scale", {"scale": 1, "n_queries": 200}, {"scale": 1}),
+    "ann_10x": ("benchmarks.suite:ann_at_scale", {"scale": 10, "n_queries": 200}, {"scale": 10}),
+    "ann_100x": ("benchmarks.suite:ann_at_scale", None, {"scale": 100}),
+    "storage": ("benchmarks.bench_storage:run", {"n_docs": 20000, "copies": 2}, {}),
+    "index_startup": ("benchmarks.bench_index_startup:run", {"n_docs": 20000, "workers": 2}, {}),
+    "hybrid": ("benchmarks.bench_hybrid:run", {"fake_embeddings": True, "rounds": 5}, {"fake_embeddings": True}),
+    "rag_concurrency": ("benchmarks.bench_rag_concurrency:run", {"n_requests": 50, "n_docs": 1000}, {}),
+    "parsers": ("benchmarks.bench_parsers:run", {"rounds": 5}, {}),
+    "crawler": ("benchmarks.bench_crawler:run", {"pages": 4, "latency": 0.05}, {}),
+    "ocr_latency": ("benchmarks.bench_ocr:run_latency", {"count": 10}, {}),
+    "ocr_adaptive": ("benchmarks.bench_ocr:run_adaptive", {"photos": 1}, {}),
+    "ocr_batch": ("benchmarks.bench_ocr:run", None, {}),
+    "qa_ask": ("benchmarks.bench_streaming:run",
+               {"requests": 5, "tokens_per_s": 200.0, "first_token_delay": 0.05}, {}),
+    "serving": ("benchmarks.bench_serving:run", None, {"workers": [1, 2], "duration": 5.0}),
+    "sentiment": ("benchmarks.bench_sentiment:run", {"n_texts": 1000}, {}),
+    "interaction_log": ("benchmarks.bench_interaction_log:run", {"db_latencies_ms": [0, 5], "requests": 200}, {}),
+    "metrics": ("benchmarks.bench_metrics:run", {"iterations": 50000}, {}),
+}
+
+# Which way a metric should go, from the last part of its name; anything else
+# (sizes of the input, counts, settings) is a parameter and is not compared.
+HIGHER_IS_BETTER = re.compile(r"per_s|recall|hit@|accuracy|speedup")
+LOWER_IS_BETTER = re.compile(r"(^|_)(ms|ns|s|seconds|bytes|kb|mb|p50|p99|mean|total|uss|pss|ttfb|dropped|errors)(_|$)"
+                             r"|first_token$|^ms_")
+
+
+def ann_at_scale(scale: int, n_queries: int = 500, k: int = 10, dim: int = 384) -> Dict:
+    """
+    bench_ann over scale times as many synthetic vectors as data/raw has chunks
+    """
+    from benchmarks.bench_ann import run, synthetic_vectors
+
+    return {"scale": scale, **run(synthetic_vectors(CORPUS_CHUNKS * scale, dim), n_queries, k)}
+
+
+def profile_params(profile: str, overrides: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    {name: parameters} of the benchmarks of a profile, with NAME.PARAM=VALUE overrides (JSON values)
+    """
+    selected = {}
+    for name, (_, quick, full) in BENCHMARKS.items():
+        params = quick if profile == "quick" else full
+        if params is not None:
+            selected[name] = dict(params)
+    for override in overrides or []:
+        key, value = override.split("=", 1)
+        name, param = key.split(".", 1)
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark {name!r}")
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        selected.setdefault(name, {})[param] = value
+    return selected
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run_one(name: str, params: Dict, timeout: float) -> Dict:
+    """
+    Run a benchmark in a child process; {"seconds", "results"} or {"seconds", "error"}
+    """
+    start = time.perf_counter()
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [sys.executable, "-m", "benchmarks.suite", "--child", name, json.dumps(params), output.name]
+        try:
+            # Benchmarks print progress and warnings; the results come back in the file.
+            child = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                   timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {"seconds": time.perf_counter() - start, "error": f"timed out after {timeout:.0f} s"}
+        seconds = time.perf_counter() - start
+        if child.returncode != 0:
+            lines = child.stderr.strip().splitlines()
+            return {"seconds": seconds, "error": lines[-1] if lines else f"exit status {child.returncode}"}
+        with open(output.name, encoding="utf-8") as f:
+            return {"seconds": seconds, "results": json.load(f)}
+
+
+def median_results(runs: List):
+    """
+    The results of repeated runs with every number replaced by its median across the runs
+    """
+    first = runs[0]
+    if isinstance(first, dict):
+        return {key: median_results([run[key] for run in runs if key in run]) for key in first}
+    if isinstance(first, list) and all(isinstance(run, list) and len(run) == len(first) for run in runs):
+        return [median_results([run[i] for run in runs]) for i in range(len(first))]
+    if isinstance(first, (int, float)) and not isinstance(first, bool):
+        return statistics.median(run for run in runs if isinstance(run, (int, float)))
+    return first
+
+
+def _child(name: str, params: str, output: str) -> None:
+    module, function = BENCHMARKS[name][0].split(":")
+    results = getattr(importlib.import_module(module), function)(**json.loads(params))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, default=float)
+
+
+def run_suite(profile: str = "quick", only: Optional[List[str]] = None, overrides: Optional[List[str]] = None,
+              timeout: float = 1800.0, repeat: int = 1) -> Dict:
+    selected = profile_params(profile, overrides)
+    if only:
+        unknown = set(only) - set(BENCHMARKS)
+        if unknown:
+            raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        # Benchmarks left out of the profile run with their full parameters.
+        full = profile_params("full", overrides)
+        selected = {name: selected.get(name, full.get(name, {})) for name in only}
+    report = {"profile": profile, "repeat": repeat, "environment": environment(), "benchmarks": {}}
+    for name, params in selected.items():
+        print(f"{name} ...", file=sys.stderr, flush=True)
+        outcomes = []
+        for _ in range(repeat):
+            outcomes.append(run_one(name, params, timeout))
+            if "error" in outcomes[-1]:
+                break
+        outcome = {"seconds": sum(outcome["seconds"] for outcome in outcomes)}
+        if "error" in outcomes[-1]:
+            outcome["error"] = outcomes[-1]["error"]
+        else:
+            outcome["results"] = median_results([outcome["results"] for outcome in outcomes])
+        report["benchmarks"][name] = {"params": params, **outcome}
+        print(f"{name}: {outcome.get('error', 'ok')} ({outcome['seconds']:.1f} s)", file=sys.stderr, flush=True)
+    return report
+
+
+def _label(item: Dict) -> str:
+    # "ivf_flat,nprobe=8" for a row of bench_ann: its strings and its numeric parameters.
+    parts = [value for value in item.values() if isinstance(value, str)]
+    parts += [f"{key}={value}" for key, value in item.items()
+              if isinstance(value, (int, float)) and not isinstance(value, bool) and not direction(key)]
+    return ",".join(parts)
+
+
+def flatten(results, prefix: str = "") -> Dict[str, float]:
+    """
+    Numeric leaves of nested results, keyed by their dotted path; rows of a list of
+    dicts are keyed by their label, else by their position
+    """
+    values = {}
+    if isinstance(results, dict):
+        items = results.items()
+    else:
+        labels = [_label(item) if isinstance(item, dict) else "" for item in results]
+        unique = all(labels) and len(set(labels)) == len(labels)
+        items = zip(labels if unique else range(len(results)), results)
+    for key, value in items:
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, (dict, list)):
+            values.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def direction(path: str) -> int:
+    """
+    1 if a larger value is better, -1 if a smaller one is, 0 for parameters
+    """
+    parts = path.split(".")
+    if "speedup" in parts or HIGHER_IS_BETTER.search(parts[-1]):
+        return 1
+    if LOWER_IS_BETTER.search(parts[-1]):
+        return -1
+    return 0
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = 0.25) -> Dict:
+    """
+    Metrics of report worse than in baseline by more than tolerance (relative), improvements,
+    and benchmarks that ran in the baseline but failed or are missing now
+    """
+    regressions, improvements, failed = [], [], []
+    for name, before in baseline["benchmarks"].items():
+        if "results" not in before:
+            continue
+        after = report["benchmarks"].get(name)
+        if after is None:
+            continue
+        if "results" not in after:
+            failed.append({"benchmark": name, "error": after.get("error")})
+            continue
+        old, new = flatten(before["results"]), flatten(after["results"])
+        for path, old_value in old.items():
+            sign = direction(path)
+            if not sign or path not in new or not old_value:
+                continue
+            change = (new[path] - old_value) / abs(old_value)
+            row = {"metric": f"{name}.{path}", "baseline": old_value, "current": new[path], "change": change}
+            if change * sign < -tolerance:
+                regressions.append(row)
+            elif change * sign > tolerance:
+                improvements.append(row)
+    if baseline.get("profile") != report.get("profile"):
+        print(f"Warning: comparing a {report.get('profile')} run with a {baseline.get('profile')} baseline",
+              file=sys.stderr)
+    for key in ("cpus", "python", "platform"):
+        before, after = (baseline.get("environment") or {}).get(key), (report.get("environment") or {}).get(key)
+        if before != after:
+            print(f"Warning: the baseline ran with {key} {before}, this run with {after}", file=sys.stderr)
+    return {"tolerance": tolerance, "baseline": baseline.get("environment"), "regressions": regressions,
+            "improvements": improvements, "failed": failed}
+
+
+def print_comparison(comparison: Dict) -> None:
+    for title in ("regressions", "improvements"):
+        rows = comparison[title]
+        print(f"{len(rows)} {title} (beyond {comparison['tolerance']:.0%})", file=sys.stderr)
+        for row in sorted(rows, key=lambda row: row["metric"]):
+            print(f"  {row['metric']}: {row['baseline']:.4g} -> {row['current']:.4g} ({row['change']:+.0%})",
+                  file=sys.stderr)
+    for row in comparison["failed"]:
+        print(f"  {row['benchmark']} failed: {row['error']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=["quick", "full"], default="quick")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="run only these benchmarks")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME.PARAM=VALUE",
+                        help="override a parameter of a benchmark (JSON value), repeatable")
+    parser.add_argument("--output", help="write the report there instead of stdout")
+    parser.add_argument("--baseline", help="report to compare with")
+    parser.add_argument("--results", help="compare this report instead of running the suite")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative change flagged as a regression")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="run each benchmark this many times and keep the median of every number")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="seconds per benchmark run")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks of the profile and exit")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+    if args.list:
+        for name, params in profile_params(args.profile, args.param).items():
+            print(f"{name:16} {BENCHMARKS[name][0]:45} {json.dumps(params)}")
+        return
+    if args.results:
+        with open(args.results, encoding="utf-8") as f:
+            report = json.load(f)
+    else:
+        report = run_suite(args.profile, args.only, args.param, args.timeout, args.repeat)
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        print_comparison(report["comparison"])
+        regressed = bool(report["comparison"]["regressions"] or report["comparison"]["failed"])
+
+    if not args.results:
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
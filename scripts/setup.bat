@@ -13,6 +13,9 @@ mkdir data\raw 2>nul
 mkdir data\processed 2>nul
 mkdir data\models 2>nul
 
+REM Build the search index used by the QA service
+python -m app.services.indexing build
+
 REM Copy environment file if it doesn't exist
 if not exist .env (
     copy .env.example .env
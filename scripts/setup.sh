@@ -13,6 +13,9 @@ mkdir -p data/raw
 mkdir -p data/processed
 mkdir -p data/models
 
+# Build the search index used by the QA service
+python -m app.services.indexing build
+
 # Copy environment file if it doesn't exist
 if [ ! -f .env ]; then
     cp .env.example .env
@@ -0,0 +1,15 @@
+"""
+Deterministic fake embeddings that count what they embed, for asserting that texts are not embedded twice.
+"""
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    # embed_documents calls, and texts embedded by them
+    calls: int = 0
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
@@ -0,0 +1,131 @@
+"""
+Local HTTP server replaying saved PTIT pages, for crawler tests and benchmarks.
+
+Fixture pages live in tests/fixtures/ptit; {base}, {page} and {slug} in them
+are filled from the request so links point back at this server. Article
+pages carry an ETag and Last-Modified and answer conditional requests with
+304 until their revision is bumped.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "ptit")
+
+LAST_MODIFIED = "Mon, 02 Dec 2024 08:00:00 GMT"
+LIST_PAGES = ("notice_list.html", "event_list.html", "industry_list.html")
+
+ROUTES = [
+    (re.compile(r"^/thong-bao/page/(?P<page>\d+)$"), "notice_list.html"),
+    (re.compile(r"^/thong-bao/(?P<slug>[\w-]+)$"), "notice.html"),
+    (re.compile(r"^/su-kien/page/(?P<page>\d+)$"), "event_list.html"),
+    (re.compile(r"^/event/(?P<slug>[\w-]+)$"), "event.html"),
+    (re.compile(r"^/ctdt/dai-hoc/$"), "industry_list.html"),
+    (re.compile(r"^/ctdt/(?P<slug>[\w-]+)$"), "industry.html"),
+]
+
+
+class FixtureServer:
+    """
+    with FixtureServer(latency=0.05) as server:
+        PTITNoticeCrawler(f"{server.base_url}/thong-bao").crawl_all()
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = Counter()
+        self.failures = Counter()  # path -> number of 503 answers still to give
+        self.revisions = Counter()  # path -> bump to change a page's body and ETag
+        self.statuses = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._pages = {}
+        for _, filename in ROUTES:
+            with open(os.path.join(FIXTURE_DIR, filename), encoding="utf-8") as f:
+                self._pages[filename] = f.read()
+
+    def render(self, path: str):
+        """
+        Return (body, is_article) for path, or (None, False) if no route matches
+        """
+        for pattern, filename in ROUTES:
+            match = pattern.match(path)
+            if match:
+                body = self._pages[filename].replace("{base}", self.base_url)
+                for key, value in match.groupdict().items():
+                    body = body.replace("{%s}" % key, value)
+                if self.revisions[path]:
+                    body += f"<!-- revision {self.revisions[path]} -->"
+                return body, filename not in LIST_PAGES
+        return None, False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests[self.path] += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency)
+                    self._respond()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _respond(self):
+                if server.failures[self.path] > 0:
+                    server.failures[self.path] -= 1
+                    self._send(503, b"busy")
+                    return
+                body, is_article = server.render(self.path)
+                if body is None:
+                    self._send(404, b"not found")
+                    return
+                body = body.encode("utf-8")
+                if not is_article:
+                    self._send(200, body)
+                    return
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+                validators = {"ETag": etag, "Last-Modified": LAST_MODIFIED}
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", validators)
+                else:
+                    self._send(200, body, validators)
+
+            def _send(self, status, body, headers=None):
+                with server._lock:
+                    server.statuses[status] += 1
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=UTF-8")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,98 @@
+"""
+Local OpenAI-compatible chat completions server, for streaming tests and benchmarks.
+
+Answers POST /v1/chat/completions with a fixed answer split into tokens.
+With "stream": true the tokens are sent as server-sent events, one every
+1 / tokens_per_s seconds after first_token_delay; otherwise the whole
+completion is returned once it would have finished generating.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "Lịch thi học kỳ 1 năm học 2024-2025 được đăng trên cổng thông tin đào tạo. "
+    "Sinh viên kiểm tra phòng thi và số báo danh trước ngày thi ít nhất ba ngày."
+)
+
+
+class MockLLMServer:
+    """
+    with MockLLMServer(tokens_per_s=50) as server:
+        openai.AsyncOpenAI(base_url=server.base_url, api_key="test")
+    """
+
+    def __init__(self, tokens_per_s: float = 50.0, first_token_delay: float = 0.2, answer: str = ANSWER):
+        self.tokens_per_s = tokens_per_s
+        self.first_token_delay = first_token_delay
+        self.tokens = [word + " " for word in answer.split(" ")]
+        self.tokens[-1] = self.tokens[-1].rstrip()
+        self.requests = []
+
+    def _chunk(self, model, delta, finish_reason=None):
+        return {
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.0: the streamed body simply ends when the connection closes.
+            protocol_version = "HTTP/1.0"
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server.requests.append(request)
+                model = request.get("model", "mock")
+                time.sleep(server.first_token_delay)
+                if request.get("stream"):
+                    self._stream(model)
+                else:
+                    time.sleep((len(server.tokens) - 1) / server.tokens_per_s)
+                    self._complete(model)
+
+            def _stream(self, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                chunks = [server._chunk(model, {"role": "assistant", "content": ""})]
+                chunks += [server._chunk(model, {"content": token}) for token in server.tokens]
+                for i, chunk in enumerate(chunks):
+                    if i > 1:
+                        time.sleep(1 / server.tokens_per_s)
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(f"data: {json.dumps(server._chunk(model, {}, 'stop'))}\n\ndata: [DONE]\n\n".encode())
+
+            def _complete(self, model):
+                body = json.dumps({
+                    "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(server.tokens)}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(server.tokens), "total_tokens": len(server.tokens)},
+                }, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,36 @@
+"""
+A randomly initialised BERT model and WordPiece tokenizer saved as a local Hugging Face model directory.
+
+The default shape is that of all-MiniLM-L6-v2 (6 layers, 384 hidden, 12
+heads), so timings match the real model without downloading it; its vectors
+are meaningless.
+"""
+import os
+import re
+from collections import Counter
+from typing import Iterable
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def save_random_bert(out_dir: str, texts: Iterable[str], hidden_size: int = 384, layers: int = 6, heads: int = 12,
+                     vocab_size: int = 30522, seed: int = 0) -> str:
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Lowercased, accent-stripped words as the tokenizer sees them, then single characters.
+    words = Counter(w for text in texts for w in re.findall(r"\w+", text.lower()))
+    letters = sorted({c for word in words for c in word})
+    vocab = SPECIAL_TOKENS + letters + [f"##{c}" for c in letters]
+    vocab += [w for w, _ in words.most_common(vocab_size - len(vocab)) if w not in vocab]
+    vocab_file = os.path.join(out_dir, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizerFast(vocab_file=vocab_file, strip_accents=False).save_pretrained(out_dir)
+
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=hidden_size, num_hidden_layers=layers,
+                        num_attention_heads=heads, intermediate_size=4 * hidden_size, max_position_embeddings=512)
+    BertModel(config).eval().save_pretrained(out_dir)
+    return out_dir
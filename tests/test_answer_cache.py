@@ -0,0 +1,195 @@
+import itertools
+import unicodedata
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.services.answer_cache import AnswerCache, MemoryBackend, RedisBackend, cache_key, normalize
+from app.services.rag import RAGService
+
+
+class LocalRedis:
+    """
+    The redis commands RedisBackend uses, in memory, answering bytes like redis-py
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.now = 0.0
+
+    def _live(self, name):
+        if name in self.expires and self.expires[name] <= self.now:
+            self.data.pop(name, None)
+            self.expires.pop(name)
+        return self.data.get(name)
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, name):
+        return self._live(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = self._bytes(value)
+        if ex:
+            self.expires[name] = self.now + ex
+
+    def delete(self, *names):
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+    def incr(self, name):
+        self.data[name] = str(int(self.data.get(name, b"0")) + 1).encode()
+        return int(self.data[name])
+
+    def hset(self, name, key, value):
+        self.data.setdefault(name, {})[self._bytes(key)] = self._bytes(value)
+
+    def hdel(self, name, *keys):
+        return sum(self.data.get(name, {}).pop(self._bytes(key), None) is not None for key in keys)
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def zadd(self, name, mapping):
+        self.data.setdefault(name, {}).update({self._bytes(k): v for k, v in mapping.items()})
+
+    def zrem(self, name, *members):
+        return sum(self.data.get(name, {}).pop(self._bytes(m), None) is not None for m in members)
+
+    def zcard(self, name):
+        return len(self.data.get(name, {}))
+
+    def zrangebyscore(self, name, low, high):
+        return [m for m, score in sorted(self.data.get(name, {}).items(), key=lambda i: i[1]) if low <= score <= high]
+
+    def zpopmin(self, name, count=1):
+        popped = sorted(self.data.get(name, {}).items(), key=lambda i: i[1])[:count]
+        for member, _ in popped:
+            del self.data[name][member]
+        return popped
+
+
+VECTORS = {
+    "lịch thi học kỳ 1": [1.0, 0.0, 0.0],
+    "lịch thi kỳ 1": [0.97, 0.2, 0.0],
+    "học phí năm nay": [0.0, 1.0, 0.0],
+    "tuyển sinh": [0.0, 0.0, 1.0],
+}
+
+
+def embed(text):
+    return VECTORS[text]
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_cache(request):
+    client = LocalRedis()
+
+    def make(max_entries=100, ttl=3600):
+        if request.param == "memory":
+            backend = MemoryBackend(max_entries)
+        else:
+            backend = RedisBackend(client, max_entries=max_entries, ttl=ttl)
+        return AnswerCache(backend, embed, similarity_threshold=0.9, ttl=ttl)
+
+    make.client = client
+    return make
+
+
+def test_normalize():
+    assert normalize("  Lịch   THI học kỳ 1 ?") == "lịch thi học kỳ 1"
+    # Decomposed and precomposed Vietnamese are the same question.
+    assert normalize(unicodedata.normalize("NFD", "Học phí")) == normalize("Học phí")
+
+
+def test_exact_and_semantic_hits(make_cache):
+    cache = make_cache()
+    assert cache.lookup("Lịch thi học kỳ 1?")[0] is None
+    answer, vector = cache.lookup("Lịch thi học kỳ 1?")
+    cache.store("Lịch thi học kỳ 1?", None, "Xem lịch thi trên cổng đào tạo", vector)
+
+    assert cache.lookup("lịch thi   học kỳ 1")[0] == "Xem lịch thi trên cổng đào tạo"
+    assert cache.lookup("Lịch thi kỳ 1")[0] == "Xem lịch thi trên cổng đào tạo"
+    assert cache.lookup("Học phí năm nay")[0] is None
+    # The semantic tier only compares questions asked with the same context.
+    assert cache.lookup("Lịch thi kỳ 1", context="Khoa CNTT")[0] is None
+    metrics = cache.metrics()
+    assert (metrics["exact_hits"], metrics["semantic_hits"], metrics["misses"]) == (1, 1, 4)
+    assert metrics["hit_rate"] == pytest.approx(2 / 6)
+
+
+def test_lru_and_ttl_eviction(make_cache):
+    cache = make_cache(max_entries=2, ttl=60)
+    clock = itertools.count(1000.0, 0.01)
+    with patch("app.services.answer_cache.time.time", side_effect=lambda: next(clock)):
+        for question in ("Lịch thi học kỳ 1", "Học phí năm nay"):
+            cache.store(question, None, question.upper(), cache.lookup(question)[1])
+        cache.lookup("Lịch thi học kỳ 1")  # now more recently used than học phí
+        cache.store("Tuyển sinh", None, "TUYỂN SINH", cache.lookup("Tuyển sinh")[1])
+        assert cache.stats["evicted"] == 1
+        assert cache.lookup("Học phí năm nay")[0] is None
+        assert cache.lookup("Lịch thi học kỳ 1")[0] == "LỊCH THI HỌC KỲ 1"
+
+    make_cache.client.now = 100
+    with patch("app.services.answer_cache.time.time", return_value=1061.0):
+        assert cache.lookup("Lịch thi học kỳ 1")[0] is None
+        assert cache.lookup("Lịch thi kỳ 1")[0] is None
+
+
+def test_index_version_change_invalidates(make_cache):
+    cache = make_cache()
+    cache.set_version(3)
+    cache.store("Tuyển sinh", None, "old", cache.lookup("Tuyển sinh")[1])
+    assert cache.lookup("Tuyển sinh")[0] == "old"
+    cache.set_version(4)
+    assert cache.lookup("Tuyển sinh")[0] is None
+    assert cache.lookup("tuyển sinh")[0] is None
+
+
+def test_redis_backend_is_shared_between_workers():
+    client = LocalRedis()
+    first, second = (AnswerCache(RedisBackend(client), embed) for _ in range(2))
+    for cache in (first, second):
+        cache.set_version(1)
+    assert second.lookup("Lịch thi kỳ 1")[0] is None  # second caches the (empty) vectors
+    first.store("Lịch thi học kỳ 1", None, "shared", first.lookup("Lịch thi học kỳ 1")[1])
+    assert second.lookup("Lịch thi kỳ 1")[0] == "shared"
+    assert second.lookup("lịch thi học kỳ 1")[0] == "shared"
+
+
+def test_unusable_vectors_are_neither_compared_nor_stored(make_cache):
+    cache = make_cache()
+    # No index to embed with: the exact tier still works, the semantic one is skipped.
+    assert cache.lookup_similar("Lịch thi học kỳ 1", None, None) == (None, None)
+    cache.store("Lịch thi học kỳ 1", None, "no vector", None)
+    cache.store("Học phí năm nay", None, "nan", [float("nan")] * 3)
+    assert cache.lookup_similar("Lịch thi kỳ 1", None, np.float32("nan")) == (None, None)
+    assert cache.lookup("Lịch thi học kỳ 1")[0] == "no vector"
+    answer, vector = cache.lookup("Lịch thi kỳ 1")
+    assert answer is None and vector.shape == (3,)
+    assert cache.backend.vectors(cache_key("Lịch thi kỳ 1")[1])[0] == []
+
+
+@pytest.mark.asyncio
+async def test_process_question_answers_repeats_from_cache():
+    store = type("Store", (), {"embedding_function": type("E", (), {"embed_query": staticmethod(embed)})()})()
+    service = RAGService(vector_store=store, answer_cache=AnswerCache(MemoryBackend(), embed))
+    # Retrieval embeds the question once, in its batch; the semantic tier reuses that vector.
+    retrieved = AsyncMock(side_effect=lambda question, *args, **kwargs: ([], embed(normalize(question))))
+    with patch('openai.AsyncOpenAI') as mock_openai, \
+            patch.object(RAGService, "_retrieve", retrieved) as retrieve, \
+            patch.object(service.answer_cache, "embed", side_effect=AssertionError("embedded twice")):
+        create = mock_openai.return_value.chat.completions.create = AsyncMock()
+        create.return_value.choices = [type('obj', (object,), {
+            'message': type('obj', (object,), {'content': 'Xem cổng đào tạo'})
+        })]
+        assert await service.process_question("Lịch thi học kỳ 1") == "Xem cổng đào tạo"
+        assert await service.process_question("Lịch thi học kỳ 1?") == "Xem cổng đào tạo"
+        assert await service.process_question("Lịch thi kỳ 1") == "Xem cổng đào tạo"
+
+    # The repeat is answered before retrieval, the similar question after it.
+    assert create.call_count == 1 and retrieve.call_count == 2
+    assert service.answer_cache.metrics()["hit_rate"] == pytest.approx(2 / 3)
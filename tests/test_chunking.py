@@ -0,0 +1,70 @@
+from langchain_core.documents import Document
+
+from app.services.chunking import chunk_document, merge_chunks, split_text
+from app.services.indexing import document_id
+
+
+def test_split_text_respects_size_and_overlap():
+    sentences = [f"Câu số {i} nói về lịch thi học kỳ của sinh viên PTIT." for i in range(40)]
+    text = " ".join(sentences[:20]) + "\n" + " ".join(sentences[20:])
+
+    chunks = split_text(text, chunk_size=200, chunk_overlap=60)
+
+    assert len(chunks) > 5
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    # Each chunk starts with the last sentence of the previous one.
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split(".")[0] in previous
+    for sentence in sentences:
+        assert any(sentence in chunk for chunk in chunks)
+
+
+def test_split_text_cuts_oversized_sentences():
+    chunks = split_text("a" * 250 + " " + "từ " * 100, chunk_size=100, chunk_overlap=0)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+
+
+def test_chunk_document_carries_metadata_and_structure():
+    doc = Document(
+        page_content="Tổng quan chương trình.\nChuẩn đầu ra của chương trình.",
+        metadata={"title": "Công nghệ thông tin", "category": "industry", "program_structure": {
+            "Công nghệ phần mềm": {"ky 1": [{"subject": "Đại số", "tin_chi": "3 tín chỉ"}], "ky 2": []},
+            "Hệ thống thông tin": {"ky 1": [{"subject": "Giải tích 1", "tin_chi": "3 tín chỉ"}]},
+        }},
+    )
+
+    chunks = list(chunk_document(doc, chunk_size=600))
+
+    assert [c.metadata["chunk"] for c in chunks] == ["0", "Công nghệ phần mềm/ky 1/0", "Hệ thống thông tin/ky 1/0"]
+    assert all("program_structure" not in c.metadata for c in chunks)
+    assert {c.metadata["parent_id"] for c in chunks} == {chunks[0].metadata["parent_id"]}
+    assert chunks[1].page_content == "Công nghệ thông tin - Chuyên ngành Công nghệ phần mềm - ky 1: Đại số (3 tín chỉ)"
+    assert len({document_id(c) for c in chunks}) == 3
+
+
+def test_chunk_document_without_text_uses_title():
+    doc = Document(page_content="", metadata={"title": "Thông báo tuyển dụng", "url": "https://ptit.edu.vn/a",
+                                              "date": "02/10/2024", "category": "event"})
+    chunks = list(chunk_document(doc))
+    assert len(chunks) == 1
+    assert chunks[0].page_content == "Thông báo tuyển dụng"
+    assert chunks[0].metadata["date"] == "02/10/2024"
+
+
+def test_merge_chunks_returns_one_hit_per_parent():
+    def chunk(parent, key, text):
+        return Document(page_content=text, metadata={"title": parent, "parent_id": parent, "chunk": key})
+
+    hits = [
+        (chunk("a", "2", "a2"), 0.1),
+        (chunk("b", "0", "b0"), 0.2),
+        (chunk("a", "0", "a0"), 0.3),
+        (chunk("c", "0", "c0"), 0.4),
+        (chunk("b", "1", "b1"), 0.5),
+    ]
+
+    merged = merge_chunks(hits, k=2)
+
+    assert [(doc.metadata["id"], score) for doc, score in merged] == [("a", 0.1), ("b", 0.2)]
+    assert merged[0][0].page_content == "a0\n...\na2"
+    assert "chunk" not in merged[0][0].metadata
@@ -0,0 +1,139 @@
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.utils.crawl_engine import CrawlEngine
+from app.utils.crawler import MAX_PAGE_SK, DaoTaoCrawler, PTITEventCrawler, PTITNoticeCrawler
+from app.utils.http_cache import HTTPCache
+from app.utils.parsers import parse_notice
+from tests.fixture_server import FixtureServer
+
+
+@pytest.fixture
+def server():
+    with FixtureServer() as server:
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_async_crawl_matches_sync(server):
+    notice_crawler = PTITNoticeCrawler(f"{server.base_url}/thong-bao", max_page=3)
+    event_crawler = PTITEventCrawler(f"{server.base_url}/su-kien", max_page=2)
+    dao_tao_crawler = DaoTaoCrawler(f"{server.base_url}/ctdt/dai-hoc/")
+
+    async with CrawlEngine(per_host=4) as engine:
+        notices = await notice_crawler.acrawl_all(engine)
+        events = await event_crawler.acrawl_all(engine)
+        industries = await dao_tao_crawler.aget_industries_from_a_page(engine, dao_tao_crawler.base_url)
+
+    assert len(notices) == 9 and notices[0]["title"].endswith("(trang 1)")
+    assert notices[0]["content"]["text"]
+    assert events[0]["content"]["images"]
+    assert industries[0]["program_structure"]
+    assert notices == notice_crawler.crawl_all()
+    assert events == event_crawler.crawl_all()
+    assert industries == dao_tao_crawler.get_industries_from_a_page(dao_tao_crawler.base_url)
+
+
+@pytest.mark.asyncio
+async def test_engine_limits_concurrency_per_host():
+    with FixtureServer(latency=0.05) as server:
+        async with CrawlEngine(per_host=2) as engine:
+            await PTITNoticeCrawler(f"{server.base_url}/thong-bao", max_page=4).acrawl_all(engine)
+    assert server.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_engine_spaces_requests_to_a_host(server):
+    async with CrawlEngine(per_host=4, delay=0.1) as engine:
+        start = time.monotonic()
+        # 1 list page + 2 events, each started at least delay after the previous one.
+        await PTITEventCrawler(f"{server.base_url}/su-kien", max_page=1).acrawl_all(engine)
+        elapsed = time.monotonic() - start
+    assert engine.stats["requests"] == 3
+    assert elapsed >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_engine_retries_transient_errors(server):
+    page = "/thong-bao/page/1"
+    server.failures[page] = 2
+    async with CrawlEngine(backoff=0.01) as engine:
+        html = await engine.fetch(server.base_url + page)
+    assert "ova-blog" in html
+    assert server.requests[page] == 3
+    assert engine.stats["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_engine_gives_up_after_retries(server):
+    page = "/thong-bao/page/1"
+    server.failures[page] = 5
+    async with CrawlEngine(retries=1, backoff=0.01) as engine:
+        with pytest.raises(httpx.HTTPStatusError):
+            await engine.fetch(server.base_url + page)
+    assert server.requests[page] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_page_is_skipped(server):
+    async with CrawlEngine() as engine:
+        notices = await PTITNoticeCrawler(f"{server.base_url}/khong-ton-tai", max_page=2).acrawl_all(engine)
+    assert notices == []
+    assert PTITNoticeCrawler(f"{server.base_url}/khong-ton-tai", max_page=2).crawl_all() == []
+
+
+@pytest.mark.asyncio
+async def test_cached_pages_are_revalidated_not_reparsed(server, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    crawler = PTITNoticeCrawler(f"{server.base_url}/thong-bao", max_page=2, cache=cache)
+    first = crawler.crawl_all()
+    assert server.statuses[304] == 0 and cache.stats["stored"] == 6
+
+    server.revisions["/thong-bao/p1-hoc-phi"] += 1
+    with patch("app.utils.crawler.parse_notice", side_effect=parse_notice) as parse:
+        async with CrawlEngine() as engine:
+            second = await crawler.acrawl_all(engine)
+        third = crawler.crawl_all()
+    assert second == third == first
+    # Only the edited notice is downloaded and parsed again.
+    assert parse.call_count == 1
+    assert server.statuses[304] == 11
+    assert cache.stats["hits"] == 11
+
+
+def test_crawl_stops_at_first_seen_url(server):
+    crawler = PTITNoticeCrawler(f"{server.base_url}/thong-bao", max_page=4)
+    seen = {f"{server.base_url}/thong-bao/p1-hoc-phi"}
+    notices = crawler.crawl_all(seen_urls=seen)
+    assert [notice["url"] for notice in notices] == [f"{server.base_url}/thong-bao/p1-lich-thi"]
+    assert server.requests["/thong-bao/page/2"] == 0
+    assert server.requests["/thong-bao/p1-hoc-phi"] == 0
+
+
+@pytest.mark.asyncio
+async def test_async_crawl_stops_at_first_seen_url(server):
+    crawler = PTITEventCrawler(f"{server.base_url}/su-kien", max_page=3)
+    seen = {f"{server.base_url}/event/p2-hoi-thao-ai"}
+    async with CrawlEngine() as engine:
+        events = await crawler.acrawl_all(engine, seen_urls=seen)
+    assert len(events) == 2
+    assert server.requests["/su-kien/page/2"] == 1
+    assert server.requests["/su-kien/page/3"] == 0
+
+
+def test_event_crawler_defaults_to_max_page_sk(server):
+    crawler = PTITEventCrawler(f"{server.base_url}/su-kien")
+    assert crawler.max_page == MAX_PAGE_SK
+    assert crawler.crawl_all() == PTITEventCrawler(f"{server.base_url}/su-kien", max_page=MAX_PAGE_SK).crawl_all()
+
+
+@pytest.mark.asyncio
+async def test_parse_pool_gives_the_same_results(server):
+    crawler = DaoTaoCrawler(f"{server.base_url}/ctdt/dai-hoc/")
+    async with CrawlEngine(parse_workers=2) as engine:
+        industries = await crawler.aget_industries_from_a_page(engine, crawler.base_url)
+        assert engine.parse_executor is not None
+    assert industries == crawler.get_industries_from_a_page(crawler.base_url)
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.embedders import CachedEmbeddings, OnnxEmbeddings, create_embeddings, export_onnx
+from tests.fake_embeddings import CountingEmbedding
+from tests.random_model import save_random_bert
+
+TEXTS = ["Thông báo lịch thi học kỳ 1", "Học bổng KOICA", "Đào tạo ngành An toàn thông tin tại cơ sở Hà Đông"]
+
+
+def test_cached_embeddings_never_embed_a_text_twice(tmp_path):
+    inner = CountingEmbedding(size=8)
+    cached = CachedEmbeddings(inner, str(tmp_path))
+    first = cached.embed_documents(TEXTS + TEXTS[:1])
+    assert inner.embedded == 3
+    assert first[0] == first[3]
+    np.testing.assert_allclose(first[0], inner.embed_documents(TEXTS[:1])[0], rtol=1e-6)
+
+    # A new process reads the vectors back from disk.
+    inner.embedded = 0
+    again = CachedEmbeddings(inner, str(tmp_path))
+    vectors = again.embed_documents(TEXTS[::-1] + ["Tuyển sinh"])
+    np.testing.assert_allclose(vectors, first[2::-1] + inner.embed_documents(["Tuyển sinh"]), rtol=1e-6)
+    assert again.stats == {"hits": 3, "misses": 1}
+    assert inner.embedded == 2  # "Tuyển sinh" by the cache, then once more by the test
+
+
+def test_cached_embeddings_count_every_text_across_threads(tmp_path):
+    cached = CachedEmbeddings(DeterministicFakeEmbedding(size=8), str(tmp_path))
+    texts = [f"Thông báo số {i}" for i in range(20)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: cached.embed_documents(texts), range(16)))
+    assert cached.stats["hits"] + cached.stats["misses"] == 16 * len(texts)
+    cached.close()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_embeddings("model", {"backend": "tensorflow"})
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    model_dir = save_random_bert(str(tmp_path_factory.mktemp("bert")), TEXTS, hidden_size=32, layers=2, heads=2)
+    out_dir = str(tmp_path_factory.mktemp("onnx"))
+    export_onnx(model_dir, out_dir, int8=True)
+    return model_dir, out_dir
+
+
+def _torch_mean_pooled(model_dir, texts):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer, model = AutoTokenizer.from_pretrained(model_dir), AutoModel.from_pretrained(model_dir).eval()
+    inputs = tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors="pt")
+    with torch.no_grad():
+        tokens = model(**inputs).last_hidden_state
+    mask = inputs["attention_mask"].unsqueeze(-1).float()
+    vectors = ((tokens * mask).sum(1) / mask.sum(1)).numpy()
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_onnx_matches_the_pytorch_model(onnx_dir):
+    model_dir, out_dir = onnx_dir
+    expected = _torch_mean_pooled(model_dir, TEXTS)
+
+    embeddings = OnnxEmbeddings(out_dir, threads=1, batch_size=2)
+    assert embeddings.model_name == model_dir
+    vectors = np.asarray(embeddings.embed_documents(TEXTS))
+    np.testing.assert_allclose(vectors, expected, atol=1e-4)
+    np.testing.assert_allclose(embeddings.embed_query(TEXTS[1]), expected[1], atol=1e-4)
+
+    int8 = create_embeddings("unused", {"backend": "onnx", "model_dir": out_dir, "int8": True, "threads": 1})
+    assert int8.model_name == f"{model_dir}:int8"
+    cosine = (np.asarray(int8.embed_documents(TEXTS)) * expected).sum(axis=1)
+    assert cosine.min() > 0.95
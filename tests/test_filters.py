@@ -0,0 +1,127 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.filters import MetadataIndex, date_span, normalize_filters, parse_date
+from app.services.indexing import update_index
+from app.services.lexical import load_lexical_index
+from app.services.rag import RAGService
+
+RECORDS = [
+    ("Lịch thi học kỳ 1", "event", "notices", "08/12/2024"),
+    ("Lịch thi học kỳ 2", "event", "notices", "10/02/2025"),
+    ("Lịch thi bổ sung", "event", "news", "11/02/2025"),
+    ("Hội thảo lịch thi và công nghệ", "event", "events", "27/11/2024 13:00 - 27/02/2025 16:00"),
+    ("Ngành Công nghệ thông tin, lịch thi tuyển sinh", "industry", "industries", ""),
+]
+
+
+def _documents():
+    return [Document(page_content=title, metadata={"title": title, "category": category, "source": source,
+                                                   "date": date, "url": f"https://ptit.edu.vn/{i}"})
+            for i, (title, category, source, date) in enumerate(RECORDS)]
+
+
+@pytest.fixture
+def service(tmp_path):
+    index_dir = str(tmp_path / "index")
+    store, _ = update_index(_documents(), DeterministicFakeEmbedding(size=16), index_dir)
+    service = RAGService(vector_store=store, lexical_index=load_lexical_index(index_dir), top_k=5)
+    service.answer_cache = None
+    return service
+
+
+def test_parse_dates():
+    assert parse_date("08/12/2024") == 20241208
+    assert parse_date("2025-02-10") == parse_date(20250210) == parse_date("20250210") == 20250210
+    assert parse_date("No Date") is None and parse_date("") is None
+    assert date_span("27/11/2024 13:00 - 27/02/2025 16:00") == (20241127, 20250227)
+    assert date_span("03/02/2025 11:00 - 13:00") == (20250203, 20250203)
+
+
+def test_normalize_filters():
+    assert normalize_filters({"category": None, "date_from": ""}) is None
+    assert normalize_filters({"category": "event", "source": ["news", "notices"], "date_to": "28/02/2025"}) == {
+        "category": ("event",), "source": ("news", "notices"), "date_to": 20250228}
+    with pytest.raises(ValueError):
+        normalize_filters({"date_from": "last week"})
+    with pytest.raises(ValueError):
+        normalize_filters({"date_from": "2025-03-01", "date_to": "2025-02-01"})
+    with pytest.raises(ValueError):
+        normalize_filters({"author": "ptit"})
+
+
+def test_metadata_mask():
+    index = MetadataIndex([str(i) for i in range(len(RECORDS))], (doc.metadata for doc in _documents()))
+
+    def titles(filters):
+        return [RECORDS[i][0] for i in index.mask(normalize_filters(filters)).nonzero()[0]]
+
+    assert titles({"category": "industry"}) == [RECORDS[4][0]]
+    assert titles({"source": ["news", "notices"]}) == [RECORDS[0][0], RECORDS[1][0], RECORDS[2][0]]
+    # The conference spans the range; the undated industry program never matches a date.
+    assert titles({"date_from": "2025-02-10", "date_to": "2025-02-16"}) == [r[0] for r in RECORDS[1:4]]
+    assert titles({"category": "unknown-category"}) == []
+
+
+@pytest.mark.asyncio
+async def test_filtered_retrieval_only_searches_matching_documents(service):
+    hits = await service.retrieve("lịch thi", filters={"category": "event", "date_from": "01/02/2025"})
+    assert sorted(doc.metadata["title"] for doc, _ in hits) == sorted(r[0] for r in RECORDS[1:4])
+
+    # Concurrent questions with different filters are batched apart.
+    notices, industry, none = await asyncio.gather(
+        service.retrieve("lịch thi", filters={"source": "notices"}),
+        service.retrieve("lịch thi", filters={"category": "industry"}),
+        service.retrieve("lịch thi", filters={"date_to": "01/01/2020"}),
+    )
+    assert {doc.metadata["source"] for doc, _ in notices} == {"notices"} and len(notices) == 2
+    assert [doc.metadata["category"] for doc, _ in industry] == ["industry"]
+    assert none == []
+    assert len(await service.retrieve("lịch thi")) == len(RECORDS)
+
+
+@pytest.mark.asyncio
+async def test_filters_use_a_selector_and_mask_bm25(service):
+    selection = service.metadata_index.select(normalize_filters({"source": "news"}))
+    assert len(selection) == 1 and len(selection.lexical_slots) == 1
+    lexical = service.lexical_index.search("lịch thi", 5, selection.lexical_slots)
+    assert [service.vector_store.docstore.search(doc_id).metadata["source"] for doc_id, _ in lexical] == ["news"]
+
+    with patch.object(service.vector_store.index, "search", wraps=service.vector_store.index.search) as search:
+        await service.retrieve("lịch thi", filters={"source": "news"})
+    assert search.call_args.kwargs["params"].sel is not None
+
+
+def test_ask_rejects_a_bad_date(service):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import qa
+
+    app = FastAPI()
+    app.include_router(qa.router, prefix="/qa")
+    with patch("app.routers.qa.rag_service", service):
+        response = TestClient(app).post("/qa/ask/stream", params={"question": "lịch thi", "date_from": "hôm qua"})
+    assert response.status_code == 400
+
+
+def test_ask_passes_the_filters_to_retrieval():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import qa
+
+    app = FastAPI()
+    app.include_router(qa.router, prefix="/qa")
+    with patch("app.routers.qa.rag_service") as service:
+        service.process_question = AsyncMock(return_value="Lịch thi học kỳ 1")
+        response = TestClient(app).post("/qa/ask", params={"question": "lịch thi", "context": "PTIT",
+                                                           "category": "event", "date_from": "01/12/2024"})
+    assert response.status_code == 200 and response.json()["answer"] == "Lịch thi học kỳ 1"
+    filters = service.process_question.call_args.args[2]
+    assert filters["category"] == ("event",) and "date_from" in filters
+    service.process_question.assert_awaited_once_with("lịch thi", "PTIT", filters)
@@ -0,0 +1,49 @@
+import os
+import time
+
+from app.utils.http_cache import HTTPCache
+
+VALIDATORS = {"ETag": '"abc"', "Last-Modified": "Mon, 02 Dec 2024 08:00:00 GMT"}
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    cache.put("https://ptit.edu.vn/a", VALIDATORS, {"text": "Thông báo", "image_links": []})
+    entry = cache.get("https://ptit.edu.vn/a")
+    assert HTTPCache.validators(entry) == {"If-None-Match": '"abc"', "If-Modified-Since": VALIDATORS["Last-Modified"]}
+    assert cache.not_modified("https://ptit.edu.vn/a", entry) == {"text": "Thông báo", "image_links": []}
+    assert cache.get("https://ptit.edu.vn/b") is None
+    assert HTTPCache.validators(None) == {}
+
+
+def test_answers_without_validators_are_not_stored(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    cache.put("https://ptit.edu.vn/a", {}, {"text": "x"})
+    assert cache.get("https://ptit.edu.vn/a") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_evicts_old_entries(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_age=60)
+    cache.put("https://ptit.edu.vn/old", VALIDATORS, "old")
+    cache.put("https://ptit.edu.vn/new", VALIDATORS, "new")
+    past = time.time() - 120
+    os.utime(cache._path("https://ptit.edu.vn/old"), (past, past))
+    # Expired before any eviction runs.
+    assert cache.get("https://ptit.edu.vn/old") is None
+    cache.evict()
+    assert not os.path.exists(cache._path("https://ptit.edu.vn/old"))
+    assert cache.get("https://ptit.edu.vn/old") is None
+    assert cache.get("https://ptit.edu.vn/new")["value"] == "new"
+
+
+def test_evicts_least_recently_revalidated_over_size(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=1000)
+    for i in range(10):
+        cache.put(f"https://ptit.edu.vn/{i}", VALIDATORS, "x" * 150)
+        past = time.time() - 100 + i
+        os.utime(cache._path(f"https://ptit.edu.vn/{i}"), (past, past))
+    assert cache.stats["evicted"] > 0
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) <= 1000
+    assert cache.get("https://ptit.edu.vn/9") is not None
+    assert cache.get("https://ptit.edu.vn/0") is None
@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.image_processor import (
+    get_text_from_bytes, image_links_from_raw, ocr_adaptive, ocr_array, ocr_batch, ocr_settings, text_regions
+)
+
+
+def write_image(path, text):
+    img = np.full((120, 480, 3), 255, dtype=np.uint8)
+    cv2.putText(img, text, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    cv2.imwrite(str(path), img)
+
+
+@pytest.fixture
+def images(tmp_path):
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    write_image(image_dir / "a.png", "THONG BAO")
+    write_image(image_dir / "b.jpg", "LICH THI")
+    (image_dir / "notes.txt").write_text("not an image")
+    return image_dir
+
+
+@patch("app.services.image_processor.ocr_array", return_value="THONG BAO")
+def test_ocr_batch_skips_images_already_done(ocr, images, tmp_path):
+    json_dir = tmp_path / "text"
+    stats = ocr_batch(str(images), str(json_dir), workers=0)
+    assert (stats["images"], stats["ocr"], stats["skipped"], stats["failed"]) == (2, 2, 0, 0)
+    assert stats["images_per_s"] > 0
+    saved = [json.loads(path.read_text(encoding="utf-8")) for path in json_dir.iterdir()]
+    assert sorted(os.path.basename(item["image_path"]) for item in saved) == ["a.png", "b.jpg"]
+    assert saved[0]["extracted_text"] == "THONG BAO"
+
+    # The same content under another name is recognised by its hash.
+    shutil.copy(images / "a.png", images / "a-copy.png")
+    stats = ocr_batch(str(images), str(json_dir), workers=0)
+    assert (stats["images"], stats["ocr"], stats["skipped"]) == (3, 0, 3)
+    assert ocr.call_count == 2
+
+    stats = ocr_batch([str(images / "b.jpg")], str(json_dir), workers=0, force=True)
+    assert stats["ocr"] == 1
+
+
+@patch("app.services.image_processor.ocr_array", return_value="")
+def test_ocr_batch_counts_unreadable_images(ocr, images, tmp_path):
+    (images / "broken.png").write_bytes(b"not a png")
+    stats = ocr_batch([str(images / "broken.png"), str(images / "missing.png"), str(images / "a.png")],
+                      str(tmp_path / "text"), workers=0)
+    assert (stats["images"], stats["ocr"], stats["failed"]) == (3, 1, 2)
+
+
+def test_image_links_from_raw(tmp_path):
+    (tmp_path / "notices.json").write_text(json.dumps([
+        {"title": "a", "content": {"text": "", "image_links": ["https://ptit.edu.vn/1.png", "https://ptit.edu.vn/2.png"]}},
+        {"title": "b", "content": None},
+    ]), encoding="utf-8")
+    (tmp_path / "events.json").write_text(json.dumps([
+        {"title": "c", "content": {"texts": "", "images": [" https://ptit.edu.vn/1.png ", "https://ptit.edu.vn/3.jpg"]}},
+    ]), encoding="utf-8")
+    assert image_links_from_raw(str(tmp_path)) == [
+        "https://ptit.edu.vn/1.png", "https://ptit.edu.vn/3.jpg", "https://ptit.edu.vn/2.png",
+    ]
+
+
+def test_get_text_from_bytes_decodes_in_memory(tmp_path):
+    write_image(tmp_path / "a.png", "THONG BAO")
+    data = (tmp_path / "a.png").read_bytes()
+    with patch("app.services.image_processor.ocr_array", return_value="THONG BAO") as ocr, \
+            patch.dict(ocr_settings(), adaptive=False):
+        assert get_text_from_bytes(data) == "THONG BAO"
+        assert get_text_from_bytes(np.frombuffer(data, dtype=np.uint8)) == "THONG BAO"
+    image = ocr.call_args[0][0]
+    assert image.shape == (120, 480) and set(np.unique(image)) <= {0, 255}
+    with pytest.raises(ValueError):
+        get_text_from_bytes(b"not an image")
+
+
+def page(lines, width=3000, height=2200, font_scale=2.0):
+    img = np.full((height, width, 3), (90, 110, 130), dtype=np.uint8)
+    img[150:height - 150, 300:width - 300] = 240
+    for row, line in enumerate(lines):
+        cv2.putText(img, line, (400, 300 + row * 90), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (30, 30, 30), 4)
+    return img
+
+
+def photo(width=3000, height=2200):
+    rng = np.random.default_rng(1)
+    img = cv2.resize(rng.integers(0, 255, (12, 16, 3)).astype(np.uint8), (width, height),
+                     interpolation=cv2.INTER_CUBIC)
+    for _ in range(6):
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        cv2.circle(img, (int(rng.integers(0, width)), int(rng.integers(0, height))),
+                   int(rng.integers(100, 600)), color, -1)
+    return cv2.GaussianBlur(img, (31, 31), 0)
+
+
+def test_text_regions_find_the_text_block():
+    lines = ["THONG BAO LICH THI", "Hoc ky 1 nam hoc 2024-2025", "Sinh vien xem tren cong dao tao"]
+    gray = cv2.cvtColor(page(lines), cv2.COLOR_BGR2GRAY)
+    scale, blocks = text_regions(gray)
+    assert len(blocks) == 1
+    x, y, w, h = blocks[0]
+    # The block covers the three lines and not the page margins.
+    assert 300 < x <= 400 and 200 <= y <= 250 and 260 + 2 * 90 <= y + h <= 560 and w < 1800
+    # Text lines of ~60 px are brought down to the 40 px target.
+    assert 0.5 < scale < 0.9
+    assert text_regions(cv2.cvtColor(photo(), cv2.COLOR_BGR2GRAY))[1] == []
+
+
+@patch("app.services.image_processor.ocr_array",
+       side_effect=lambda crop, lang: "THONG BAO" if crop.shape[0] > 100 else "Lich thi")
+def test_ocr_adaptive_reads_blocks_in_order_and_skips_photos(ocr):
+    # Blocks run on two threads; the two-line block is told apart by its height.
+    img = page(["THONG BAO LICH THI", "Hoc ky 1 nam hoc 2024"] + [""] * 10 + ["Lich thi tren cong dao tao"])
+    assert ocr_adaptive(img, region_threads=2) == "THONG BAO\n\nLich thi"
+    crops = [call[0][0] for call in ocr.call_args_list]
+    assert all(crop.ndim == 2 and crop.shape[0] < 200 for crop in crops)
+    assert ocr_adaptive(photo()) == ""
+    assert ocr.call_count == 2
+
+
+def test_ocr_endpoint(tmp_path):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import image
+
+    app = FastAPI()
+    app.include_router(image.router, prefix="/image")
+    client = TestClient(app)
+    write_image(tmp_path / "a.png", "THONG BAO")
+    with patch("app.services.image_processor.ocr_array", return_value="THONG BAO"):
+        response = client.post("/image/ocr", files={"file": ("a.png", (tmp_path / "a.png").read_bytes(), "image/png")})
+    assert response.status_code == 200
+    assert response.json() == {"filename": "a.png", "text": "THONG BAO"}
+
+    response = client.post("/image/ocr", files={"file": ("a.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+
+
+def test_tesserocr_backend_reads_text():
+    tesserocr = pytest.importorskip("tesserocr")
+    if "eng" not in tesserocr.get_languages()[1]:
+        pytest.skip("no eng traineddata")
+    img = np.full((100, 420), 255, dtype=np.uint8)
+    cv2.putText(img, "PTIT 2024", (10, 65), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    assert ocr_array(img, lang="eng", backend="tesserocr").strip() == "PTIT 2024"
+    # The second call reuses the loaded model.
+    assert ocr_array(img, lang="eng", backend="tesserocr").strip() == "PTIT 2024"
+
+
+@patch("app.services.image_processor.cv2.imencode", return_value=(False, None))
+def test_stdin_backend_raises_when_the_image_cannot_be_encoded(imencode):
+    with patch("app.services.image_processor.subprocess.run") as run, pytest.raises(RuntimeError):
+        ocr_array(np.zeros((10, 10), dtype=np.uint8), backend="stdin")
+    assert not run.called
@@ -0,0 +1,164 @@
+import json
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services.docstore import BlobDocstore
+from app.services.indexing import (
+    CURRENT_FILE, INDEX_FILE, KEEP_VERSIONS, MANIFEST_FILE, VERSIONS_DIR, build_index, current_index_dir,
+    load_documents, load_index, read_manifest, save_index, update_index,
+)
+from tests.fake_embeddings import CountingEmbedding
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    notices = [
+        {"title": "Thông báo lịch thi", "date": "08/12/2024", "url": "https://ptit.edu.vn/a",
+         "content": {"text": "Lịch thi học kỳ 1", "image_links": []}},
+        {"title": "Thông báo học phí", "date": "11/11/2024", "url": "https://ptit.edu.vn/b",
+         "content": {"text": "Học phí năm học 2024", "image_links": []}},
+    ]
+    industries = [{"program_name": "Công nghệ thông tin", "content": "Tổng quan chương trình",
+                   "program_structure": {}, "metadata": {}}]
+    (raw / "notices.json").write_text(json.dumps(notices, ensure_ascii=False), encoding="utf-8")
+    (raw / "industries.json").write_text(json.dumps(industries, ensure_ascii=False), encoding="utf-8")
+    return raw
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbedding(size=16)
+
+
+def test_load_documents(data_dir):
+    documents = load_documents(str(data_dir))
+    assert len(documents) == 3
+    assert {doc.metadata["category"] for doc in documents} == {"event", "industry"}
+
+
+def test_build_then_load_mmap(data_dir, tmp_path, embeddings):
+    index_dir = tmp_path / "index"
+    built = build_index(load_documents(str(data_dir)), embeddings, str(index_dir))
+
+    loaded = load_index(embeddings, str(index_dir), mmap=True)
+    assert loaded.index.ntotal == built.index.ntotal == 3
+    assert loaded.index_to_docstore_id == built.index_to_docstore_id
+
+    results = loaded.similarity_search("Lịch thi học kỳ 1", k=1)
+    assert results[0].metadata["title"] == "Thông báo lịch thi"
+
+
+def test_load_missing_index(tmp_path, embeddings):
+    with pytest.raises(FileNotFoundError):
+        load_index(embeddings, str(tmp_path / "missing"))
+
+
+def test_update_index_embeds_only_changes(data_dir, tmp_path, embeddings):
+    index_dir = str(tmp_path / "index")
+    _, stats = update_index(load_documents(str(data_dir)), embeddings, index_dir)
+    assert stats == {"added": 3, "removed": 0, "unchanged": 0, "version": 1}
+
+    notices_path = data_dir / "notices.json"
+    notices = json.loads(notices_path.read_text(encoding="utf-8"))
+    notices[0]["content"]["text"] = "Lịch thi học kỳ 2"
+    notices[1] = {"title": "Thông báo tuyển sinh", "date": "01/01/2025", "url": "https://ptit.edu.vn/c",
+                  "content": {"text": "Tuyển sinh đại học", "image_links": []}}
+    notices_path.write_text(json.dumps(notices, ensure_ascii=False), encoding="utf-8")
+
+    embeddings.embedded = 0
+    vector_store, stats = update_index(load_documents(str(data_dir)), embeddings, index_dir)
+    assert embeddings.embedded == 2
+    assert stats == {"added": 2, "removed": 2, "unchanged": 1, "version": 2}
+    assert vector_store.index.ntotal == 3
+    assert read_manifest(index_dir)["version"] == 2
+
+    loaded = load_index(embeddings, index_dir)
+    titles = {doc.metadata["title"] for doc, _ in loaded.similarity_search_with_score("Tuyển sinh đại học", k=3)}
+    assert titles == {"Thông báo lịch thi", "Thông báo tuyển sinh", "Công nghệ thông tin"}
+
+    embeddings.embedded = 0
+    _, stats = update_index(load_documents(str(data_dir)), embeddings, index_dir)
+    assert embeddings.embedded == 0
+    assert stats["version"] == 2
+
+
+@pytest.mark.parametrize("params", [
+    {"type": "flat"},
+    {"type": "sqfp16"},
+    {"type": "sq8"},
+    {"type": "ivf_flat", "nlist": 4, "nprobe": 4},
+    {"type": "hnsw", "hnsw_m": 8, "ef_search": 32},
+    {"type": "ivf_pq", "nlist": 2, "nprobe": 2, "pq_m": 4, "pq_nbits": 4},
+])
+def test_index_types(tmp_path, embeddings, params):
+    documents = [Document(page_content=f"tài liệu {i}", metadata={"title": str(i), "category": "event"})
+                 for i in range(200)]
+    index_dir = str(tmp_path / "index")
+    vector_store, _ = update_index(documents, embeddings, index_dir, params=params)
+    assert vector_store.index.ntotal == 200
+
+    vector_store, stats = update_index(documents[:150], embeddings, index_dir, params=params)
+    assert stats["removed"] == 50 and stats["added"] == 0
+    assert vector_store.index.ntotal == 150
+
+    loaded = load_index(embeddings, index_dir, params=params)
+    assert loaded.similarity_search("tài liệu 7", k=1)[0].metadata["title"] == "7"
+    assert read_manifest(index_dir)["index"]["type"] == params["type"]
+
+
+def test_blob_docstore(data_dir, tmp_path, embeddings):
+    index_dir = tmp_path / "index"
+    update_index(load_documents(str(data_dir)), embeddings, str(index_dir))
+    assert not list(index_dir.glob("**/docs.*.bin"))
+
+    # Switching the docstore rewrites the files without embedding again.
+    embeddings.embedded = 0
+    vector_store, stats = update_index(load_documents(str(data_dir)), embeddings, str(index_dir),
+                                       params={"docstore": "blob"})
+    assert embeddings.embedded == 0 and stats["version"] == 2
+    assert isinstance(vector_store.docstore, BlobDocstore)
+    first_blob = list(index_dir.glob("**/docs.*.bin"))
+    assert len(first_blob) == 1
+
+    loaded = load_index(embeddings, str(index_dir))
+    assert isinstance(loaded.docstore, BlobDocstore) and len(loaded.docstore) == 3
+    hit = loaded.similarity_search("Lịch thi học kỳ 1", k=1)[0]
+    assert hit.page_content == "Lịch thi học kỳ 1" and hit.metadata["date"] == "08/12/2024"
+
+    # An incremental update writes a new blob; the loaded one stays readable.
+    notices_path = data_dir / "notices.json"
+    notices = json.loads(notices_path.read_text(encoding="utf-8"))[:1]
+    notices_path.write_text(json.dumps(notices, ensure_ascii=False), encoding="utf-8")
+    update_index(load_documents(str(data_dir)), embeddings, str(index_dir), params={"docstore": "blob"})
+    assert list(index_dir.glob(f"{VERSIONS_DIR}/*/docs.*.bin")) != first_blob
+    assert loaded.similarity_search("Lịch thi học kỳ 1", k=1)[0].page_content == "Lịch thi học kỳ 1"
+    assert len(load_index(embeddings, str(index_dir)).docstore) == 2
+
+
+def test_each_version_gets_its_own_directory(data_dir, tmp_path, embeddings):
+    index_dir = tmp_path / "index"
+    # An index saved in place, as before versions existed, is read from index_dir itself.
+    save_index(build_index(load_documents(str(data_dir)), embeddings, str(tmp_path / "old")), str(index_dir))
+    assert current_index_dir(str(index_dir)) == str(index_dir)
+
+    notices_path = data_dir / "notices.json"
+    notices = json.loads(notices_path.read_text(encoding="utf-8"))
+    loaded, version_dirs = [], []
+    for version in range(1, KEEP_VERSIONS + 3):
+        notices[0]["content"]["text"] = f"Lịch thi học kỳ {version}"
+        notices_path.write_text(json.dumps(notices, ensure_ascii=False), encoding="utf-8")
+        update_index(load_documents(str(data_dir)), embeddings, str(index_dir), full=True)
+        version_dirs.append(current_index_dir(str(index_dir)))
+        loaded.append(load_index(embeddings, version_dirs[-1]))
+
+    assert len(set(version_dirs)) == len(version_dirs)
+    assert (index_dir / CURRENT_FILE).read_text() == (index_dir / version_dirs[-1]).name
+    assert read_manifest(str(index_dir))["version"] == read_manifest(version_dirs[-1])["version"]
+    # The files of the layout before versions are gone, and only KEEP_VERSIONS previous versions are kept.
+    assert not (index_dir / INDEX_FILE).exists() and not (index_dir / MANIFEST_FILE).exists()
+    assert sorted(str(path) for path in (index_dir / VERSIONS_DIR).iterdir()) == sorted(version_dirs[-KEEP_VERSIONS - 1:])
+    # A store loaded from a deleted version keeps answering.
+    assert loaded[0].similarity_search("Lịch thi học kỳ 1", k=3)
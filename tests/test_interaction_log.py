@@ -0,0 +1,93 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, func, select
+
+from app.routers import qa
+from app.services.interaction_log import WriteBehindLog, feedback, interactions
+
+
+def sqlite_engine(tmp_path, latency=0.0, name="interactions.sqlite"):
+    engine = create_engine(f"sqlite:///{tmp_path / name}")
+    if latency:
+        @event.listens_for(engine, "before_cursor_execute")
+        def slow(*args):
+            time.sleep(latency)
+    return engine
+
+
+def count(engine, table):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+def row(i):
+    return {"question_id": f"q{i}", "feedback": "Hữu ích", "rating": 5}
+
+
+@pytest.mark.asyncio
+async def test_batches_by_size_and_time_and_flushes_on_close(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    log = WriteBehindLog(engine, batch_size=10, flush_interval=0.1)
+    for i in range(25):
+        assert await log.record("qa_feedback", row(i))
+    await asyncio.sleep(0.05)
+    assert log.stats["written"] == 20 and log.stats["batches"] == 2  # full batches at once
+    await asyncio.sleep(0.2)
+    assert log.stats["written"] == 25  # the rest once flush_interval passed
+
+    await log.record("qa_feedback", row(25))
+    await log.close()  # long before flush_interval
+    assert count(engine, feedback) == 26
+    assert not await log.record("qa_feedback", row(26))
+    with pytest.raises(ValueError):
+        await WriteBehindLog(engine).record("users", {})
+
+
+@pytest.mark.asyncio
+async def test_backpressure_on_a_slow_database(tmp_path):
+    engine = sqlite_engine(tmp_path, latency=0.05)
+    dropping = WriteBehindLog(engine, batch_size=2, flush_interval=0.01, max_queue=2, put_timeout=0.01)
+    results = [await dropping.record("qa_feedback", row(i)) for i in range(10)]
+    await dropping.close()
+    assert not all(results) and dropping.stats["dropped"] == results.count(False)
+    assert count(engine, feedback) == results.count(True)
+
+    waiting = WriteBehindLog(sqlite_engine(tmp_path, latency=0.05, name="waiting.sqlite"), batch_size=2, flush_interval=0.01,
+                             max_queue=2, put_timeout=None)
+    start = time.perf_counter()
+    assert all([await waiting.record("qa_feedback", row(i)) for i in range(10)])
+    assert time.perf_counter() - start > 0.1  # the producer was slowed down to the database's pace
+    await waiting.close()
+    assert waiting.stats["written"] == 10
+
+
+@pytest.mark.asyncio
+async def test_ask_and_feedback_are_logged(tmp_path):
+    class Service:
+        async def process_question(self, question, context=None, filters=None):
+            return "Lịch thi được đăng trên cổng đào tạo"
+
+    engine = sqlite_engine(tmp_path)
+    log = WriteBehindLog(engine, flush_interval=10)
+    app = FastAPI()
+    app.include_router(qa.router, prefix="/qa")
+    with patch.object(qa, "get_rag_service", Service), patch.object(qa, "get_interaction_log", lambda: log):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/qa/ask", params={"question": "Lịch thi?", "category": "notice"})
+            question_id = response.json()["question_id"]
+            await client.post("/qa/feedback", params={"question_id": question_id, "feedback": "Đúng", "rating": 4})
+        assert (log.stats["queued"], log.stats["written"]) == (2, 0)  # still queued
+        await log.close()
+
+    with engine.connect() as connection:
+        asked = connection.execute(select(interactions)).one()
+        rated = connection.execute(select(feedback)).one()
+    assert (asked.question_id, asked.endpoint, asked.question) == (question_id, "ask", "Lịch thi?")
+    assert asked.filters == {"category": ["notice"]} and asked.answer == "Lịch thi được đăng trên cổng đào tạo"
+    assert set(asked.sentiment) == {"positive", "neutral", "negative"} and asked.latency_ms > 0
+    assert (rated.question_id, rated.rating) == (question_id, 4)
@@ -0,0 +1,207 @@
+import json
+import time
+from typing import Optional
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.main import app
+from app.routers import jobs as jobs_router
+from app.services import jobs, pipeline
+from app.services.embedders import CachedEmbeddings
+from app.services.indexing import load_index, read_manifest
+from app.services.jobs import DONE, FAILED, QUEUED, JobQueue, JobStore, SQLBroker, Worker, job_type
+from app.services.rag import RAGService
+from app.utils.http_cache import HTTPCache
+from tests.fixture_server import FixtureServer
+
+
+@pytest.fixture
+def queue(tmp_path):
+    store = JobStore.from_url(f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+    queue = JobQueue(store, SQLBroker(store, poll_interval=0.02), max_attempts=3, backoff=0.01, stale_after=60)
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def job_types(monkeypatch):
+    # Test job types, registered on a copy so that the pipeline's stay as they are.
+    monkeypatch.setattr(jobs, "JOB_TYPES", dict(jobs.JOB_TYPES))
+    calls = []
+
+    @job_type("flaky", failures=int, label=Optional[str])
+    def flaky(context, failures, label=None):
+        calls.append(label)
+        if context.job["attempts"] <= failures:
+            raise RuntimeError(f"attempt {context.job['attempts']}")
+        for done in range(1, 5):
+            context.progress(done, 4, f"{done}/4")
+        return {"attempts": context.job["attempts"]}
+
+    return calls
+
+
+def test_submit_is_idempotent_and_checks_payloads(queue, job_types):
+    first = queue.submit("flaky", {"failures": 0})
+    assert first["status"] == QUEUED and first["id"].startswith("flaky:")
+    assert queue.submit("flaky", {"failures": 0})["id"] == first["id"]
+    assert queue.submit("flaky", {"failures": 0, "label": "b"})["id"] != first["id"]
+    assert queue.submit("flaky", {"failures": 0}, key="nightly")["id"] == "flaky:nightly"
+    assert len(queue.store.list()) == 3
+
+    with pytest.raises(ValueError):
+        queue.submit("unknown")
+    with pytest.raises(ValueError):
+        queue.submit("flaky", {"failures": 0, "extra": 1})
+    with pytest.raises(ValueError):
+        queue.submit("flaky", {})
+    with pytest.raises(TypeError):
+        queue.submit("flaky", {"failures": "0"})
+
+
+def test_failed_jobs_are_retried_then_given_up(queue, job_types):
+    retried = queue.submit("flaky", {"failures": 2, "label": "retried"})["id"]
+    given_up = queue.submit("flaky", {"failures": 5, "label": "given up"})["id"]
+    assert Worker(queue, ["flaky"], concurrency=2).drain(timeout=30)
+
+    job = queue.get(retried)
+    assert job["status"] == DONE and job["attempts"] == 3
+    assert job["result"] == {"attempts": 3} and job["progress"] == 1.0 and job["message"] == "4/4"
+    job = queue.get(given_up)
+    assert job["status"] == FAILED and job["attempts"] == 3 and job["error"] == "RuntimeError: attempt 3"
+    assert job_types.count("given up") == 3
+
+    # Submitting a failed job again runs it again; a done one is not.
+    assert queue.submit("flaky", {"failures": 5, "label": "given up"})["status"] == QUEUED
+    assert queue.submit("flaky", {"failures": 2, "label": "retried"})["status"] == DONE
+
+
+def test_jobs_wait_for_their_dependencies(queue, job_types):
+    first = queue.submit("flaky", {"failures": 1, "label": "first"})["id"]
+    then = queue.submit("flaky", {"failures": 0, "label": "then"}, depends_on=[first])["id"]
+    doomed = queue.submit("flaky", {"failures": 9, "label": "doomed"})["id"]
+    never = queue.submit("flaky", {"failures": 0, "label": "never"}, depends_on=[first, doomed])["id"]
+    assert Worker(queue, ["flaky"], concurrency=2).drain(timeout=30)
+
+    assert job_types.index("then") > job_types.index("first")
+    assert queue.get(then)["status"] == DONE
+    assert queue.get(never)["status"] == FAILED and queue.get(never)["error"] == f"dependency {doomed} failed"
+    assert "never" not in job_types
+
+
+def test_jobs_of_a_lost_worker_are_queued_again(queue, job_types):
+    job_id = queue.submit("flaky", {"failures": 0})["id"]
+    assert queue.store.claim(job_id, "lost-worker")["status"] == "running"
+    assert queue.store.claim(job_id, "other-worker") is None
+
+    assert queue.store.requeue_stale(stale_after=60) == []
+    queue.store.engine.dispose()
+    with queue.store.engine.begin() as connection:
+        connection.execute(jobs.jobs.update().values(updated_at=time.time() - 120))
+    assert queue.store.requeue_stale(stale_after=60) == [("flaky", job_id)]
+    assert Worker(queue, ["flaky"]).drain(timeout=30)
+    assert queue.get(job_id)["status"] == DONE and queue.get(job_id)["attempts"] == 2
+
+
+def test_a_job_that_keeps_killing_its_worker_is_failed(queue, job_types):
+    job_id = queue.submit("flaky", {"failures": 0})["id"]
+    for attempt in range(1, 4):
+        assert queue.store.claim(job_id, f"worker-{attempt}")["attempts"] == attempt
+        with queue.store.engine.begin() as connection:
+            connection.execute(jobs.jobs.update().values(updated_at=time.time() - 120))
+        requeued = queue.store.requeue_stale(stale_after=60, backoff=30)
+        if attempt < 3:
+            assert requeued == [("flaky", job_id)]
+            # Queued again after the backoff of a failed attempt.
+            assert queue.get(job_id)["run_after"] > time.time() + 30 * 2 ** (attempt - 1) - 5
+    assert requeued == []
+    job = queue.get(job_id)
+    assert job["status"] == FAILED and job["attempts"] == 3 and "worker lost" in job["error"]
+    assert queue.store.claim(job_id, "worker-4") is None
+
+
+def test_jobs_api(queue, job_types, monkeypatch):
+    monkeypatch.setattr(jobs_router, "job_queue", queue)
+    qa, image = app.state.routers["qa"], app.state.routers["image"]
+    with patch.object(qa, "warm_up", lambda: None), patch.object(image, "warm_up", lambda: None), \
+            TestClient(app) as client:
+        response = client.post("/jobs/flaky", json={"failures": 0}, params={"key": "api"})
+        assert response.status_code == 200 and response.json()["id"] == "flaky:api"
+        assert client.post("/jobs/flaky", json={"failures": "0"}).status_code == 400
+        assert client.post("/jobs/unknown").status_code == 400
+        assert client.get("/jobs/flaky:api").json()["status"] == QUEUED
+        assert client.get("/jobs/flaky:missing").status_code == 404
+        assert [job["id"] for job in client.get("/jobs", params={"status": QUEUED}).json()] == ["flaky:api"]
+        assert 'vpa_jobs{type="flaky",status="queued"' in client.get("/metrics").text
+
+
+@pytest.fixture
+def pipeline_dirs(tmp_path, monkeypatch):
+    settings = {**pipeline.pipeline_settings(), "data_dir": str(tmp_path / "raw"), "work_dir": str(tmp_path / "work"),
+                "ocr_dir": str(tmp_path / "ocr"), "index_dir": str(tmp_path / "index"), "index": {"type": "flat"},
+                "embed_shard": 4}
+    monkeypatch.setattr(pipeline, "pipeline_settings", lambda: settings)
+    monkeypatch.setattr(HTTPCache, "from_config", classmethod(lambda cls: cls(str(tmp_path / "http"))))
+    embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=16), str(tmp_path / "vectors"))
+    monkeypatch.setattr(pipeline, "_embeddings", embeddings)
+    yield settings
+    embeddings.close()
+
+
+def test_pipeline_crawls_ocrs_and_indexes_then_the_api_swaps_the_index(queue, pipeline_dirs):
+    stages = ["crawl", "ocr", "chunk", "embed", "index"]
+    with FixtureServer() as server:
+        crawl = queue.submit("crawl", {"source": "notices", "max_pages": 2, "url": f"{server.base_url}/thong-bao"})
+        # Submitted again within the hour: the same job.
+        assert queue.submit("crawl", {"source": "notices", "max_pages": 2,
+                                      "url": f"{server.base_url}/thong-bao"})["id"] == crawl["id"]
+        # Each stage on its own pool, as separate worker processes would run them.
+        workers = [Worker(queue, [stage], concurrency=2) for stage in stages]
+        for worker in workers:
+            worker.start()
+        try:
+            deadline = time.monotonic() + 120
+            while queue.store.pending(stages) and time.monotonic() < deadline:
+                time.sleep(0.1)
+        finally:
+            for worker in workers:
+                worker.stop()
+
+    statuses = {(job["type"], job["status"]) for job in queue.store.list()}
+    assert statuses == {(stage, DONE) for stage in stages}
+    result = queue.get(crawl["id"])["result"]
+    assert result["new"] == result["saved"] == 6 and result["ocr_jobs"]
+    with open(f"{pipeline_dirs['data_dir']}/notices.json", encoding="utf-8") as f:
+        assert len(json.load(f)) == 6
+    # Broken image links are counted, not retried forever.
+    ocr = queue.store.list(job_type="ocr")[0]
+    assert ocr["attempts"] == 1 and ocr["result"]["failed"] == ocr["result"]["images"] > 0
+
+    manifest = read_manifest(pipeline_dirs["index_dir"])
+    assert manifest["version"] == 1 and len(manifest["documents"]) >= 6
+    embeddings = pipeline._embeddings
+    # The embed jobs embedded every chunk; the index job found them all in the cache.
+    assert embeddings.stats["misses"] == len(manifest["documents"])
+    assert embeddings.stats["hits"] == len(manifest["documents"])
+
+    service = RAGService(vector_store=load_index(embeddings, pipeline_dirs["index_dir"]))
+    service.index_dir, service.index_version = pipeline_dirs["index_dir"], 1
+    assert not service.reload_index()
+
+    events = [{"title": "Sự kiện ngày hội việc làm", "date": "01/12/2024", "url": "https://ptit.edu.vn/su-kien/viec-lam",
+               "content": {"text": "Ngày hội việc làm dành cho sinh viên năm cuối", "images": []}}]
+    with open(f"{pipeline_dirs['data_dir']}/events.json", "w", encoding="utf-8") as f:
+        json.dump(events, f, ensure_ascii=False)
+    chunk = queue.submit("chunk", key="events")
+    assert Worker(queue, stages).drain(timeout=60)
+    assert queue.get(chunk["id"])["result"]["shards"] == 1
+
+    assert service.reload_index()
+    assert service.index_version == 2
+    titles = {doc.metadata["title"] for doc, _ in service.vector_store.similarity_search_with_score(
+        "Ngày hội việc làm dành cho sinh viên năm cuối", k=1)}
+    assert titles == {"Sự kiện ngày hội việc làm"}
+    service.executor.shutdown()
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.indexing import current_index_dir, update_index
+from app.services.lexical import (
+    LEXICAL_FILE, LexicalIndex, fold, load_lexical_index, query_terms, reciprocal_rank_fusion, tokenize
+)
+from app.services.rag import RAGService
+
+TEXTS = {
+    "lich-thi": "Thông báo lịch thi học kỳ 1 năm học 2024-2025",
+    "hoc-phi": "Thông báo mức học phí năm học 2024-2025",
+    "hoc-bong": "Chương trình học bổng KOICA Hàn Quốc dành cho sinh viên",
+    "lich-su": "Lich su hinh thanh Hoc vien, viet khong dau",
+    "dao-tao": "Đào tạo ngành An toàn thông tin tại cơ sở Hà Đông",
+}
+
+
+@pytest.fixture
+def index():
+    index = LexicalIndex()
+    for doc_id, text in TEXTS.items():
+        index.add(doc_id, text)
+    return index
+
+
+def test_tokenize_and_fold():
+    assert tokenize("Sự kiện về CÔNG NGHỆ tại PTIT!") == ["sự", "kiện", "về", "công", "nghệ", "tại", "ptit"]
+    assert fold("Đào tạo Hà Đông") == "Dao tao Ha Dong"
+    assert query_terms("lịch thi") == {"lịch": 1.0, "lich": 0.5, "thi": 1.0}
+
+
+def test_search_with_and_without_diacritics(index):
+    assert index.search("học bổng Hàn Quốc", 1)[0][0] == "hoc-bong"
+    assert index.search("hoc bong han quoc", 1)[0][0] == "hoc-bong"
+    assert index.search("dao tao ha dong", 1)[0][0] == "dao-tao"
+    # Written with diacritics, "lịch" prefers the documents that have them too.
+    assert [doc_id for doc_id, _ in index.search("lịch", 5)] == ["lich-thi", "lich-su"]
+    assert index.search("zzz", 5) == []
+
+
+def test_remove_compact_save_load(index, tmp_path):
+    index.remove(["hoc-bong"])
+    index.add("lich-thi", "Lịch thi học kỳ 2")  # replaces the old text
+    assert "hoc-bong" not in [doc_id for doc_id, _ in index.search("học bổng", 5)]
+    assert index.search("kỳ 2", 1)[0][0] == "lich-thi"
+
+    path = str(tmp_path / LEXICAL_FILE)
+    index.save(path)
+    expected = index.search("thông báo học kỳ", 5)
+    loaded = LexicalIndex.load(path)
+    assert len(loaded) == len(index) == 4
+    assert [doc_id for doc_id, _ in loaded.search("thông báo học kỳ", 5)] == [doc_id for doc_id, _ in expected]
+    assert [score for _, score in loaded.search("thông báo học kỳ", 5)] == pytest.approx([s for _, s in expected])
+    # A loaded index takes updates too.
+    loaded.add("tuyen-sinh", "Thông báo tuyển sinh đại học")
+    assert loaded.search("tuyen sinh", 1)[0][0] == "tuyen-sinh"
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def _documents(texts):
+    return [Document(page_content=text, metadata={"title": key, "category": "notice", "url": f"https://ptit.edu.vn/{key}"})
+            for key, text in texts.items()]
+
+
+def test_update_index_keeps_bm25_in_step(tmp_path):
+    index_dir = str(tmp_path / "index")
+    embeddings = DeterministicFakeEmbedding(size=16)
+    update_index(_documents(TEXTS), embeddings, index_dir)
+    assert os.path.exists(os.path.join(current_index_dir(index_dir), LEXICAL_FILE))
+    assert len(load_lexical_index(index_dir)) == len(TEXTS)
+
+    texts = dict(TEXTS, **{"hoc-phi": "Học phí năm học 2025-2026 tăng nhẹ"})
+    del texts["hoc-bong"]
+    update_index(_documents(texts), embeddings, index_dir)
+    lexical = load_lexical_index(index_dir)
+    assert len(lexical) == len(TEXTS) - 1
+    assert lexical.search("KOICA", 5) == []
+    assert len(lexical.search("tăng nhẹ", 5)) == 1
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retrieval_finds_the_lexical_match(tmp_path):
+    # Fake embeddings rank at random; only BM25 knows which notice mentions KOICA.
+    index_dir = str(tmp_path / "index")
+    store, _ = update_index(_documents(TEXTS), DeterministicFakeEmbedding(size=16), index_dir)
+    service = RAGService(vector_store=store, lexical_index=load_lexical_index(index_dir))
+    service.answer_cache = None
+    hits = await service.retrieve("KOICA", k=2)
+    assert hits[0][0].metadata["title"] == "hoc-bong"
+    assert hits[0][1] > hits[1][1]
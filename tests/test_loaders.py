@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+from app.services.loaders import ADAPTERS, adapter_for, iter_documents, iter_json_array, record_adapter
+
+RAW_DIR = os.path.join("data", "raw")
+
+
+@pytest.mark.parametrize("read_size", [7, 1 << 16])
+def test_iter_json_array_matches_json_load(read_size):
+    path = os.path.join(RAW_DIR, "events.json")
+    with open(path, encoding="utf-8") as f:
+        expected = json.load(f)
+    assert list(iter_json_array(path, read_size=read_size)) == expected
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("[]", []),
+    ("  [ 1 , 22,\n333 ]  ", [1, 22, 333]),
+    ('[{"a": "x, y ] z"}, [1, 2]]', [{"a": "x, y ] z"}, [1, 2]]),
+])
+def test_iter_json_array_values(tmp_path, text, expected):
+    path = tmp_path / "items.json"
+    path.write_text(text, encoding="utf-8")
+    assert list(iter_json_array(str(path), read_size=2)) == expected
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', '[{"a": 1}, {"b"', '[1 2]'])
+def test_iter_json_array_rejects_invalid(tmp_path, text):
+    path = tmp_path / "items.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), read_size=3))
+
+
+def test_iter_documents_uses_adapters(tmp_path):
+    events = [{"title": "Hội thảo AI", "date": "03/02/2025 11:00 - 13:00", "url": "https://ptit.edu.vn/event/a",
+               "content": {"texts": "Hội thảo về trí tuệ nhân tạo", "images": []}}]
+    (tmp_path / "events.json").write_text(json.dumps(events, ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "misc.jsonl").write_text('{"content": "một"}\n\n{"content": {"text": "hai"}}\n', encoding="utf-8")
+
+    documents = list(iter_documents(str(tmp_path)))
+
+    assert [doc.page_content for doc in documents] == ["Hội thảo về trí tuệ nhân tạo", "một", "hai"]
+    assert documents[0].metadata == {"title": "Hội thảo AI", "category": "event", "url": "https://ptit.edu.vn/event/a",
+                                     "date": "03/02/2025 11:00 - 13:00", "source": "events"}
+    assert documents[1].metadata == {"category": "unknown", "source": "misc"}
+
+
+def test_register_adapter(monkeypatch):
+    monkeypatch.setattr("app.services.loaders.ADAPTERS", dict(ADAPTERS))
+
+    @record_adapter("schedules")
+    def schedule_record(item, source):
+        return None
+
+    assert adapter_for("schedules_2025.json") is schedule_record
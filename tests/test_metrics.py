@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils import metrics
+from app.utils.profiler import SamplingProfiler
+
+
+def _samples(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = registry.histogram("test_seconds", "Test", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "a")
+    registry.gauge("test_depth", "Depth").set(3)
+    registry.register_collector(lambda: [("test_entries", "gauge", "Entries", [({"cache": "x"}, 7)])])
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    buckets = [line.split("{")[1] for line in _samples(text, "test_seconds_bucket")]
+    assert [b.split(",")[1].split('"')[1] for b in buckets] == ["0.1", "1.0", "+Inf"]
+    assert [line.rsplit(" ", 1)[1] for line in _samples(text, "test_seconds_bucket")] == ["1", "3", "4"]
+    assert _samples(text, "test_seconds_sum")[0].endswith(" 6.05")
+    assert _samples(text, "test_seconds_count")[0].endswith(" 4")
+    assert _samples(text, "test_depth")[0].endswith(" 3")
+    assert 'test_entries{cache="x",pid="' in text
+
+
+def test_timed_records_stages_and_errors():
+    before = dict(metrics.STAGE_ERRORS._values)
+    with metrics.timed("test_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timed("test_stage"):
+            raise ValueError
+    counts, total = metrics.STAGE_SECONDS._values[("test_stage",)]
+    assert sum(counts) == 2 and total >= 0
+    assert metrics.STAGE_ERRORS._values[("test_stage",)] == before.get(("test_stage",), 0) + 1
+
+    with patch.object(metrics, "enabled", False):
+        with metrics.timed("test_stage"):
+            pass
+    assert sum(metrics.STAGE_SECONDS._values[("test_stage",)][0]) == 2
+
+
+def _client():
+    # Without warm-up: these tests do not need the index or the OCR backend.
+    qa, image = app.state.routers["qa"], app.state.routers["image"]
+    return patch.object(qa, "warm_up", lambda: None), patch.object(image, "warm_up", lambda: None)
+
+
+def test_metrics_endpoint_reports_requests():
+    no_qa_warm_up, no_image_warm_up = _client()
+    with no_qa_warm_up, no_image_warm_up, TestClient(app) as client:
+        client.get("/health")
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'vpa_http_request_seconds_count{method="GET",handler="/health",status="200"' in text
+    # The scrape itself is in flight while it is rendered.
+    assert [line for line in _samples(text, "vpa_http_requests_in_flight{") if line.endswith(" 1")]
+
+
+def test_profiler_samples_busy_threads():
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop)
+    thread.start()
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    try:
+        with pytest.raises(RuntimeError):
+            SamplingProfiler().start()
+        time.sleep(0.2)
+    finally:
+        stacks = profiler.stop()
+        stop.set()
+        thread.join()
+    assert profiler.samples > 0
+    assert any("busy_loop" in line for line in stacks.splitlines())
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+
+
+def test_profile_route_is_off_by_default():
+    no_qa_warm_up, no_image_warm_up = _client()
+    with no_qa_warm_up, no_image_warm_up, TestClient(app) as client:
+        assert client.get("/debug/profile", params={"seconds": 0.1}).status_code == 404
+        with patch("app.utils.profiler.profiler_settings", lambda: {"enabled": True, "interval_ms": 1}):
+            response = client.get("/debug/profile", params={"seconds": 0.1})
+    assert response.status_code == 200
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from app.utils import parsers
+from tests.fixture_server import FIXTURE_DIR
+
+BASE = "https://ptit.edu.vn"
+
+PAGES = [
+    ("notice.html", parsers.parse_notice),
+    ("notice_list.html", parsers.parse_notice_list),
+    ("event.html", parsers.parse_event),
+    ("event_list.html", parsers.parse_event_list),
+    ("industry.html", parsers.parse_industry),
+    ("industry_list.html", parsers.parse_industry_links),
+]
+
+
+def load_page(filename):
+    with open(os.path.join(FIXTURE_DIR, filename), encoding="utf-8") as f:
+        return f.read().replace("{base}", BASE).replace("{page}", "1").replace("{slug}", "cong-nghe-thong-tin")
+
+
+@pytest.mark.parametrize("filename,parse", PAGES)
+def test_scoped_lxml_matches_full_html_parser(monkeypatch, filename, parse):
+    html = load_page(filename)
+    fast = parse(html, "lxml")
+    # Reference: the whole page with html.parser, as the crawlers parsed it before.
+    monkeypatch.setattr(parsers, "SCOPES", dict.fromkeys(parsers.SCOPES))
+    assert fast == parse(html, "html.parser")
+    assert fast
+
+
+def test_scope_drops_the_rest_of_the_page():
+    soup = parsers.make_soup(load_page("notice.html"), "lxml", parsers.SCOPES["parse_notice"])
+    assert soup.find("aside") is None and soup.find("div", class_="post-content") is not None
+    assert "banner.png" not in str(parsers.parse_notice(load_page("notice.html")))
+
+
+def test_has_class():
+    match = parsers.has_class("post-content")
+    assert match("entry post-content") and match(["post-content"])
+    assert not match("post-content-2") and not match(None)
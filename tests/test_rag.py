@@ -0,0 +1,69 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services.indexing import update_index
+from app.services.rag import RAGService
+from tests.fake_embeddings import CountingEmbedding
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    documents = [
+        Document(page_content=f"Nội dung thông báo số {i}", metadata={"title": f"Thông báo {i}", "category": "event",
+                                                                       "url": f"https://ptit.edu.vn/{i}"})
+        for i in range(60)
+    ]
+    embeddings = CountingEmbedding(size=16)
+    store, _ = update_index(documents, embeddings, str(tmp_path / "index"))
+    embeddings.calls = 0
+    return store
+
+
+@pytest.mark.asyncio
+async def test_concurrent_questions_are_batched(vector_store):
+    service = RAGService(vector_store=vector_store, max_workers=2, max_batch_size=64, max_wait_ms=5)
+    questions = [f"Nội dung thông báo số {i}" for i in range(50)]
+
+    results = await asyncio.gather(*(service.retrieve(q, k=3) for q in questions))
+
+    assert vector_store.embedding_function.calls == 1
+    for i, hits in enumerate(results):
+        assert len(hits) == 3
+        assert hits[0][0].metadata["title"] == f"Thông báo {i}"
+
+
+@pytest.mark.asyncio
+async def test_batch_size_limit(vector_store):
+    service = RAGService(vector_store=vector_store, max_batch_size=10, max_wait_ms=50)
+    await asyncio.gather(*(service.retrieve(f"câu hỏi {i}") for i in range(25)))
+    assert vector_store.embedding_function.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_process_question_uses_retrieved_documents(vector_store):
+    service = RAGService(vector_store=vector_store, top_k=2)
+    with patch('openai.AsyncOpenAI') as mock_openai:
+        create = mock_openai.return_value.chat.completions.create = AsyncMock()
+        create.return_value.choices = [type('obj', (object,), {
+            'message': type('obj', (object,), {'content': 'Thông báo số 7'})
+        })]
+
+        answer = await service.process_question("Nội dung thông báo số 7", "PTIT")
+
+    assert answer == 'Thông báo số 7'
+    prompt = create.call_args.kwargs["messages"][1]["content"]
+    assert "Thông báo 7" in prompt
+    assert "Ngữ cảnh thêm: PTIT" in prompt
+
+
+@pytest.mark.asyncio
+async def test_ids_missing_from_the_mapping_are_skipped(vector_store):
+    # As when a worker pairs an index with the id mapping of another version.
+    for i in list(vector_store.index_to_docstore_id)[:30]:
+        del vector_store.index_to_docstore_id[i]
+    service = RAGService(vector_store=vector_store, top_k=60)
+    hits = await service.retrieve("Nội dung thông báo")
+    assert len(hits) == 30
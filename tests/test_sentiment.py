@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import qa
+from app.utils.sentiment import SentimentAnalyzer, analyze_sentiment
+
+
+def label(scores):
+    return max(scores, key=scores.get)
+
+
+def test_lexicon_polarity_negation_and_intensifiers():
+    analyzer = SentimentAnalyzer()
+    positive, negative, negated, failed, neutral, english, empty = analyzer.analyze_many([
+        "Thầy cô rất nhiệt tình, em rất hài lòng",
+        "Dịch vụ tệ, thật thất vọng",
+        "Hướng dẫn không rõ ràng",
+        "Sinh viên không đạt sẽ bị cảnh cáo",
+        "Lịch thi học kỳ 1 được đăng trên cổng thông tin đào tạo",
+        "The registration was not bad at all",
+        "",
+    ])
+    assert label(positive) == "positive" and label(negative) == "negative"
+    assert negated["negative"] > 0 and negated["positive"] == 0
+    assert label(failed) == "negative"  # "không đạt" is one phrase, not a negated "đạt"
+    assert neutral == empty == {"positive": 0.0, "neutral": 1.0, "negative": 0.0}
+    assert english["positive"] > 0 and english["negative"] == 0
+    for scores in (positive, negative, negated, english):
+        assert abs(sum(scores.values()) - 1) < 1e-3
+
+    very, plain = analyzer.analyze_many(["rất tốt", "tốt"])
+    assert very["positive"] > plain["positive"]
+    # A long factual answer with one positive word stays mostly neutral.
+    long_answer = "Sinh viên nộp hồ sơ tại phòng đào tạo trước ngày 15 " * 5 + "tốt"
+    assert label(analyzer.analyze_many([long_answer])[0]) == "neutral"
+
+
+def test_batches_match_single_texts_and_are_cached():
+    texts = ["Rất tốt", "Quá tệ", "Không hề thất vọng", "Rất tốt"]
+    analyzer = SentimentAnalyzer(cache_size=2)
+    batched = analyzer.analyze_many(texts)
+    assert batched == [SentimentAnalyzer(cache_size=0).analyze_many([text])[0] for text in texts]
+    assert analyzer.stats == {"hits": 0, "misses": 3}
+    assert analyzer.cached("Rất tốt") is None  # evicted: only the last two are kept
+    assert analyzer.cached("Không hề thất vọng") == batched[2]
+    analyzer.analyze_many(["Quá tệ"])
+    assert analyzer.stats == {"hits": 1, "misses": 3}
+
+
+def test_stats_count_every_text_across_threads():
+    analyzer = SentimentAnalyzer()
+    texts = [f"Rất tốt lần {i}" for i in range(20)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: analyzer.analyze_many(texts), range(16)))
+    assert analyzer.stats["hits"] + analyzer.stats["misses"] == 16 * len(texts)
+
+
+def test_sentiment_in_background():
+    class Service:
+        async def process_question(self, question, context=None, filters=None):
+            return "Chúc mừng bạn đã trúng tuyển"
+
+    app = FastAPI()
+    app.include_router(qa.router, prefix="/qa")
+    with patch.object(qa, "get_rag_service", Service), patch.object(qa, "sentiment_in_background", True), \
+            patch("app.utils.sentiment._analyzer", SentimentAnalyzer()):
+        client = TestClient(app)
+        first = client.post("/qa/ask", params={"question": "Kết quả tuyển sinh?"}).json()
+        assert first["answer"] == "Chúc mừng bạn đã trúng tuyển" and first["sentiment"] is None
+        # Scored after the first response, so the repeated answer has it.
+        second = client.post("/qa/ask", params={"question": "Kết quả tuyển sinh?"}).json()
+        assert second["sentiment"] == analyze_sentiment(first["answer"])
+        assert label(second["sentiment"]) == "positive"
@@ -0,0 +1,73 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+import yaml
+
+from app.serve import serving_settings
+from app.utils.config import load_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_serving_settings_split_the_cores_between_workers():
+    config = {"api": {"host": "127.0.0.1", "port": 8001, "workers": 0, "worker_threads": 0}}
+    with patch("app.serve.load_config", lambda: config), patch("os.cpu_count", lambda: 8):
+        assert serving_settings()["workers"] == 8
+        assert serving_settings()["worker_threads"] == 1
+        settings = serving_settings(workers=2)
+        assert (settings["workers"], settings["worker_threads"], settings["port"]) == (2, 4, 8001)
+        assert serving_settings(workers=3, worker_threads=2)["worker_threads"] == 2
+
+
+def _children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return sorted(int(child) for child in f.read().split())
+
+
+def _wait(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_prefork_workers_serve_and_are_restarted(tmp_path):
+    config = json.loads(json.dumps(load_config()))
+    config["api"]["warmup"] = False
+    config["rag"]["index_dir"] = str(tmp_path / "no_index")
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port), "--workers", "2"],
+        cwd=ROOT, env={**os.environ, "APP_CONFIG": str(config_path)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        def healthy():
+            try:
+                return httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200
+            except httpx.TransportError:
+                return False
+
+        assert _wait(healthy)
+        workers = _children(server.pid)
+        assert len(workers) == 2
+
+        os.kill(workers[0], signal.SIGKILL)
+        assert _wait(lambda: len(_children(server.pid)) == 2 and workers[0] not in _children(server.pid))
+        assert _wait(healthy)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(30) == 0
@@ -0,0 +1,80 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded by warm-up or the first request, never by importing the app.
+HEAVY_MODULES = {"faiss", "numpy", "torch", "cv2", "pytesseract", "tesserocr", "onnxruntime", "openai",
+                 "sentence_transformers", "langchain_core", "langchain_community", "app.services.rag",
+                 "app.services.image_processor"}
+IMPORT_BUDGET_S = 2.0
+
+
+def import_profile(module: str):
+    """
+    (cumulative microseconds, module) of every import done by importing module, from python -X importtime
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    rows = re.findall(r"^import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)$", result.stderr, re.MULTILINE)
+    return [(int(cumulative), name) for cumulative, _, name in rows]
+
+
+def test_import_time_profile():
+    profile = import_profile("app.main")
+    imported = {name for _, name in profile}
+    slowest = "\n".join(f"{cumulative / 1000:8.1f} ms  {name}" for cumulative, name in sorted(profile)[-15:])
+    assert not HEAVY_MODULES & imported, f"imported at startup: {sorted(HEAVY_MODULES & imported)}\n{slowest}"
+    assert {"app.routers.qa", "app.routers.image"} <= imported
+    total = dict((name, cumulative) for cumulative, name in profile)["app.main"] / 1e6
+    assert total < IMPORT_BUDGET_S, f"import app.main took {total:.2f} s\n{slowest}"
+
+
+def _wait_ready(client, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.01)
+    return response
+
+
+def test_health_answers_while_warming_up():
+    release = threading.Event()
+    qa, image = app.state.routers["qa"], app.state.routers["image"]
+    with patch.object(qa, "warm_up", lambda: release.wait(5)), patch.object(image, "warm_up", lambda: None), \
+            TestClient(app) as client:
+        assert client.get("/health").json() == {"status": "healthy"}
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["subsystems"]["qa"] == "pending"
+
+        release.set()
+        response = _wait_ready(client)
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready", "subsystems": {"qa": "ready", "image": "ready"}}
+
+
+def test_failed_warm_up_is_not_ready():
+    def broken():
+        raise RuntimeError("tesseract missing")
+
+    qa, image = app.state.routers["qa"], app.state.routers["image"]
+    with patch.object(qa, "warm_up", lambda: None), patch.object(image, "warm_up", broken), \
+            TestClient(app) as client:
+        deadline = time.monotonic() + 5
+        while app.state.readiness["image"] == "pending" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["subsystems"]["image"] == "failed: tesseract missing"
+        assert client.get("/health").status_code == 200
@@ -0,0 +1,77 @@
+import json
+from unittest.mock import patch
+
+import openai
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.answer_cache import AnswerCache, MemoryBackend
+from app.services.indexing import update_index
+from app.services.rag import RAGService
+from tests.mock_llm import ANSWER, MockLLMServer
+
+
+@pytest.fixture
+def llm_server():
+    with MockLLMServer(tokens_per_s=500, first_token_delay=0.0) as server:
+        yield server
+
+
+@pytest.fixture
+def service(tmp_path, llm_server):
+    documents = [
+        Document(page_content=f"Lịch thi học kỳ {i}", metadata={"title": f"Lịch thi {i}", "category": "notice",
+                                                                "url": f"https://ptit.edu.vn/lich-thi-{i}"})
+        for i in range(10)
+    ]
+    embeddings = DeterministicFakeEmbedding(size=16)
+    store, _ = update_index(documents, embeddings, str(tmp_path / "index"))
+    return RAGService(vector_store=store, top_k=2, answer_cache=AnswerCache(MemoryBackend(), embeddings.embed_query),
+                      llm=openai.AsyncOpenAI(base_url=llm_server.base_url, api_key="test"))
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stream_question_sends_sources_then_tokens(service, llm_server):
+    events = [event async for event in service.stream_question("Lịch thi học kỳ 3")]
+
+    assert events[0][0] == "sources"
+    assert [source["title"] for source in events[0][1]][0] == "Lịch thi 3"
+    assert {"url", "category", "score"} <= set(events[0][1][0])
+    tokens = [data for event, data in events[1:]]
+    assert all(event == "token" for event, _ in events[1:]) and len(tokens) > 10
+    assert "".join(tokens) == ANSWER
+    assert llm_server.requests[0]["stream"] is True
+    assert "Lịch thi 3" in llm_server.requests[0]["messages"][1]["content"]
+
+    # The streamed answer was cached: a repeat comes whole, without the LLM.
+    events = [event async for event in service.stream_question("lịch thi học kỳ 3?")]
+    assert events == [("sources", []), ("token", ANSWER)]
+    assert len(llm_server.requests) == 1
+
+
+def test_stream_endpoint(service):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import qa
+
+    app = FastAPI()
+    app.include_router(qa.router, prefix="/qa")
+    with patch("app.routers.qa.rag_service", service):
+        response = TestClient(app).post("/qa/ask/stream", params={"question": "Lịch thi học kỳ 1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert events[0][0] == "sources"
+    assert "".join(data for event, data in events if event == "token") == ANSWER
+    assert events[-1][0] == "done" and set(events[-1][1]["sentiment"]) == {"positive", "neutral", "negative"}